@@ -0,0 +1,35 @@
+import json
+
+DB_CONFIGS_FILE = 'db_configs.json'
+
+DEFAULT_DB_CONFIGS = [
+    {
+        "name": "Db1",
+        "host": "",
+        "user": "",
+        "password": "",
+        "database": ""
+    },
+    {
+        "name": "DB2",
+        "host": "",
+        "port": 3306,
+        "user": "",
+        "password": "",
+        "database": "",
+        "ssl_ca": "cacert.pem"
+    }
+]
+
+
+def load_db_configs(path=DB_CONFIGS_FILE):
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return [dict(db_config) for db_config in DEFAULT_DB_CONFIGS]
+
+
+def save_db_configs(db_configs, path=DB_CONFIGS_FILE):
+    with open(path, 'w') as f:
+        json.dump(db_configs, f)
@@ -0,0 +1,341 @@
+import argparse
+import json
+import os
+import platform
+import resource
+import sqlite3
+import subprocess
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+from multiprocessing import get_context
+from types import SimpleNamespace
+
+import numpy as np
+import pandas as pd
+
+from app_config import load_db_configs, DB_CONFIGS_FILE
+
+# Headless benchmark of the fetch -> DataFrame -> render -> export path against a seeded SQLite
+# stand-in for cta_report. Each stage runs in a fresh process so its peak RSS is its own.
+# --databases also runs the fetch stage against db_configs entries, e.g. the same MySQL server
+# through mysql-connector and through PyMySQL.
+#
+#   python benchmark.py --rows 10000 100000 1000000 --output bench.json
+#   python benchmark.py --rows 100000 --compare bench.json
+#   python benchmark.py --rows 100000 --stages fetch --databases reports reports_pymysql
+
+STAGES = ('fetch', 'render', 'export', 'open_csv')
+DEFAULT_ROWS = (10000, 100000)
+DEFAULT_REPEAT = 5
+WARMUP_RUNS = 1  # untimed, so imports and first-use costs don't skew the percentiles
+DEFAULT_WORKDIR = 'benchmark_data'
+SEEDED_QUERY = 'SELECT * FROM cta_report ORDER BY id'
+SEED_CHUNK = 100000
+CHANNELS = np.array(['email', 'search', 'social', 'display', 'affiliate', 'video'])
+STATUSES = np.array(['active', 'paused', 'completed', 'archived'])
+
+
+def seed_database(path, rows):
+    # Deterministic synthetic rows shaped like cta_report; only the rows not already there are added
+    db = sqlite3.connect(path)
+    db.execute('''
+        CREATE TABLE IF NOT EXISTS cta_report
+        (id INTEGER PRIMARY KEY, added_on TEXT, campaign_id INTEGER, campaign TEXT, channel TEXT,
+         status TEXT, clicks INTEGER, conversions INTEGER, cost REAL, note TEXT)
+    ''')
+    existing = db.execute('SELECT COALESCE(MAX(id) + 1, 0) FROM cta_report').fetchone()[0]
+    epoch = datetime(2024, 1, 1)
+    # Whole chunks are always drawn from their own seed, so a row's values don't depend on how
+    # many rows earlier runs seeded
+    for chunk in range(existing - existing % SEED_CHUNK, rows, SEED_CHUNK):
+        rng = np.random.default_rng(chunk)
+        ids = np.arange(chunk, chunk + SEED_CHUNK)
+        seconds = rng.integers(0, 365 * 86400, SEED_CHUNK)
+        campaign_ids = rng.integers(1, 5000, SEED_CHUNK)
+        channels = CHANNELS[rng.integers(0, len(CHANNELS), SEED_CHUNK)]
+        statuses = STATUSES[rng.integers(0, len(STATUSES), SEED_CHUNK)]
+        clicks = rng.integers(0, 10000, SEED_CHUNK)
+        conversions = rng.integers(0, 500, SEED_CHUNK)
+        costs = np.round(rng.random(SEED_CHUNK) * 1000, 2)
+        has_note = rng.random(SEED_CHUNK) < 0.2
+        db.executemany('INSERT INTO cta_report VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)', (
+            (int(ids[i]), (epoch + timedelta(seconds=int(seconds[i]))).strftime('%Y-%m-%d %H:%M:%S'),
+             int(campaign_ids[i]), f"campaign {campaign_ids[i]}", channels[i], statuses[i], int(clicks[i]),
+             int(conversions[i]), float(costs[i]), f"note for row {ids[i]}" if has_note[i] else None)
+            for i in range(max(existing, chunk) - chunk, min(rows, chunk + SEED_CHUNK) - chunk)))
+        db.commit()
+    db.close()
+
+
+def seeded_config(database):
+    return {'name': 'benchmark', 'type': 'sqlite', 'database': database}
+
+
+def load_frame(source, rows, timings=None, pools=None):
+    # Through the same pool, backend cursor and fetch loop the app uses. source is (db_config, query).
+    from connection_pool import ConnectionPools
+    from query_metrics import timed
+    from query_preflight import limited_query
+    from result_buffers import fetch_dataframe
+    db_config, query = source
+    owned = pools is None
+    if owned:
+        pools = ConnectionPools()
+    try:
+        backend = pools.pool_for(db_config).backend
+        with pools.connection(db_config, timings=timings) as connection:
+            cursor = backend.streaming_cursor(connection)
+            with timed(timings, 'execute'):
+                cursor.execute(limited_query(query, rows))
+            df = fetch_dataframe(cursor, timings=timings)
+            cursor.close()
+    finally:
+        if owned:
+            pools.close_all()
+    return df
+
+
+def qt_view():
+    os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+    from PyQt5.QtWidgets import QApplication, QTableView
+    app = QApplication.instance() or QApplication([])
+    view = QTableView()
+    view.resize(1280, 800)
+    return app, view
+
+
+def render(app, view, model):
+    # The same work execute_query does after the fetch: swap the model in, size columns, paint
+    import main
+    view.setModel(model)
+    main.DatabaseApp.resize_result_columns(SimpleNamespace(table=view))
+    view.grab()
+    app.processEvents()
+
+
+def bench_fetch(source, rows, repeat, workdir):
+    # Pooled like the app, so only the warm-up run pays for connecting
+    from connection_pool import ConnectionPools
+    from query_metrics import QueryTimings
+    pools = ConnectionPools()
+    samples = {'fetch': []}
+    phases = []
+    for _ in range(repeat):
+        timings = QueryTimings('benchmark')
+        started = time.perf_counter()
+        load_frame(source, rows, timings, pools)
+        samples['fetch'].append(time.perf_counter() - started)
+        phases.append(timings.phases)
+    pools.close_all()
+    phases = phases[WARMUP_RUNS:]
+    return samples, {name: float(np.median([p.get(name, 0) for p in phases])) for name in phases[0]}
+
+
+def bench_render(source, rows, repeat, workdir):
+    import main
+    df = load_frame(source, rows)
+    app, view = qt_view()
+    samples = {'render': []}
+    for _ in range(repeat):
+        model = main.ResultTableModel()
+        started = time.perf_counter()
+        model.set_dataframe(df)
+        render(app, view, model)
+        samples['render'].append(time.perf_counter() - started)
+    return samples, {}
+
+
+def bench_export(source, rows, repeat, workdir):
+    from exporters import EXPORT_FORMATS, available_formats, export_frame
+    df = load_frame(source, rows)
+    samples = {}
+    for export_format in available_formats():
+        path = os.path.join(workdir, f"export_{rows}{EXPORT_FORMATS[export_format].extension}")
+        times = samples[f"export_{export_format}"] = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            export_frame(df, export_format, path)
+            times.append(time.perf_counter() - started)
+        os.remove(path)
+    return samples, {}
+
+
+def bench_open_csv(source, rows, repeat, workdir):
+    # Cold open (no sidecars) to the first painted page, the background index, then a reopen from the cache
+    import main
+    from exporters import export_frame
+    from saved_results import open_saved_result, SCHEMA_SUFFIX, OFFSETS_SUFFIX
+    path = os.path.join(workdir, f"saved_{rows}.csv")
+    export_frame(load_frame(source, rows), 'csv', path)
+    app, view = qt_view()
+    samples = {'open_csv_first_page': [], 'open_csv_index': [], 'open_csv_reopen': []}
+    for _ in range(repeat):
+        for suffix in (SCHEMA_SUFFIX, OFFSETS_SUFFIX):
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+        started = time.perf_counter()
+        source = open_saved_result(path)
+        render(app, view, main.LazyResultModel(source))
+        samples['open_csv_first_page'].append(time.perf_counter() - started)
+        if source.thread is not None:
+            source.thread.join()
+        samples['open_csv_index'].append(time.perf_counter() - started)
+        source.close()
+
+        started = time.perf_counter()
+        source = open_saved_result(path)
+        render(app, view, main.LazyResultModel(source))
+        samples['open_csv_reopen'].append(time.perf_counter() - started)
+        source.close()
+    for filename in (path, path + SCHEMA_SUFFIX, path + OFFSETS_SUFFIX):
+        if os.path.exists(filename):
+            os.remove(filename)
+    return samples, {}
+
+
+BENCHMARKS = {
+    'fetch': bench_fetch,
+    'render': bench_render,
+    'export': bench_export,
+    'open_csv': bench_open_csv,
+}
+
+
+def run_stage(stage, source, rows, repeat, workdir):
+    samples, phases = BENCHMARKS[stage](source, rows, repeat + WARMUP_RUNS, workdir)
+    samples = {name: times[WARMUP_RUNS:] for name, times in samples.items()}
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform != 'darwin':
+        peak_rss *= 1024  # kilobytes everywhere but macOS
+    return samples, phases, peak_rss
+
+
+def summarize(name, database, rows, times, phases, peak_rss):
+    times = np.array(times)
+    median = float(np.median(times))
+    return {
+        'stage': name,
+        'database': database,
+        'rows': rows,
+        'repeat': len(times),
+        'latency': {
+            'min': float(times.min()),
+            'p50': median,
+            'p90': float(np.percentile(times, 90)),
+            'p99': float(np.percentile(times, 99)),
+            'max': float(times.max()),
+        },
+        'rows_per_second': rows / median if median > 0 else None,
+        'peak_rss_mb': round(peak_rss / 1024 / 1024, 1),
+        'phases': phases,
+    }
+
+
+def driver_versions():
+    from db_backends import BACKENDS
+    versions = {}
+    for name, backend in BACKENDS.items():
+        if backend.module is not None:
+            versions[name] = getattr(backend.module, '__version__', None) or getattr(backend.module, 'sqlite_version', None)
+    # mysql-connector falls back to pure Python when its C extension isn't installed
+    versions['mysql_c_extension'] = getattr(BACKENDS['mysql'].module, 'HAVE_CEXT', None)
+    return versions
+
+
+def label(stage, database):
+    return stage if database == 'benchmark' else f"{stage}[{database}]"
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline_path):
+    with open(baseline_path, 'r') as f:
+        baseline = {(entry['stage'], entry.get('database', 'benchmark'), entry['rows']): entry
+                    for entry in json.load(f)['results']}
+    for entry in results:
+        old = baseline.get((entry['stage'], entry['database'], entry['rows']))
+        if old is None:
+            continue
+        ratio = entry['latency']['p50'] / old['latency']['p50'] if old['latency']['p50'] else float('inf')
+        print(f"{label(entry['stage'], entry['database']):>22} {entry['rows']:>10,} rows  p50 {old['latency']['p50']:.4f}s -> "
+              f"{entry['latency']['p50']:.4f}s  ({ratio:.2f}x)  rss {old['peak_rss_mb']} -> {entry['peak_rss_mb']} MB",
+              file=sys.stderr)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='benchmark', description="Benchmark the fetch, render and export path")
+    parser.add_argument('--rows', type=int, nargs='+', default=list(DEFAULT_ROWS),
+                        help="Result sizes to run every stage at (default: %(default)s)")
+    parser.add_argument('--stages', nargs='+', choices=STAGES, default=list(STAGES))
+    parser.add_argument('--repeat', type=int, default=DEFAULT_REPEAT,
+                        help="Timed runs per stage and size (default: %(default)s)")
+    parser.add_argument('--workdir', default=DEFAULT_WORKDIR,
+                        help="Where the seeded database and temporary files live (default: %(default)s)")
+    parser.add_argument('--output', help="Write the JSON report here instead of stdout")
+    parser.add_argument('--compare', metavar='REPORT', help="Print p50 changes against an earlier report")
+    parser.add_argument('--databases', nargs='+', default=[], metavar='NAME',
+                        help="Also run the fetch stage against these db_configs entries")
+    parser.add_argument('--db-configs', default=DB_CONFIGS_FILE, help="Database configurations (default: %(default)s)")
+    parser.add_argument('--query', default='SELECT * FROM cta_report',
+                        help="Query fetched from the --databases entries, limited to each row count (default: %(default)s)")
+    args = parser.parse_args(argv)
+
+    db_configs = {db_config['name']: db_config for db_config in load_db_configs(args.db_configs)}
+    missing = [name for name in args.databases if name not in db_configs]
+    if missing:
+        parser.error(f"not in {args.db_configs}: {', '.join(missing)}")
+
+    os.makedirs(args.workdir, exist_ok=True)
+    database = os.path.join(args.workdir, 'cta_report.db')
+    started = time.perf_counter()
+    seed_database(database, max(args.rows))
+    print(f"Seeded {max(args.rows):,} rows in {time.perf_counter() - started:.1f}s", file=sys.stderr)
+
+    runs = [(stage, (seeded_config(database), SEEDED_QUERY)) for stage in args.stages]
+    runs += [('fetch', (db_configs[name], args.query)) for name in args.databases]
+    results = []
+    # A fresh process per stage, so one stage's memory doesn't count against the next
+    with ProcessPoolExecutor(max_workers=1, mp_context=get_context('spawn'), max_tasks_per_child=1) as executor:
+        for rows in sorted(args.rows):
+            for stage, source in runs:
+                samples, phases, peak_rss = executor.submit(
+                    run_stage, stage, source, rows, args.repeat, args.workdir).result()
+                for name, times in samples.items():
+                    results.append(summarize(name, source[0]['name'], rows, times, phases, peak_rss))
+                    print(f"{label(name, source[0]['name']):>22} {rows:>10,} rows  "
+                          f"p50 {results[-1]['latency']['p50']:.4f}s  "
+                          f"peak RSS {results[-1]['peak_rss_mb']} MB", file=sys.stderr)
+
+    report = {
+        'meta': {
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'commit': git_commit(),
+            'python': platform.python_version(),
+            'pandas': pd.__version__,
+            'numpy': np.__version__,
+            'drivers': driver_versions(),
+            'platform': platform.platform(),
+        },
+        'results': results,
+    }
+    if args.compare:
+        compare(results, args.compare)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
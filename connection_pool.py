@@ -0,0 +1,230 @@
+import threading
+import time
+from contextlib import contextmanager
+
+from db_backends import BACKENDS, DEFAULT_BACKEND, DATABASE_ERRORS, MYSQL_BACKENDS, PreparedStatement, backend_for
+from query_metrics import timed
+
+# Keys in a db_configs entry that configure the tool rather than the connection itself
+POOL_CONFIG_KEYS = ('pool_size', 'pool_idle_timeout', 'pool_ping_interval')
+APP_CONFIG_KEYS = ('name', 'type', 'requires_ssl', 'cache_ttl', 'max_parallel_partitions', 'preflight', 'preflight_max_rows',
+                   'preflight_scan_rows', 'preflight_row_limit') + POOL_CONFIG_KEYS
+
+DEFAULT_POOL_SIZE = 4
+MAX_PREPARED_STATEMENTS = 16  # per connection; the least recently used one is closed past this
+DEFAULT_IDLE_TIMEOUT = 300  # seconds an unused connection is kept open
+DEFAULT_PING_INTERVAL = 30  # seconds idle before a connection is pinged on checkout
+
+
+class PoolTimeoutError(Exception):
+    pass
+
+
+def connection_config_for(db_config):
+    connection_config = {k: v for k, v in db_config.items() if k not in APP_CONFIG_KEYS}
+
+    # Check if SSL is required
+    if db_config.get('requires_ssl', False) and db_config.get('type', DEFAULT_BACKEND) in MYSQL_BACKENDS:
+        connection_config['ssl_ca'] = db_config.get('ssl_ca')
+        connection_config['ssl_verify_cert'] = True
+    return connection_config
+
+
+class ConnectionPool:
+    def __init__(self, connection_config, size=DEFAULT_POOL_SIZE, idle_timeout=DEFAULT_IDLE_TIMEOUT,
+                 ping_interval=DEFAULT_PING_INTERVAL, backend=BACKENDS[DEFAULT_BACKEND]):
+        self.connection_config = connection_config
+        self.backend = backend
+        self.size = size
+        self.idle_timeout = idle_timeout
+        self.ping_interval = ping_interval
+        self.idle = []  # (connection, last_used) pairs, most recently used last
+        self.open_connections = 0
+        self.hits = 0
+        self.misses = 0
+        self.reconnects = 0
+        self.prepared_hits = 0
+        self.prepared_misses = 0
+        self.statements = {}  # id(connection) -> {query: PreparedStatement}, least recently used first
+        self.closed = False
+        self.condition = threading.Condition()
+
+    def connect(self):
+        return self.backend.connect(self.connection_config)
+
+    def acquire(self, timeout=None, timings=None):
+        # timings, a QueryTimings, gets the wait for a free slot as 'acquire' and opening or
+        # health-checking the connection as 'connect'
+        started = time.perf_counter()
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self.condition:
+            expired = self.take_expired()
+        # Closing can wait on the network, so it happens without holding up other threads
+        for connection, _ in expired:
+            self.close_quietly(connection)
+        with self.condition:
+            while True:
+                if self.idle:
+                    connection, last_used = self.idle.pop()
+                    self.hits += 1
+                    break
+                if self.open_connections < self.size:
+                    # Reserve a slot and open the connection outside the lock
+                    self.open_connections += 1
+                    self.misses += 1
+                    connection, last_used = None, None
+                    break
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    raise PoolTimeoutError(f"No connection available within {timeout} seconds")
+                self.condition.wait(remaining)
+        if timings is not None:
+            timings.add('acquire', time.perf_counter() - started)
+
+        try:
+            if connection is None:
+                with timed(timings, 'connect'):
+                    return self.connect()
+            if time.monotonic() - last_used > self.ping_interval:
+                with timed(timings, 'connect'):
+                    self.check_health(connection)
+            return connection
+        except Exception:
+            self.forget(connection)
+            raise
+
+    def check_health(self, connection):
+        try:
+            self.backend.ping(connection)
+        except DATABASE_ERRORS:
+            # The server dropped the connection while it sat idle; reconnect in place
+            self.reconnects += 1
+            self.statements.pop(id(connection), None)  # the server dropped them with the session
+            self.backend.reconnect(connection)
+
+    def prepared(self, connection, query):
+        # Statements stay prepared on their connection while it is pooled, so running a template
+        # again with new values skips the parse and plan. Only the connection's holder calls this.
+        statements = self.statements.setdefault(id(connection), {})
+        statement = statements.pop(query, None)
+        if statement is None:
+            self.prepared_misses += 1
+            if len(statements) >= MAX_PREPARED_STATEMENTS:
+                try:
+                    statements.pop(next(iter(statements))).close()
+                except DATABASE_ERRORS:
+                    pass
+            statement = PreparedStatement(self.backend, connection, query)
+        else:
+            self.prepared_hits += 1
+        statements[query] = statement
+        return statement
+
+    def release(self, connection, discard=False):
+        if discard or self.closed:
+            self.forget(connection)
+            return
+        with self.condition:
+            self.idle.append((connection, time.monotonic()))
+            self.condition.notify()
+
+    def forget(self, connection):
+        if connection is not None:
+            # Closing the connection frees its statements on the server
+            self.statements.pop(id(connection), None)
+            self.close_quietly(connection)
+        with self.condition:
+            self.open_connections -= 1
+            self.condition.notify()
+
+    def take_expired(self):
+        # Called with the condition held; the caller closes what is returned after releasing it
+        now = time.monotonic()
+        expired = [item for item in self.idle if now - item[1] > self.idle_timeout]
+        if expired:
+            self.idle = [item for item in self.idle if now - item[1] <= self.idle_timeout]
+            self.open_connections -= len(expired)
+            for connection, _ in expired:
+                self.statements.pop(id(connection), None)
+            self.condition.notify(len(expired))
+        return expired
+
+    def close(self):
+        with self.condition:
+            self.closed = True
+            idle, self.idle = self.idle, []
+            self.open_connections -= len(idle)
+            self.statements = {}
+        for connection, _ in idle:
+            self.close_quietly(connection)
+
+    @staticmethod
+    def close_quietly(connection):
+        try:
+            connection.close()
+        except Exception:
+            pass
+
+    def stats(self):
+        with self.condition:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'reconnects': self.reconnects,
+                'prepared_hits': self.prepared_hits,
+                'prepared_misses': self.prepared_misses,
+                'open': self.open_connections,
+                'idle': len(self.idle),
+                'size': self.size,
+            }
+
+
+class ConnectionPools:
+    # One pool per db_configs entry, shared by interactive and scheduled execution
+    def __init__(self):
+        self.pools = {}
+        self.lock = threading.Lock()
+
+    def pool_for(self, db_config):
+        connection_config = connection_config_for(db_config)
+        backend = backend_for(db_config)
+        with self.lock:
+            pool = self.pools.get(db_config['name'])
+            if pool is not None and (pool.connection_config != connection_config or pool.backend is not backend):
+                # The entry was edited; drop connections made with the old settings
+                pool.close()
+                pool = None
+            if pool is None:
+                pool = ConnectionPool(
+                    connection_config,
+                    size=db_config.get('pool_size', DEFAULT_POOL_SIZE),
+                    idle_timeout=db_config.get('pool_idle_timeout', DEFAULT_IDLE_TIMEOUT),
+                    ping_interval=db_config.get('pool_ping_interval', DEFAULT_PING_INTERVAL),
+                    backend=backend,
+                )
+                self.pools[db_config['name']] = pool
+            return pool
+
+    @contextmanager
+    def connection(self, db_config, timeout=None, timings=None):
+        pool = self.pool_for(db_config)
+        connection = pool.acquire(timeout, timings)
+        try:
+            yield connection
+        except Exception:
+            # A failed statement can leave unread results behind; don't hand that connection out again
+            pool.release(connection, discard=True)
+            raise
+        else:
+            pool.release(connection)
+
+    def stats(self):
+        with self.lock:
+            pools = dict(self.pools)
+        return {name: pool.stats() for name, pool in pools.items()}
+
+    def close_all(self):
+        with self.lock:
+            pools, self.pools = list(self.pools.values()), {}
+        for pool in pools:
+            pool.close()
@@ -0,0 +1,212 @@
+import os
+import sqlite3
+from datetime import date, datetime
+from urllib.request import pathname2url
+
+import mysql.connector
+
+try:
+    import pymysql
+    import pymysql.cursors
+except ImportError:
+    pymysql = None
+
+try:
+    import duckdb
+except ImportError:
+    duckdb = None
+
+DEFAULT_BACKEND = 'mysql'
+MYSQL_BACKENDS = ('mysql', 'pymysql')
+
+
+class MySqlBackend:
+    # mysql-connector-python, which uses its C extension when it is installed
+    name = 'mysql'
+    label = 'MySQL (mysql-connector)'
+    module = mysql.connector
+    placeholder = '%s'
+    prepared_placeholder = '?'  # server-side prepared statements take MySQL's own markers
+    explain_json = True  # EXPLAIN FORMAT=JSON for the preflight and row estimates
+
+    def connect(self, connection_config):
+        # Autocommit so a reused connection never holds on to an old read snapshot, even when
+        # the entry sets autocommit itself
+        return mysql.connector.connect(**{**connection_config, 'autocommit': True})
+
+    def streaming_cursor(self, connection):
+        # Unbuffered: rows stay on the server until fetched batch by batch
+        return connection.cursor(buffered=False)
+
+    def prepared_cursor(self, connection):
+        # Prepares on the server and fetches in the binary protocol; re-executing the same
+        # query object on the cursor reuses the statement
+        return connection.cursor(prepared=True)
+
+    def adapt(self, value):
+        return value
+
+    def ping(self, connection):
+        connection.ping(reconnect=False)
+
+    def reconnect(self, connection):
+        connection.reconnect(attempts=2, delay=1)
+
+    def connection_id(self, connection):
+        return connection.connection_id
+
+    def cancel(self, connection_config, connection, connection_id):
+        # KILL QUERY has to be sent from a separate connection
+        killer = self.connect(connection_config)
+        cursor = killer.cursor()
+        cursor.execute(f"KILL QUERY {int(connection_id)}")
+        cursor.close()
+        killer.close()
+
+    def quote_identifier(self, name):
+        return '`' + name.replace('`', '``') + '`'
+
+    def quote_literal(self, value):
+        return "'" + value.replace('\\', '\\\\').replace("'", "''") + "'"
+
+
+class PyMySqlBackend(MySqlBackend):
+    # Pure-Python driver; same server and SQL dialect, handy for comparing driver overhead
+    name = 'pymysql'
+    label = 'MySQL (PyMySQL)'
+    module = pymysql
+    prepared_placeholder = '%s'  # PyMySQL has no server-side prepared statements; it escapes values itself
+
+    def connect(self, connection_config):
+        return pymysql.connect(**{**connection_config, 'autocommit': True})
+
+    def streaming_cursor(self, connection):
+        return connection.cursor(pymysql.cursors.SSCursor)
+
+    def prepared_cursor(self, connection):
+        return self.streaming_cursor(connection)
+
+    def reconnect(self, connection):
+        connection.ping(reconnect=True)
+
+    def connection_id(self, connection):
+        return connection.thread_id()
+
+
+class SqliteBackend:
+    # Local extract files, opened read-only. "database" in the db_configs entry is the file path.
+    name = 'sqlite'
+    label = 'SQLite file'
+    module = sqlite3
+    placeholder = '?'
+    prepared_placeholder = '?'
+    explain_json = False
+
+    def connect(self, connection_config):
+        path = os.path.abspath(connection_config['database'])
+        # Pooled connections move between worker threads, one thread at a time
+        return sqlite3.connect(f"file:{pathname2url(path)}?mode=ro", uri=True, check_same_thread=False,
+                               timeout=connection_config.get('timeout', 30))
+
+    def streaming_cursor(self, connection):
+        # SQLite cursors step through the result as rows are fetched
+        return connection.cursor()
+
+    def prepared_cursor(self, connection):
+        # sqlite3 keeps recently used statements prepared per connection on its own
+        return connection.cursor()
+
+    def adapt(self, value):
+        # Dates are stored as ISO text; sqlite3's own datetime adapters are deprecated
+        if isinstance(value, datetime):
+            return value.isoformat(sep=' ')
+        if isinstance(value, date):
+            return value.isoformat()
+        return value
+
+    def ping(self, connection):
+        pass
+
+    def reconnect(self, connection):
+        pass
+
+    def connection_id(self, connection):
+        return None
+
+    def cancel(self, connection_config, connection, connection_id):
+        connection.interrupt()
+
+    def quote_identifier(self, name):
+        return '"' + name.replace('"', '""') + '"'
+
+    def quote_literal(self, value):
+        return "'" + value.replace("'", "''") + "'"
+
+
+class DuckDbBackend(SqliteBackend):
+    name = 'duckdb'
+    label = 'DuckDB file'
+    module = duckdb
+
+    def connect(self, connection_config):
+        return duckdb.connect(connection_config['database'], read_only=True)
+
+    def streaming_cursor(self, connection):
+        # fetchmany pulls the result in chunks rather than materializing it
+        return connection.cursor()
+
+    def prepared_cursor(self, connection):
+        return connection.cursor()
+
+    def adapt(self, value):
+        return value  # DuckDB binds dates and timestamps natively
+
+
+class PreparedStatement:
+    # A parameterized query prepared on one pooled connection; later runs only send new values
+    def __init__(self, backend, connection, query):
+        self.query = query
+        self.cursor = backend.prepared_cursor(connection)
+
+    def execute(self, params):
+        # mysql-connector only skips the prepare when it is handed the same query object again
+        self.cursor.execute(self.query, params)
+        return self.cursor
+
+    def close(self):
+        self.cursor.close()
+
+
+BACKENDS = {
+    'mysql': MySqlBackend(),
+    'pymysql': PyMySqlBackend(),
+    'sqlite': SqliteBackend(),
+    'duckdb': DuckDbBackend(),
+}
+
+
+def available_backends():
+    return [name for name, backend in BACKENDS.items() if backend.module is not None]
+
+
+def backend_for(db_config):
+    name = db_config.get('type', DEFAULT_BACKEND)
+    backend = BACKENDS.get(name)
+    if backend is None:
+        raise ValueError(f"Unknown database type '{name}' for {db_config.get('name')}")
+    if backend.module is None:
+        raise ImportError(f"The '{name}' database type needs the {name} package")
+    return backend
+
+
+def driver_errors(name, names=tuple(BACKENDS)):
+    # The DB-API exception class of that name from every installed driver, for except clauses
+    return tuple(getattr(BACKENDS[backend].module, name) for backend in names
+                 if BACKENDS[backend].module is not None)
+
+
+DATABASE_ERRORS = driver_errors('Error')
+PROGRAMMING_ERRORS = driver_errors('ProgrammingError')
+INTEGRITY_ERRORS = driver_errors('IntegrityError')
+# SQLite raises OperationalError for a missing table too, so only the server drivers' mean connection trouble
+OPERATIONAL_ERRORS = driver_errors('OperationalError', MYSQL_BACKENDS)
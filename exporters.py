@@ -0,0 +1,260 @@
+import csv
+import gzip
+import io
+import os
+
+try:
+    import pyarrow as pa
+    import pyarrow.ipc
+    import pyarrow.parquet
+except ImportError:
+    pa = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+DEFAULT_EXPORT_BATCH_SIZE = 50000
+
+
+class ExportError(Exception):
+    pass
+
+
+class Exporter:
+    # Writes a result batch by batch so the whole result never has to be in memory at once
+    label = ''
+    extension = ''
+    appendable = False
+
+    def __init__(self, path, columns, append=False):
+        self.path = path
+        self.columns = list(columns)
+        self.append = append
+        self.rows_written = 0
+
+    def write_rows(self, rows):
+        raise NotImplementedError
+
+    def write_frame(self, df, batch_size=DEFAULT_EXPORT_BATCH_SIZE):
+        for start in range(0, len(df), batch_size):
+            self.write_rows(list(df.iloc[start:start + batch_size].itertuples(index=False, name=None)))
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+class CsvExporter(Exporter):
+    label = 'CSV'
+    extension = '.csv'
+    appendable = True
+
+    def __init__(self, path, columns, append=False):
+        super().__init__(path, columns, append)
+        write_header = not (append and os.path.exists(path) and os.path.getsize(path) > 0)
+        self.file = self.open_text('a' if append else 'w')
+        self.writer = csv.writer(self.file)
+        if write_header:
+            self.writer.writerow(self.columns)
+
+    def open_text(self, mode):
+        return open(self.path, mode, newline='', encoding='utf-8')
+
+    def write_rows(self, rows):
+        self.writer.writerows(rows)
+        self.rows_written += len(rows)
+
+    def write_frame(self, df, batch_size=DEFAULT_EXPORT_BATCH_SIZE):
+        # pandas' C writer is much faster than csv.writer for data that is already in a frame
+        for start in range(0, len(df), batch_size):
+            df.iloc[start:start + batch_size].to_csv(self.file, header=False, index=False)
+        self.rows_written += len(df)
+
+    def close(self):
+        self.file.close()
+
+
+class GzipCsvExporter(CsvExporter):
+    label = 'CSV (gzip)'
+    extension = '.csv.gz'
+
+    def open_text(self, mode):
+        # Appending adds a new gzip member, which readers treat as one continuous file
+        return gzip.open(self.path, mode + 't', newline='', encoding='utf-8', compresslevel=6)
+
+
+class ZstdCsvExporter(CsvExporter):
+    label = 'CSV (zstd)'
+    extension = '.csv.zst'
+
+    def open_text(self, mode):
+        if zstandard is None:
+            raise ExportError("zstd compression needs the zstandard package")
+        raw = open(self.path, mode + 'b')
+        # Appending adds a new zstd frame; concatenated frames decompress as one stream
+        stream = zstandard.ZstdCompressor(level=3).stream_writer(raw, closefd=True)
+        return io.TextIOWrapper(stream, encoding='utf-8', newline='')
+
+
+class ArrowExporter(Exporter):
+    # Shared by Parquet and Arrow IPC: rows are converted to record batches with the first batch's schema
+    def __init__(self, path, columns, append=False):
+        if pa is None:
+            raise ExportError(f"{self.label} export needs the pyarrow package")
+        super().__init__(path, columns, append)
+        self.schema = None
+        self.writer = None
+
+    def to_record_batch(self, rows):
+        arrays = []
+        for i, values in enumerate(zip(*rows)):
+            arrow_type = self.schema.field(i).type if self.schema is not None else None
+            arrays.append(self.to_array(values, arrow_type, self.columns[i]))
+        if self.schema is None:
+            return pa.RecordBatch.from_arrays(arrays, names=self.columns)
+        return pa.RecordBatch.from_arrays(arrays, schema=self.schema)
+
+    @staticmethod
+    def to_array(values, arrow_type, column=None):
+        try:
+            array = pa.array(values, type=arrow_type)
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            # Mixed or unsupported values in the first batch make the column text. The writer's schema
+            # is fixed after that, so a later batch that doesn't fit is parsed from text as the column's
+            # type, and the export fails if that doesn't work either.
+            array = pa.array([None if value is None else str(value) for value in values], type=pa.string())
+            if arrow_type is not None and arrow_type != pa.string():
+                try:
+                    array = array.cast(arrow_type)
+                except (pa.ArrowInvalid, pa.ArrowNotImplementedError):
+                    raise ExportError(f"Column '{column}' changed type after the first {arrow_type} values; "
+                                      "export it as CSV, or CAST the column in the query") from None
+        if arrow_type is None and pa.types.is_null(array.type):
+            # An all-NULL first batch can't fix the column's type; fall back to text
+            array = array.cast(pa.string())
+        return array
+
+    def write_rows(self, rows):
+        if not rows:
+            return
+        self.write_batch(self.to_record_batch(rows))
+        self.rows_written += len(rows)
+
+    def write_frame(self, df, batch_size=DEFAULT_EXPORT_BATCH_SIZE):
+        arrays = []
+        for i in range(df.shape[1]):
+            column = df.iloc[:, i]
+            try:
+                arrays.append(pa.Array.from_pandas(column))
+            except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError):
+                # Mixed-type object columns are written as text
+                arrays.append(pa.array([None if missing else str(value)
+                                        for value, missing in zip(column, column.isna())], type=pa.string()))
+        if self.schema is not None:
+            table = pa.Table.from_arrays(arrays, schema=self.schema)
+        else:
+            table = pa.Table.from_arrays(arrays, names=self.columns)
+        for batch in table.to_batches(max_chunksize=batch_size):
+            self.write_batch(batch)
+        self.rows_written += len(df)
+
+    def write_batch(self, batch):
+        if self.writer is None:
+            self.schema = batch.schema
+            self.writer = self.open_writer(batch.schema)
+        self.writer.write_batch(batch)
+
+    def open_writer(self, schema):
+        raise NotImplementedError
+
+    def close(self):
+        if self.writer is None:
+            # No rows at all: still write a valid, empty file with the column names
+            self.schema = pa.schema([(column, pa.string()) for column in self.columns])
+            self.writer = self.open_writer(self.schema)
+        self.writer.close()
+
+
+class ParquetExporter(ArrowExporter):
+    label = 'Parquet'
+    extension = '.parquet'
+
+    def open_writer(self, schema):
+        return pyarrow.parquet.ParquetWriter(self.path, schema, compression='zstd')
+
+
+class ArrowIpcExporter(ArrowExporter):
+    label = 'Arrow IPC'
+    extension = '.arrow'
+
+    def __init__(self, path, columns, append=False):
+        super().__init__(path, columns, append)
+        self.sink = None  # opened with the writer
+
+    def open_writer(self, schema):
+        self.sink = pa.OSFile(self.path, 'wb')
+        return pyarrow.ipc.new_file(self.sink, schema)
+
+    def close(self):
+        try:
+            super().close()
+        finally:
+            if self.sink is not None:
+                self.sink.close()
+
+
+EXPORT_FORMATS = {
+    'csv': CsvExporter,
+    'csv.gz': GzipCsvExporter,
+    'csv.zst': ZstdCsvExporter,
+    'parquet': ParquetExporter,
+    'arrow': ArrowIpcExporter,
+}
+
+
+def available_formats():
+    formats = ['csv', 'csv.gz']
+    if zstandard is not None:
+        formats.append('csv.zst')
+    if pa is not None:
+        formats.extend(['parquet', 'arrow'])
+    return formats
+
+
+def format_for_path(path, default='csv'):
+    for export_format in sorted(EXPORT_FORMATS, key=len, reverse=True):
+        if path.endswith(EXPORT_FORMATS[export_format].extension):
+            return export_format
+    return default
+
+
+def open_exporter(export_format, path, columns, append=False):
+    exporter_class = EXPORT_FORMATS.get(export_format)
+    if exporter_class is None:
+        raise ExportError(f"Unknown export format '{export_format}'")
+    return exporter_class(path, columns, append=append and exporter_class.appendable)
+
+
+def export_frame(df, export_format, path):
+    with open_exporter(export_format, path, [str(column) for column in df.columns]) as exporter:
+        exporter.write_frame(df)
+    return exporter.rows_written
+
+
+def export_cursor(cursor, export_format, path, batch_size=DEFAULT_EXPORT_BATCH_SIZE):
+    # Streams an executed (ideally unbuffered) cursor straight into the file. Returns (columns, rows written).
+    columns = [column[0] for column in cursor.description]
+    with open_exporter(export_format, path, columns) as exporter:
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            exporter.write_rows(rows)
+    return columns, exporter.rows_written
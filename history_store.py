@@ -0,0 +1,321 @@
+import json
+import logging
+import queue
+import re
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+HISTORY_DB = 'query_history.db'
+DATETIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+COUNT_CACHE_TTL = 60  # seconds a page count is reused for; rows added since then make it approximate
+COUNT_LIMIT = 10000  # counting stops here; the dialog shows "10000+" rather than counting every match
+FLUSH_INTERVAL = 0.25  # seconds the writer waits for more entries before committing a batch
+MAX_BATCH = 500
+
+# Sort orders for the history dialog; each is paged by (column, id)
+SORT_COLUMNS = {'newest': 'timestamp', 'frequent': 'run_count', 'expensive': 'total_duration'}
+HISTORY_COLUMNS = "h.id, h.timestamp, h.database, h.query, h.run_count, h.total_duration, h.fingerprint"
+
+# Comments and string literals in one pass, so quotes in comments and dashes in strings don't confuse either
+COMMENTS_AND_STRINGS = re.compile(r"(--[^\n]*|#[^\n]*|/\*.*?\*/)|'(?:[^'\\]|\\.|'')*'|\"(?:[^\"\\]|\\.|\"\")*\"",
+                                  re.DOTALL)
+NUMBER_LITERALS = re.compile(r"(?<![\w.`])-?\d+(?:\.\d+)?(?:e[+-]?\d+)?(?![\w`])", re.IGNORECASE)
+VALUE_LISTS = re.compile(r"\(\s*\?(?:\s*,\s*\?)*\s*\)")
+
+
+def fingerprint(query, params=None):
+    # The query with comments and literal values removed, so runs that differ only in
+    # dates, ids or IN-list lengths count as the same query. Values bound to a template's
+    # parameters are kept, so each set of them is tracked separately.
+    query = COMMENTS_AND_STRINGS.sub(lambda match: ' ' if match.group(1) else '?', query)
+    query = NUMBER_LITERALS.sub('?', query)
+    query = VALUE_LISTS.sub('(?+)', query)
+    query = ' '.join(query.split()).rstrip(';').strip().lower()
+    if params:
+        query += ' -- ' + format_params(params)
+    return query
+
+
+def format_params(params):
+    return json.dumps(list(params), default=str)
+
+
+class HistoryStore:
+    # Reads run on the caller's connection; writes are queued and committed in batches by one
+    # background writer thread, so logging a query never waits on an fsync. Scheduled jobs and
+    # interactive runs share the same store (and so the same writer).
+    def __init__(self, path=HISTORY_DB):
+        self.path = path
+        self.db = self.connect()
+        self.count_cache = {}
+        self.queue = queue.Queue()
+        self.closed = False
+        self.db.executescript('''
+            CREATE TABLE IF NOT EXISTS query_history
+            (id INTEGER PRIMARY KEY AUTOINCREMENT,
+             timestamp DATETIME,
+             database TEXT,
+             query TEXT);
+            CREATE TABLE IF NOT EXISTS query_runs
+            (id INTEGER PRIMARY KEY AUTOINCREMENT,
+             fingerprint TEXT,
+             timestamp DATETIME,
+             database TEXT,
+             duration REAL,
+             rows INTEGER,
+             bytes INTEGER,
+             cached INTEGER DEFAULT 0);
+            CREATE INDEX IF NOT EXISTS idx_query_history_timestamp ON query_history(timestamp);
+            CREATE INDEX IF NOT EXISTS idx_query_history_database ON query_history(database, timestamp);
+            CREATE INDEX IF NOT EXISTS idx_query_runs_fingerprint ON query_runs(fingerprint, database, timestamp);
+            CREATE INDEX IF NOT EXISTS idx_query_runs_timestamp ON query_runs(timestamp);
+        ''')
+        self.fts_tokenizer = self.init_fts()
+        self.init_fingerprints()
+        self.db.commit()
+        self.writer = threading.Thread(target=self.write_loop, name='history-writer', daemon=True)
+        self.writer.start()
+
+    def connect(self):
+        db = sqlite3.connect(self.path, timeout=30)
+        # WAL lets the dialog read while a batch is being written, and lets the headless scheduler
+        # log to the same file; with WAL, NORMAL only syncs at checkpoints and is still crash safe
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute("PRAGMA synchronous=NORMAL")
+        return db
+
+    def init_fingerprints(self):
+        # query_history holds one row per (fingerprint, database) with running totals; older
+        # files have one row per run, which are folded together here once
+        columns = [row[1] for row in self.db.execute("PRAGMA table_info(query_history)")]
+        if 'fingerprint' not in columns:
+            self.db.executescript('''
+                ALTER TABLE query_history ADD COLUMN fingerprint TEXT;
+                ALTER TABLE query_history ADD COLUMN first_seen DATETIME;
+                ALTER TABLE query_history ADD COLUMN run_count INTEGER DEFAULT 1;
+                ALTER TABLE query_history ADD COLUMN total_duration REAL DEFAULT 0;
+                ALTER TABLE query_history ADD COLUMN total_rows INTEGER DEFAULT 0;
+                ALTER TABLE query_history ADD COLUMN total_bytes INTEGER DEFAULT 0;
+            ''')
+            self.fold_duplicates()
+        self.db.executescript('''
+            CREATE UNIQUE INDEX IF NOT EXISTS idx_query_history_fingerprint ON query_history(fingerprint, database);
+            CREATE INDEX IF NOT EXISTS idx_query_history_run_count ON query_history(run_count);
+            CREATE INDEX IF NOT EXISTS idx_query_history_total_duration ON query_history(total_duration);
+        ''')
+
+    def fold_duplicates(self):
+        latest = {}  # (fingerprint, database) -> [id, first_seen, run_count]
+        runs = []
+        for row_id, timestamp, database, query in self.db.execute(
+                "SELECT id, timestamp, database, query FROM query_history ORDER BY id"):
+            key = (fingerprint(query or ''), database)
+            runs.append((key[0], timestamp, database))
+            entry = latest.get(key)
+            if entry is None:
+                latest[key] = [row_id, timestamp, 1]
+            else:
+                entry[0] = row_id
+                entry[2] += 1
+        keep = {entry[0] for entry in latest.values()}
+        self.db.execute("CREATE TEMP TABLE keep_ids (id INTEGER PRIMARY KEY)")
+        self.db.executemany("INSERT INTO keep_ids VALUES (?)", [(row_id,) for row_id in keep])
+        self.db.execute("DELETE FROM query_history WHERE id NOT IN (SELECT id FROM keep_ids)")
+        self.db.execute("DROP TABLE keep_ids")
+        self.db.executemany('''
+            UPDATE query_history SET fingerprint = ?, first_seen = ?, run_count = ? WHERE id = ?
+        ''', [(key[0], first_seen, run_count, row_id) for key, (row_id, first_seen, run_count) in latest.items()])
+        # Runs from before the stats table have a time and database but no costs
+        self.db.executemany("INSERT INTO query_runs (fingerprint, timestamp, database) VALUES (?, ?, ?)", runs)
+
+    def init_fts(self):
+        # An external-content FTS5 table over query_history, kept in sync by triggers.
+        # The trigram tokenizer matches any substring, like the LIKE search it replaces;
+        # older SQLite builds fall back to word-prefix matching.
+        row = self.db.execute("SELECT sql FROM sqlite_master WHERE name = 'query_history_fts'").fetchone()
+        if row is not None:
+            return 'trigram' if 'trigram' in row[0] else 'unicode61'
+        for tokenizer in ('trigram', 'unicode61'):
+            try:
+                self.db.execute(f'''
+                    CREATE VIRTUAL TABLE query_history_fts USING fts5(
+                        query, content='query_history', content_rowid='id', tokenize='{tokenizer}')
+                ''')
+            except sqlite3.OperationalError:
+                continue
+            break
+        else:
+            return None  # No FTS5 in this SQLite build; searches use LIKE
+        self.db.executescript('''
+            CREATE TRIGGER IF NOT EXISTS query_history_fts_insert AFTER INSERT ON query_history BEGIN
+                INSERT INTO query_history_fts(rowid, query) VALUES (new.id, new.query);
+            END;
+            CREATE TRIGGER IF NOT EXISTS query_history_fts_delete AFTER DELETE ON query_history BEGIN
+                INSERT INTO query_history_fts(query_history_fts, rowid, query) VALUES ('delete', old.id, old.query);
+            END;
+            CREATE TRIGGER IF NOT EXISTS query_history_fts_update AFTER UPDATE ON query_history BEGIN
+                INSERT INTO query_history_fts(query_history_fts, rowid, query) VALUES ('delete', old.id, old.query);
+                INSERT INTO query_history_fts(rowid, query) VALUES (new.id, new.query);
+            END;
+            INSERT INTO query_history_fts(query_history_fts) VALUES ('rebuild');
+        ''')
+        return tokenizer
+
+    def add(self, database, query, duration=None, rows=None, bytes_fetched=None, cached=False):
+        # Safe to call from any thread; the entry is written by the writer thread shortly after.
+        # The query is stored to be run again as it is, so a template run is added with its values written in.
+        if not self.closed:
+            self.queue.put((datetime.now().strftime(DATETIME_FORMAT), database, query, duration, rows,
+                            bytes_fetched, cached))
+
+    def flush(self):
+        # Blocks until every queued entry is committed
+        self.queue.join()
+
+    def write_loop(self):
+        db = self.connect()
+        stopping = False
+        while not stopping:
+            batch = [self.queue.get()]
+            deadline = time.monotonic() + FLUSH_INTERVAL
+            while len(batch) < MAX_BATCH and batch[-1] is not None:
+                try:
+                    batch.append(self.queue.get(timeout=max(deadline - time.monotonic(), 0)))
+                except queue.Empty:
+                    break
+            stopping = batch[-1] is None
+            entries = [entry for entry in batch if entry is not None]
+            try:
+                with db:
+                    # Take the write lock before write() reads the existing row, so another process
+                    # logging the same query (the headless scheduler) can't read it too and lose a run
+                    db.execute("BEGIN IMMEDIATE")
+                    for entry in entries:
+                        self.write(db, *entry)
+            except sqlite3.Error:
+                logging.exception("Could not write %d query history entries", len(entries))
+            for _ in batch:
+                self.queue.task_done()
+        db.close()
+
+    def write(self, db, timestamp, database, query, duration, rows, bytes_fetched, cached):
+        query_fingerprint = fingerprint(query)
+        previous = db.execute('''
+            SELECT id, first_seen, run_count, total_duration, total_rows, total_bytes FROM query_history
+            WHERE fingerprint = ? AND database = ?
+        ''', (query_fingerprint, database)).fetchone()
+        first_seen, run_count, total_duration, total_rows, total_bytes = timestamp, 0, 0, 0, 0
+        if previous is not None:
+            # Re-inserted rather than updated, so ids keep following last-run time for paging
+            db.execute("DELETE FROM query_history WHERE id = ?", (previous[0],))
+            first_seen, run_count, total_duration, total_rows, total_bytes = previous[1:]
+        db.execute('''
+            INSERT INTO query_history (timestamp, database, query, fingerprint, first_seen, run_count,
+                                       total_duration, total_rows, total_bytes)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (timestamp, database, query, query_fingerprint, first_seen, (run_count or 0) + 1,
+              (total_duration or 0) + (duration or 0), (total_rows or 0) + (rows or 0),
+              (total_bytes or 0) + (bytes_fetched or 0)))
+        db.execute('''
+            INSERT INTO query_runs (fingerprint, timestamp, database, duration, rows, bytes, cached)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''', (query_fingerprint, timestamp, database, duration, rows, bytes_fetched, int(cached)))
+
+    def runs(self, query_fingerprint, database, limit=100):
+        return self.db.execute('''
+            SELECT timestamp, database, duration, rows, bytes, cached FROM query_runs
+            WHERE fingerprint = ? AND database = ? ORDER BY timestamp DESC LIMIT ?
+        ''', (query_fingerprint, database, limit)).fetchall()
+
+    def databases(self):
+        return [row[0] for row in self.db.execute("SELECT DISTINCT database FROM query_history ORDER BY database")]
+
+    def match_expression(self, search_term):
+        # None when the term can't use the index (no FTS5, or under three characters for trigrams)
+        if self.fts_tokenizer == 'trigram' and len(search_term) >= 3:
+            return '"' + search_term.replace('"', '""') + '"'
+        if self.fts_tokenizer == 'unicode61' and search_term.strip():
+            return ' '.join('"' + word.replace('"', '""') + '"*' for word in search_term.split())
+        return None
+
+    def filters(self, start, end, search_term=None, database=None):
+        conditions = ["h.timestamp BETWEEN ? AND ?"]
+        params = [start, end]
+        if search_term and self.match_expression(search_term) is None:
+            conditions.append("h.query LIKE ?")
+            params.append(f"%{search_term}%")
+        if database:
+            conditions.append("h.database = ?")
+            params.append(database)
+        return conditions, params
+
+    def search(self, start, end, search_term=None, database=None, sort='newest', before=None, limit=50):
+        # Keyset pagination: `before` is page_key() of the last row on the previous page, so the
+        # cost doesn't grow with how far back the page is.
+        # Returns (id, timestamp, database, query, run_count, total_duration, fingerprint) rows.
+        column = SORT_COLUMNS[sort]
+        conditions, params = self.filters(start, end, search_term, database)
+        match = self.match_expression(search_term) if search_term else None
+        if match is not None and sort == 'newest':
+            # Walk the full-text matches newest first and stop at a page, instead of sorting every
+            # match; ids are assigned in insertion order, so this is the same order as by timestamp.
+            # CROSS JOIN keeps SQLite from driving the join from query_history instead.
+            if before is not None:
+                conditions.append("f.rowid < ?")
+                params.append(before[1])
+            sql = f'''
+                SELECT {HISTORY_COLUMNS}
+                FROM query_history_fts f CROSS JOIN query_history h ON h.id = f.rowid
+                WHERE query_history_fts MATCH ? AND {' AND '.join(conditions)}
+                ORDER BY f.rowid DESC LIMIT ?
+            '''
+            params = [match] + params
+        else:
+            if match is not None:
+                conditions.append("h.id IN (SELECT rowid FROM query_history_fts WHERE query_history_fts MATCH ?)")
+                params.append(match)
+            if before is not None:
+                if sort == 'newest':
+                    # Tightening the BETWEEN bound is what lets SQLite start the index scan at the cursor
+                    params[1] = min(end, before[0])
+                conditions.append(f"(h.{column}, h.id) < (?, ?)")
+                params.extend(before)
+            sql = f'''
+                SELECT {HISTORY_COLUMNS} FROM query_history h
+                WHERE {' AND '.join(conditions)}
+                ORDER BY h.{column} DESC, h.id DESC LIMIT ?
+            '''
+        return self.db.execute(sql, params + [limit]).fetchall()
+
+    def page_key(self, row, sort):
+        return row[HISTORY_COLUMNS.split(', ').index('h.' + SORT_COLUMNS[sort])], row[0]
+
+    def count(self, start, end, search_term=None, database=None):
+        # Counted once per filter and reused while paging. Returns (count, exact).
+        key = (start, end, search_term, database)
+        cached = self.count_cache.get(key)
+        if cached is not None and time.monotonic() - cached[1] < COUNT_CACHE_TTL:
+            return cached[0]
+        conditions, params = self.filters(start, end, search_term, database)
+        match = self.match_expression(search_term) if search_term else None
+        if match is None:
+            sql = f"SELECT 1 FROM query_history h WHERE {' AND '.join(conditions)}"
+        else:
+            sql = f'''
+                SELECT 1 FROM query_history_fts f CROSS JOIN query_history h ON h.id = f.rowid
+                WHERE query_history_fts MATCH ? AND {' AND '.join(conditions)}
+            '''
+            params = [match] + params
+        total = self.db.execute(f"SELECT COUNT(*) FROM ({sql} LIMIT ?)", params + [COUNT_LIMIT + 1]).fetchone()[0]
+        result = (min(total, COUNT_LIMIT), total <= COUNT_LIMIT)
+        self.count_cache[key] = (result, time.monotonic())
+        return result
+
+    def close(self):
+        if not self.closed:
+            self.closed = True
+            self.queue.put(None)
+            self.writer.join()
+        self.db.close()
@@ -1,17 +1,39 @@
 import sys
-import mysql.connector
-import pandas as pd
 from PyQt5.QtWidgets import (QApplication, QWidget, QVBoxLayout, QHBoxLayout, QComboBox, QTextEdit, QPushButton, 
                              QTableWidget, QTableWidgetItem, QLabel, QFileDialog, QDateEdit, QDialog, QLineEdit, 
-                             QFormLayout, QMessageBox, QListWidget, QHeaderView, QSizePolicy, QPlainTextEdit,
-                             QMainWindow, QAbstractItemView,QScrollArea)
-from PyQt5.QtCore import Qt, QDate, QPropertyAnimation, QEasingCurve, pyqtProperty, QTimer
+                             QFormLayout, QMessageBox, QHeaderView, QSizePolicy, QPlainTextEdit,
+                             QMainWindow, QAbstractItemView, QTableView, QCheckBox, QSpinBox, QDoubleSpinBox)
+from PyQt5.QtCore import (Qt, QDate, QPropertyAnimation, QEasingCurve, pyqtProperty, QTimer,
+                          QAbstractTableModel, QModelIndex, QThread, pyqtSignal, QObject)
 from PyQt5.QtGui import QColor, QPalette, QFont
-import json
-import re
 import os
-from datetime import datetime, date, timedelta
-import sqlite3
+import time
+import threading
+from datetime import datetime
+from app_config import load_db_configs, save_db_configs
+from query_templates import load_templates
+from query_validation import classify_query
+from connection_pool import ConnectionPools, PoolTimeoutError
+from db_backends import (DATABASE_ERRORS, PROGRAMMING_ERRORS, INTEGRITY_ERRORS, OPERATIONAL_ERRORS, BACKENDS,
+                         MYSQL_BACKENDS, DEFAULT_BACKEND, available_backends, backend_for)
+from result_buffers import fetch_dataframe, concat_frames, ResultAssembler, DEFAULT_BATCH_SIZE
+from script_generator import build_script, detect_primary_key, OUTPUT_FORMATS
+from result_cache import ResultCache, cache_key, frame_size, DEFAULT_CACHE_TTL
+from partitioned_query import PartitionedQuery, find_date_range, PARTITION_UNITS
+from exporters import EXPORT_FORMATS, ExportError, available_formats, export_cursor, export_frame, format_for_path
+from scheduled_jobs import (JobScheduler, load_jobs, save_jobs, next_run_after,
+                            OVERLAP_POLICIES, CATCH_UP_POLICIES)
+from saved_results import open_saved_result
+from result_view import ResultView, FILTER_OPERATORS, AGGREGATES
+from results_catalog import ResultsCatalog, SORT_COLUMNS
+from history_store import HistoryStore, SORT_COLUMNS as HISTORY_SORTS
+from collections import OrderedDict
+from query_preflight import (preflight_query, preflight_thresholds, limited_query, explain_plan, estimated_result_rows,
+                             PreviewPager, DEFAULT_ROW_LIMIT)
+
+from query_metrics import QueryTimings, MetricsLog, timed, format_seconds
+
+DEFAULT_PREVIEW_ROWS = 1000
 
 class ScheduleQueryDialog(QDialog):
     def __init__(self, parent=None):
@@ -33,15 +55,42 @@ class ScheduleQueryDialog(QDialog):
         layout.addLayout(interval_layout)
 
         self.output_file = QLineEdit()
-        layout.addWidget(QLabel("Output file name (without .csv):"))
+        layout.addWidget(QLabel("Output file name (without extension):"))
         layout.addWidget(self.output_file)
 
+        self.output_formats = available_formats()
+        self.output_format = QComboBox()
+        self.output_format.addItems([EXPORT_FORMATS[output_format].label for output_format in self.output_formats])
+        layout.addWidget(QLabel("Output format:"))
+        layout.addWidget(self.output_format)
+
+        # Incremental jobs only fetch rows past the last value seen in this column
+        self.watermark_column = QLineEdit()
+        self.watermark_column.setPlaceholderText("e.g. added_on or id; leave empty to fetch everything each run")
+        layout.addWidget(QLabel("Watermark column (optional):"))
+        layout.addWidget(self.watermark_column)
+
+        policy_layout = QFormLayout()
+        self.overlap_policy = QComboBox()
+        self.overlap_policy.addItems(["Skip the run", "Queue the run"])
+        policy_layout.addRow("If the previous run is still going:", self.overlap_policy)
+        self.catch_up_policy = QComboBox()
+        self.catch_up_policy.addItems(["Run once", "Run every missed interval", "Skip missed runs"])
+        policy_layout.addRow("After missed runs:", self.catch_up_policy)
+        self.jitter_input = QLineEdit("0")
+        policy_layout.addRow("Random delay (seconds):", self.jitter_input)
+        layout.addLayout(policy_layout)
+
         self.schedule_button = QPushButton("Schedule")
         self.schedule_button.clicked.connect(self.accept)
         layout.addWidget(self.schedule_button)
 
         self.setLayout(layout)
 
+class SchedulerSignals(QObject):
+    # Scheduled jobs finish on worker threads; this carries the result back to the GUI thread
+    job_finished = pyqtSignal(object, str, object)
+
 class NotificationWidget(QWidget):
     def __init__(self, message, parent=None):
         super().__init__(parent)
@@ -193,6 +242,48 @@ class AnimatedButton(QPushButton):
 
     color = pyqtProperty(QColor, fset=setColor)
 
+class ScriptOptionsDialog(QDialog):
+    def __init__(self, key_column=None, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("Script Options")
+        layout = QFormLayout()
+
+        self.mode_combo = QComboBox()
+        self.mode_combo.addItems(["Keyset pagination", "Single streaming cursor"])
+        layout.addRow("Fetch mode:", self.mode_combo)
+
+        # Prefilled with the table's primary key when one was found
+        self.key_input = QLineEdit(key_column or "")
+        self.key_input.setPlaceholderText("Unique, ordered column (e.g. id)")
+        layout.addRow("Key column:", self.key_input)
+        self.mode_combo.currentIndexChanged.connect(lambda index: self.key_input.setEnabled(index == 0))
+        if not key_column:
+            self.mode_combo.setCurrentIndex(1)
+            self.key_input.setEnabled(False)
+
+        self.format_combo = QComboBox()
+        self.format_combo.addItems([output_format.upper() for output_format in OUTPUT_FORMATS])
+        layout.addRow("Output format:", self.format_combo)
+
+        self.output_input = QLineEdit("query_results")
+        layout.addRow("Output file (without extension):", self.output_input)
+
+        ok_button = AnimatedButton("Generate")
+        ok_button.clicked.connect(self.accept)
+        layout.addRow(ok_button)
+        self.setLayout(layout)
+
+    def key_column(self):
+        if self.mode_combo.currentIndex() == 0:
+            return self.key_input.text().strip() or None
+        return None
+
+    def output_format(self):
+        return OUTPUT_FORMATS[self.format_combo.currentIndex()]
+
+    def output_file(self):
+        return f"{self.output_input.text().strip() or 'query_results'}.{self.output_format()}"
+
 class ScriptDialog(QDialog):
     def __init__(self, script, parent=None):
         super().__init__(parent)
@@ -220,6 +311,418 @@ class ScriptDialog(QDialog):
             with open(fileName, 'w') as f:
                 f.write(self.script_text.toPlainText())
             QMessageBox.information(self, "Download Complete", f"Python script saved as {fileName}")
+
+class ResultTableModel(QAbstractTableModel):
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.columns = []
+        self.headers = []
+        self.row_count = 0
+        self.rows = None  # positions of the rows to show, in display order; None shows every row as loaded
+
+    def set_dataframe(self, df):
+        self.beginResetModel()
+        # Keep references to the column arrays only; cells are formatted when the view asks for them
+        self.columns = [df.iloc[:, j].array for j in range(df.shape[1])]
+        self.headers = [str(column) for column in df.columns]
+        self.row_count = len(df)
+        self.rows = None
+        self.endResetModel()
+
+    def clear(self):
+        self.beginResetModel()
+        self.columns = []
+        self.headers = []
+        self.row_count = 0
+        self.rows = None
+        self.endResetModel()
+
+    def set_rows(self, rows):
+        # A filtered or sorted view of the same columns; nothing is copied
+        self.beginResetModel()
+        self.rows = rows
+        if rows is not None:
+            self.row_count = len(rows)
+        else:
+            self.row_count = len(self.columns[0]) if self.columns else 0
+        self.endResetModel()
+
+    def extend_dataframe(self, df):
+        # df holds the rows already shown plus new ones; appending keeps the scroll position and selection
+        if len(df) <= self.row_count:
+            return
+        self.beginInsertRows(QModelIndex(), self.row_count, len(df) - 1)
+        self.columns = [df.iloc[:, j].array for j in range(df.shape[1])]
+        self.row_count = len(df)
+        self.rows = None
+        self.endInsertRows()
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else self.row_count
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.columns)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid() or role != Qt.DisplayRole:
+            return None
+        row = index.row() if self.rows is None else self.rows[index.row()]
+        return str(self.columns[index.column()][row])
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role != Qt.DisplayRole:
+            return None
+        if orientation == Qt.Horizontal:
+            # The header can still ask about old sections while the view switches models
+            return self.headers[section] if section < len(self.headers) else None
+        return str(section + 1)
+
+    def sample_rows(self, limit=200):
+        # Evenly spaced rows used to estimate column widths without scanning the whole result
+        if self.row_count <= limit:
+            return range(self.row_count)
+        step = self.row_count / limit
+        return [int(i * step) for i in range(limit)]
+
+class LazyResultModel(QAbstractTableModel):
+    # Shows a saved result file page by page; only the pages the view scrolls to are parsed
+    PAGE_SIZE = 500
+    MAX_PAGES = 40
+
+    def __init__(self, source, parent=None):
+        super().__init__(parent)
+        self.source = source
+        self.headers = [str(column) for column in source.columns]
+        self.row_count = source.row_count
+        self.pages = OrderedDict()
+
+    def refresh_row_count(self):
+        # Called while the file is still being indexed; appends the rows found since the last call
+        row_count = self.source.row_count
+        if row_count > self.row_count:
+            # The page holding the old last row may have been read short
+            self.pages.pop(self.row_count // self.PAGE_SIZE, None)
+            self.beginInsertRows(QModelIndex(), self.row_count, row_count - 1)
+            self.row_count = row_count
+            self.endInsertRows()
+        return self.source.complete
+
+    def page(self, number):
+        rows = self.pages.get(number)
+        if rows is None:
+            start = number * self.PAGE_SIZE
+            rows = self.source.read_rows(start, start + self.PAGE_SIZE)
+            self.pages[number] = rows
+            if len(self.pages) > self.MAX_PAGES:
+                self.pages.popitem(last=False)
+        else:
+            self.pages.move_to_end(number)
+        return rows
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else self.row_count
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.headers)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid() or role != Qt.DisplayRole:
+            return None
+        rows = self.page(index.row() // self.PAGE_SIZE)
+        offset = index.row() % self.PAGE_SIZE
+        if offset >= len(rows) or index.column() >= len(rows[offset]):
+            return None
+        return str(rows[offset][index.column()])
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role != Qt.DisplayRole:
+            return None
+        if orientation == Qt.Horizontal:
+            return self.headers[section] if section < len(self.headers) else None
+        return str(section + 1)
+
+    def sample_rows(self, limit=200):
+        # Only the first page, so sizing columns doesn't read pages from all over the file
+        return range(min(self.row_count, limit))
+
+    def close(self):
+        self.source.close()
+        self.pages.clear()
+
+def execute_query_on(pool, connection, query, params=None, timings=None):
+    # Returns the cursor to fetch from. With params the query runs as a statement prepared once
+    # per pooled connection, and that cursor must stay open for the next run.
+    with timed(timings, 'execute'):
+        if params is not None:
+            return pool.prepared(connection, query).execute(params)
+        # Streaming cursor: rows stay on the server until fetched batch by batch
+        cursor = pool.backend.streaming_cursor(connection)
+        cursor.execute(query)
+        return cursor
+
+class QueryWorker(QThread):
+    preview_ready = pyqtSignal(object)
+    rows_fetched = pyqtSignal(int)
+    query_finished = pyqtSignal(object)
+    query_failed = pyqtSignal(object)
+    query_cancelled = pyqtSignal()
+    estimate_ready = pyqtSignal(object)
+
+    def __init__(self, pool, query, batch_size=DEFAULT_BATCH_SIZE, preview_rows=1000, estimate_query=None,
+                 timings=None, parent=None, params=None, pager=None):
+        super().__init__(parent)
+        self.pool = pool
+        self.query = query
+        self.params = params  # values for a template's placeholders; the query then runs prepared
+        self.pager = pager  # a PreviewPager: the worker runs its next page instead of the query
+        self.timings = timings
+        self.batch_size = batch_size
+        self.preview_rows = preview_rows
+        self.estimate_query = estimate_query  # EXPLAINed first for the optimizer's row estimate
+        self.connection = None
+        self.connection_id = None
+        self.cancel_requested = False
+
+    def run(self):
+        connection = None
+        failed = False
+        try:
+            connection = self.pool.acquire(timeout=30, timings=self.timings)
+            self.connection_id = self.pool.backend.connection_id(connection)
+            self.connection = connection
+            if self.estimate_query is not None:
+                self.estimate_ready.emit(self.estimate_rows(connection))
+            query, params = self.query, self.params
+            if self.pager is not None:
+                if self.pager.fetched == 0:
+                    self.find_page_order(connection)
+                query, params = self.pager.page()
+            cursor = execute_query_on(self.pool, connection, query, params, self.timings)
+
+            def on_batch(rows, total_rows):
+                if total_rows == len(rows):
+                    # Show the first rows while the rest of the result is still streaming
+                    preview = ResultAssembler(cursor.description, self.preview_rows)
+                    preview.add_rows(rows[:self.preview_rows])
+                    self.preview_ready.emit(preview.to_dataframe())
+                self.rows_fetched.emit(total_rows)
+
+            df = fetch_dataframe(cursor, self.batch_size, on_batch, lambda: self.cancel_requested, self.timings)
+
+            if self.cancel_requested:
+                self.query_cancelled.emit()
+            else:
+                if params is None:
+                    cursor.close()  # a prepared statement's cursor stays open for the next run
+                self.query_finished.emit(df)
+        except (*DATABASE_ERRORS, PoolTimeoutError) as error:
+            failed = True
+            if self.cancel_requested:
+                self.query_cancelled.emit()
+            else:
+                self.query_failed.emit(error)
+        except Exception as error:
+            # Anything else from building the frame; the window still has to leave the running state
+            failed = True
+            self.query_failed.emit(error)
+        finally:
+            self.connection = None
+            if connection is not None:
+                # A cancelled or failed run can leave unread rows behind, so don't reuse that connection
+                self.pool.release(connection, discard=failed or self.cancel_requested)
+
+    def find_page_order(self, connection):
+        # Looked up here rather than on the GUI thread; without a key the pages use OFFSET
+        try:
+            self.pager.find_order(connection)
+        except DATABASE_ERRORS:
+            pass
+
+    def estimate_rows(self, connection):
+        try:
+            return estimated_result_rows(explain_plan(connection, self.estimate_query, self.params, self.pool.backend))
+        except (*DATABASE_ERRORS, ValueError, TypeError, KeyError):
+            return None
+
+    def cancel(self):
+        self.cancel_requested = True
+        if self.connection is None:
+            return
+        # MySQL's KILL QUERY needs a separate connection; do it off the GUI thread
+        threading.Thread(target=self.kill_query, daemon=True).start()
+
+    def kill_query(self):
+        try:
+            self.pool.backend.cancel(self.pool.connection_config, self.connection, self.connection_id)
+        except (*DATABASE_ERRORS, AttributeError):
+            pass  # The query may have finished in the meantime
+
+class PreflightWorker(QThread):
+    # EXPLAINs a query before it runs, so a slow server or the first pooled connect doesn't freeze
+    # the window. report_ready carries the PreflightReport, or None when the plan couldn't be read.
+    report_ready = pyqtSignal(object)
+
+    def __init__(self, pools, db_config, query, params=None, literal_query=None, parent=None):
+        super().__init__(parent)
+        self.pools = pools
+        self.db_config = db_config
+        self.query = query
+        self.params = params
+        self.literal_query = literal_query
+        self.cancel_requested = False
+
+    def run(self):
+        try:
+            with self.pools.connection(self.db_config, timeout=5) as connection:
+                report = preflight_query(connection, self.query, self.params, backend_for(self.db_config),
+                                         self.literal_query)
+        except (*DATABASE_ERRORS, PoolTimeoutError, ValueError, TypeError):
+            report = None
+        self.report_ready.emit(report)
+
+    def cancel(self):
+        # The EXPLAIN itself is quick once connected; the run just doesn't go ahead
+        self.cancel_requested = True
+
+
+class PrimaryKeyWorker(QThread):
+    # Looks up the keyset column for the script dialog without blocking the window on SHOW KEYS
+    key_ready = pyqtSignal(object)
+
+    def __init__(self, pools, db_config, query, parent=None):
+        super().__init__(parent)
+        self.pools = pools
+        self.db_config = db_config
+        self.query = query
+
+    def run(self):
+        try:
+            with self.pools.connection(self.db_config, timeout=5) as connection:
+                key_column = detect_primary_key(connection, self.query)
+        except (*DATABASE_ERRORS, PoolTimeoutError):
+            key_column = None
+        self.key_ready.emit(key_column)
+
+
+class PartitionWorker(QThread):
+    partition_updated = pyqtSignal(object)
+    run_finished = pyqtSignal(bool)
+
+    def __init__(self, partitioned_query, parent=None, timings=None):
+        super().__init__(parent)
+        self.partitioned_query = partitioned_query
+        self.timings = timings
+
+    def run(self):
+        complete = self.partitioned_query.run(on_update=self.partition_updated.emit, timings=self.timings)
+        self.run_finished.emit(complete)
+
+    def cancel(self):
+        self.partitioned_query.cancel()
+
+class PartitionProgressDialog(QDialog):
+    def __init__(self, partitioned_query, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("Partitioned Query")
+        self.setGeometry(150, 150, 500, 400)
+        self.partitioned_query = partitioned_query
+        layout = QVBoxLayout(self)
+
+        self.table = QTableWidget(len(partitioned_query.partitions), 3)
+        self.table.setHorizontalHeaderLabels(["Partition", "Status", "Rows"])
+        self.table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+        for partition in partitioned_query.partitions:
+            self.table.setItem(partition.index, 0, QTableWidgetItem(partition.label()))
+            self.update_partition(partition)
+        layout.addWidget(self.table)
+
+        self.summary_label = QLabel()
+        layout.addWidget(self.summary_label)
+
+        button_layout = QHBoxLayout()
+        self.retry_btn = AnimatedButton("Retry Failed")
+        self.retry_btn.setEnabled(False)
+        button_layout.addWidget(self.retry_btn)
+        self.cancel_btn = AnimatedButton("Cancel")
+        self.cancel_btn.clicked.connect(partitioned_query.cancel)
+        button_layout.addWidget(self.cancel_btn)
+        layout.addLayout(button_layout)
+
+    def update_partition(self, partition):
+        status = partition.status
+        if partition.error is not None:
+            status = f"failed: {partition.error}"
+        self.table.setItem(partition.index, 1, QTableWidgetItem(status))
+        self.table.setItem(partition.index, 2, QTableWidgetItem(str(partition.rows)))
+        partitions = self.partitioned_query.partitions
+        done = sum(1 for p in partitions if p.status == 'done')
+        failed = sum(1 for p in partitions if p.status == 'failed')
+        self.setWindowTitle(f"Partitioned Query - {done}/{len(partitions)} done")
+        if hasattr(self, 'summary_label'):
+            self.summary_label.setText(f"{done} of {len(partitions)} partitions done, {failed} failed, "
+                                       f"{sum(p.rows for p in partitions)} rows")
+
+    def set_running(self, running):
+        self.retry_btn.setEnabled(not running and bool(self.partitioned_query.pending()))
+        self.cancel_btn.setEnabled(running)
+
+class ExportWorker(QThread):
+    export_finished = pyqtSignal(str, int)
+    export_failed = pyqtSignal(str)
+
+    def __init__(self, df, export_format, path, timings=None, parent=None):
+        super().__init__(parent)
+        self.df = df
+        self.columns = [str(column) for column in df.columns]
+        self.export_format = export_format
+        self.path = path
+        self.timings = timings
+
+    def run(self):
+        try:
+            with timed(self.timings, 'export'):
+                rows = export_frame(self.df, self.export_format, self.path)
+        except (ExportError, OSError, ValueError) as error:
+            self.export_failed.emit(str(error))
+        else:
+            self.export_finished.emit(self.path, rows)
+
+class QueryExportWorker(QThread):
+    # Runs the query on an unbuffered cursor and writes rows to the file as they arrive,
+    # for results too large to hold in the table
+    export_finished = pyqtSignal(str, int)
+    export_failed = pyqtSignal(str)
+
+    def __init__(self, pool, query, export_format, path, timings=None, parent=None, params=None):
+        super().__init__(parent)
+        self.pool = pool
+        self.query = query
+        self.params = params
+        self.columns = []
+        self.export_format = export_format
+        self.path = path
+        self.timings = timings
+
+    def run(self):
+        connection = None
+        failed = False
+        try:
+            connection = self.pool.acquire(timeout=30, timings=self.timings)
+            cursor = execute_query_on(self.pool, connection, self.query, self.params, self.timings)
+            # Fetching and writing interleave batch by batch, so they are timed together
+            with timed(self.timings, 'export'):
+                self.columns, rows = export_cursor(cursor, self.export_format, self.path)
+            if self.params is None:
+                cursor.close()
+        except (*DATABASE_ERRORS, PoolTimeoutError, ExportError, OSError, ValueError) as error:
+            failed = True
+            self.export_failed.emit(str(error))
+        else:
+            self.export_finished.emit(self.path, rows)
+        finally:
+            if connection is not None:
+                self.pool.release(connection, discard=failed)
+
 class AddDatabaseDialog(QDialog):
     def __init__(self, parent=None):
         super().__init__(parent)
@@ -247,12 +750,17 @@ class AddDatabaseDialog(QDialog):
         self.user_input = QLineEdit()
         self.password_input = QLineEdit()
         self.database_input = QLineEdit()
+        self.type_combo = QComboBox()
+        for name in available_backends():
+            self.type_combo.addItem(BACKENDS[name].label, name)
         
         layout.addRow("Name:", self.name_input)
+        layout.addRow("Type:", self.type_combo)
         layout.addRow("Host:", self.host_input)
         layout.addRow("User:", self.user_input)
         layout.addRow("Password:", self.password_input)
         layout.addRow("Database:", self.database_input)
+        self.type_combo.currentIndexChanged.connect(self.update_fields)
         
         buttons = QHBoxLayout()
         self.ok_button = AnimatedButton("OK")
@@ -266,10 +774,41 @@ class AddDatabaseDialog(QDialog):
         self.ok_button.clicked.connect(self.accept)
         self.cancel_button.clicked.connect(self.reject)
 
+    def database_type(self):
+        return self.type_combo.currentData()
+
+    def update_fields(self):
+        # File-based types only need the path, entered as the database
+        server = self.database_type() in MYSQL_BACKENDS
+        for field in (self.host_input, self.user_input, self.password_input):
+            field.setEnabled(server)
+
 class DatabaseApp(QMainWindow):
     def __init__(self):
         super().__init__()
         self.current_df = None
+        self.current_query = None
+        self.query_worker = None
+        self.saved_result_model = None
+        self.saved_result_timer = None
+        self.preview_query = None  # full query behind a partial preview, while more rows remain
+        self.preview_db_config = None
+        self.preview_estimate = None
+        self.preview_pager = None  # PreviewPager of the current preview
+        self.preview_run = None  # (query, offset) of the preview page being fetched
+        self.running_params = None
+        self.running_literal = None  # the running template query with its values written in
+        self.query_templates = load_templates()
+        self.active_template = None  # the template in the editor, while its text is unchanged
+        self.template_inputs = {}  # parameter name -> input widget, for parameters not bound to the date pickers
+        self.result_view = None  # filters and sort order over current_df
+        self.group_view = None  # the grouped rows while a group-by is shown
+        self.group_settings = None  # (by column, aggregate, value column)
+        self.query_timings = None
+        self.metrics_log = MetricsLog()
+        self.connection_pools = ConnectionPools()
+        self.result_cache = ResultCache()
+        self.init_results_catalog()
         self.load_db_configs()
         self.query_history = {}
         self.init_history_db()
@@ -279,32 +818,10 @@ class DatabaseApp(QMainWindow):
         self.start_scheduler()
 
     def load_db_configs(self):
-        try:
-            with open('db_configs.json', 'r') as f:
-                self.db_configs = json.load(f)
-        except FileNotFoundError:
-            self.db_configs = [
-            {
-                "name": "Db1",
-                "host": "",
-                "user": "",
-                "password": "",
-                "database": ""
-            },
-            {
-                "name": "DB2",
-                "host": "",
-                "port": 3306,
-                "user": "",
-                "password": "",
-                "database": "",
-                "ssl_ca": "cacert.pem"
-            }
-        ]
+        self.db_configs = load_db_configs()
 
     def save_db_configs(self):
-        with open('db_configs.json', 'w') as f:
-            json.dump(self.db_configs, f)
+        save_db_configs(self.db_configs)
 
 
     def initUI(self):
@@ -338,6 +855,14 @@ class DatabaseApp(QMainWindow):
         date_layout.addWidget(self.start_date)
         date_layout.addWidget(QLabel("End Date:"))
         date_layout.addWidget(self.end_date)
+        date_layout.addWidget(QLabel("Template:"))
+        self.template_combo = QComboBox()
+        self.template_combo.addItems([template.name for template in self.query_templates])
+        StyleHelper.style_combo_box(self.template_combo)
+        date_layout.addWidget(self.template_combo)
+        # Inputs for the active template's other parameters
+        self.template_params_layout = QHBoxLayout()
+        date_layout.addLayout(self.template_params_layout)
         main_layout.addLayout(date_layout)
 
         # Query input
@@ -349,7 +874,7 @@ class DatabaseApp(QMainWindow):
         # Buttons
         button_layout = QHBoxLayout()
         buttons = [
-            ('Use Predefined Query', self.use_predefined_query),
+            ('Use Template', self.use_template),
             ('Execute Query', self.execute_query),
             ('Show Query History', self.show_query_history),
             ('Generate Python Script', self.generate_python_script)
@@ -358,11 +883,42 @@ class DatabaseApp(QMainWindow):
             btn = AnimatedButton(text)
             btn.clicked.connect(slot)
             button_layout.addWidget(btn)
+            if text == 'Execute Query':
+                self.execute_btn = btn
             if text == 'Generate Python Script':
                 self.generate_script_btn = btn
                 self.generate_script_btn.setEnabled(False)
+        self.partition_btn = AnimatedButton('Run Partitioned')
+        self.partition_btn.clicked.connect(self.execute_partitioned_query)
+        button_layout.addWidget(self.partition_btn)
+        self.partition_unit = QComboBox()
+        self.partition_unit.addItems([unit.capitalize() for unit in PARTITION_UNITS])
+        StyleHelper.style_combo_box(self.partition_unit)
+        button_layout.addWidget(self.partition_unit)
+        self.cancel_btn = AnimatedButton('Cancel Query')
+        self.cancel_btn.clicked.connect(self.cancel_query)
+        self.cancel_btn.setEnabled(False)
+        button_layout.addWidget(self.cancel_btn)
         main_layout.addLayout(button_layout)
 
+        # Result cache controls
+        cache_layout = QHBoxLayout()
+        self.use_cache_checkbox = QCheckBox('Use result cache')
+        cache_layout.addWidget(self.use_cache_checkbox)
+        self.refresh_btn = AnimatedButton('Force Refresh')
+        self.refresh_btn.clicked.connect(lambda: self.execute_query(force_refresh=True))
+        cache_layout.addWidget(self.refresh_btn)
+        # Preview mode fetches only the first rows with a server-side LIMIT
+        self.preview_checkbox = QCheckBox('Preview first')
+        cache_layout.addWidget(self.preview_checkbox)
+        self.preview_rows_spin = QSpinBox()
+        self.preview_rows_spin.setRange(10, 1000000)
+        self.preview_rows_spin.setSingleStep(1000)
+        self.preview_rows_spin.setValue(DEFAULT_PREVIEW_ROWS)
+        self.preview_rows_spin.setSuffix(' rows')
+        cache_layout.addWidget(self.preview_rows_spin)
+        main_layout.addLayout(cache_layout)
+
         # Schedule Query, View Scheduled Queries, and View Saved Results buttons
         schedule_layout = QHBoxLayout()
         schedule_buttons = [
@@ -377,21 +933,19 @@ class DatabaseApp(QMainWindow):
             schedule_layout.addWidget(btn)
         main_layout.addLayout(schedule_layout)
 
-        self.table = QTableWidget()
-        self.table.setVerticalScrollBarPolicy(Qt.ScrollBarAlwaysOff)  # Disable table's vertical scrollbar
-        self.table.setHorizontalScrollBarPolicy(Qt.ScrollBarAlwaysOff)  # Disable table's horizontal scrollbar
-
-        # Create a scroll area
-        scroll_area = QScrollArea()
-        scroll_area.setWidgetResizable(True)
-        scroll_area.setWidget(self.table)
-
-        # Add the scroll area to the main layout
-        main_layout.addWidget(scroll_area)
+        # Results view; only the visible rows are ever formatted
+        self.table_model = ResultTableModel(self)
+        self.table = QTableView()
+        self.table.setModel(self.table_model)
+        self.table.verticalHeader().setSectionResizeMode(QHeaderView.Fixed)
+        # Clicking a header sorts the loaded rows; nothing is re-queried
+        self.table.horizontalHeader().setSectionsClickable(True)
+        self.table.horizontalHeader().sectionClicked.connect(self.sort_results)
+        main_layout.addWidget(self.table)
 
         # Apply table styling
         self.table.setStyleSheet("""
-            QTableWidget {
+            QTableView {
                 background-color: #e9ebed;
                 color: #000000;
                 gridline-color: #7f8c8d;
@@ -430,11 +984,84 @@ class DatabaseApp(QMainWindow):
             }
         """)
 
-        
+        # Filter and group the loaded result
+        refine_layout = QHBoxLayout()
+        refine_layout.addWidget(QLabel("Filter:"))
+        self.filter_column_combo = QComboBox()
+        refine_layout.addWidget(self.filter_column_combo)
+        self.filter_op_combo = QComboBox()
+        self.filter_op_combo.addItems(FILTER_OPERATORS)
+        self.filter_op_combo.currentTextChanged.connect(self.update_filter_value)
+        refine_layout.addWidget(self.filter_op_combo)
+        self.filter_value_input = QLineEdit()
+        self.filter_value_input.setPlaceholderText("Value")
+        self.filter_value_input.returnPressed.connect(self.add_result_filter)
+        refine_layout.addWidget(self.filter_value_input)
+        self.add_filter_btn = AnimatedButton('Add Filter')
+        self.add_filter_btn.clicked.connect(self.add_result_filter)
+        refine_layout.addWidget(self.add_filter_btn)
+        self.clear_filters_btn = AnimatedButton('Clear Filters')
+        self.clear_filters_btn.clicked.connect(self.clear_result_filters)
+        refine_layout.addWidget(self.clear_filters_btn)
+        refine_layout.addWidget(QLabel("Group by:"))
+        self.group_column_combo = QComboBox()
+        refine_layout.addWidget(self.group_column_combo)
+        self.group_aggregate_combo = QComboBox()
+        self.group_aggregate_combo.addItems(AGGREGATES)
+        self.group_aggregate_combo.currentTextChanged.connect(self.update_group_value)
+        refine_layout.addWidget(self.group_aggregate_combo)
+        self.group_value_combo = QComboBox()
+        refine_layout.addWidget(self.group_value_combo)
+        self.group_btn = AnimatedButton('Group')
+        self.group_btn.clicked.connect(self.group_results)
+        refine_layout.addWidget(self.group_btn)
+        self.ungroup_btn = AnimatedButton('Ungroup')
+        self.ungroup_btn.clicked.connect(self.ungroup_results)
+        refine_layout.addWidget(self.ungroup_btn)
+        refine_layout.addStretch()
+        for combo in (self.filter_column_combo, self.filter_op_combo, self.group_column_combo,
+                      self.group_aggregate_combo, self.group_value_combo):
+            StyleHelper.style_combo_box(combo)
+        main_layout.addLayout(refine_layout)
+        self.view_label = QLabel()
+        self.view_label.setStyleSheet("color: #95a5a6;")
+        main_layout.addWidget(self.view_label)
+        self.refine_widgets = [self.filter_column_combo, self.filter_op_combo, self.filter_value_input,
+                               self.add_filter_btn, self.clear_filters_btn, self.group_column_combo,
+                               self.group_aggregate_combo, self.group_value_combo, self.group_btn, self.ungroup_btn]
+        self.reset_result_view(None)
 
         # Shape information
+        shape_layout = QHBoxLayout()
         self.shape_label = QLabel()
-        main_layout.addWidget(self.shape_label)
+        shape_layout.addWidget(self.shape_label)
+        # In-memory size of the loaded result; the tooltip breaks it down by column
+        self.memory_label = QLabel()
+        self.memory_label.setStyleSheet("color: #95a5a6;")
+        shape_layout.addWidget(self.memory_label)
+        # Where the last run spent its time; the tooltip has totals
+        self.timing_label = QLabel()
+        self.timing_label.setStyleSheet("color: #95a5a6;")
+        shape_layout.addWidget(self.timing_label)
+        self.cache_label = QLabel()
+        self.cache_label.setStyleSheet("color: #f1c40f;")
+        shape_layout.addWidget(self.cache_label)
+        self.fetch_more_btn = AnimatedButton('Fetch More')
+        self.fetch_more_btn.clicked.connect(self.fetch_more_rows)
+        self.fetch_more_btn.setEnabled(False)
+        shape_layout.addWidget(self.fetch_more_btn)
+        self.export_full_btn = AnimatedButton('Export Full Result...')
+        self.export_full_btn.clicked.connect(self.export_full_result)
+        self.export_full_btn.setEnabled(False)
+        shape_layout.addWidget(self.export_full_btn)
+        shape_layout.addStretch()
+        main_layout.addLayout(shape_layout)
+
+        # Progress of the running query
+        self.progress_label = QLabel()
+        main_layout.addWidget(self.progress_label)
+        self.progress_timer = QTimer(self)
+        self.progress_timer.timeout.connect(self.update_progress_label)
 
         # Download button
         self.download_btn = AnimatedButton('Download Results')
@@ -454,149 +1081,764 @@ class DatabaseApp(QMainWindow):
         if dialog.exec_():
             new_db = {
                 "name": dialog.name_input.text(),
-                "host": dialog.host_input.text(),
-                "user": dialog.user_input.text(),
-                "password": dialog.password_input.text(),
+                "type": dialog.database_type(),
                 "database": dialog.database_input.text()
             }
+            if new_db["type"] in MYSQL_BACKENDS:
+                new_db.update(host=dialog.host_input.text(), user=dialog.user_input.text(),
+                              password=dialog.password_input.text())
             self.db_configs.append(new_db)
             self.save_db_configs()
             self.update_db_combo()
 
-    def use_predefined_query(self):
-        start_date = self.start_date.date().toString("yyyy-MM-dd")
-        end_date = self.end_date.date().toString("yyyy-MM-dd")
-        predefined_query = f"""
-        SELECT * FROM `cta_report` 
-        WHERE `added_on` BETWEEN '{start_date} 00:00:00.000000' AND '{end_date} 23:59:59.999999'
-        """
-        self.query_input.setPlainText(predefined_query)
+    def use_template(self):
+        # The query keeps its :name placeholders; their values are bound when it runs, so every
+        # date range shares one statement text (and one prepared statement per connection)
+        if not self.query_templates:
+            return
+        template = self.query_templates[self.template_combo.currentIndex()]
+        self.active_template = template
+        self.query_input.setPlainText(template.query)
+        while self.template_params_layout.count():
+            self.template_params_layout.takeAt(0).widget().deleteLater()
+        self.template_inputs = {}
+        for param in template.params:
+            if param.get('source'):
+                continue
+            if param['type'] in ('date', 'datetime'):
+                widget = QDateEdit(calendarPopup=True)
+                widget.setDate(QDate.fromString(param['default'], "yyyy-MM-dd") if param.get('default')
+                               else QDate.currentDate())
+            elif param['type'] == 'int':
+                widget = QSpinBox()
+                widget.setRange(-2**31, 2**31 - 1)
+                widget.setValue(int(param.get('default', 0)))
+            elif param['type'] == 'float':
+                widget = QDoubleSpinBox()
+                widget.setRange(-1e12, 1e12)
+                widget.setDecimals(4)
+                widget.setValue(float(param.get('default', 0)))
+            else:
+                widget = QLineEdit(str(param.get('default', '')))
+            self.template_params_layout.addWidget(QLabel(f"{param.get('label', param['name'])}:"))
+            self.template_params_layout.addWidget(widget)
+            self.template_inputs[param['name']] = widget
+
+    def template_values(self):
+        # Raw values of the active template's parameters, from the date pickers and its own inputs
+        values = {}
+        for param in self.active_template.params:
+            source = param.get('source')
+            widget = getattr(self, source) if source else self.template_inputs[param['name']]
+            if isinstance(widget, QDateEdit):
+                values[param['name']] = widget.date().toPyDate()
+            elif isinstance(widget, QLineEdit):
+                values[param['name']] = widget.text()
+            else:
+                values[param['name']] = widget.value()
+        return values
+
+    def bind_template(self, query, backend, literal=False):
+        # (query, params) to run. While the editor holds the active template unchanged its placeholders
+        # are bound, or with literal=True written in as values; otherwise the text runs as it is.
+        # None when a value doesn't fit its parameter's type.
+        if self.active_template is None or not self.active_template.matches(query):
+            return query, None
+        try:
+            if literal:
+                return self.active_template.literal_query(self.template_values(), backend), None
+            return self.active_template.bind(self.template_values(), backend)
+        except (ValueError, TypeError) as error:
+            QMessageBox.warning(self, "Template Parameters", str(error))
+            return None
         
     def display_results(self, df):
-        self.table.setColumnCount(len(df.columns))
-        self.table.setRowCount(len(df))
-        self.table.setHorizontalHeaderLabels(df.columns)
+        self.close_saved_result()
+        self.set_preview_state(None)
+        self.table_model.set_dataframe(df)
+        self.reset_result_view(df)
+        self.resize_result_columns()
+        self.shape_label.setText(f"Shape: {df.shape[0]} rows, {df.shape[1]} columns")
+        self.show_memory_usage(df)
 
-        for i in range(len(df)):
-            for j in range(len(df.columns)):
-                item = QTableWidgetItem(str(df.iloc[i, j]))
-                self.table.setItem(i, j, item)
+    def show_memory_usage(self, df):
+        if df is None:
+            self.memory_label.setText("")
+            self.memory_label.setToolTip("")
+            return
+        usage = df.memory_usage(index=False, deep=True)
+        total = usage.sum()
+        self.memory_label.setText(f"Memory: {total / 1024 / 1024:.1f} MB" if total >= 1024 * 1024
+                                  else f"Memory: {total / 1024:.0f} KB")
+        self.memory_label.setToolTip("\n".join(f"{df.columns[j]}: {df.dtypes.iloc[j]}, {usage.iloc[j] / 1024 / 1024:.1f} MB"
+                                               for j in range(df.shape[1])))
+
+    def reset_result_view(self, df, keep_refinements=False):
+        # A new ResultView over df. Keeping refinements re-applies the filters, sort and grouping,
+        # for a preview that just got more rows.
+        previous = self.result_view
+        group_settings = self.group_settings
+        self.result_view = None if df is None else ResultView(df)
+        self.group_view = None
+        self.group_settings = None
+        self.table.horizontalHeader().setSortIndicatorShown(False)
+        headers = [] if df is None else [str(column) for column in df.columns]
+        for combo in (self.filter_column_combo, self.group_column_combo, self.group_value_combo):
+            if [combo.itemText(i) for i in range(combo.count())] != headers:
+                combo.clear()
+                combo.addItems(headers)
+        for widget in self.refine_widgets:
+            widget.setEnabled(df is not None)
+        self.update_filter_value(self.filter_op_combo.currentText())
+        self.update_group_value(self.group_aggregate_combo.currentText())
+        if keep_refinements and previous is not None and self.result_view is not None:
+            for column, op, value in previous.filters:
+                self.result_view.add_filter(column, op, value)
+            if previous.sort is not None:
+                self.result_view.sort_by(*previous.sort)
+            self.table_model.set_rows(self.result_view.rows)
+            if group_settings is not None:
+                self.show_group(group_settings)
+        self.update_view_label()
+
+    def set_refine_enabled(self, enabled):
+        for widget in self.refine_widgets:
+            widget.setEnabled(enabled)
+        if enabled:
+            self.update_filter_value(self.filter_op_combo.currentText())
+            self.update_group_value(self.group_aggregate_combo.currentText())
+
+    def update_filter_value(self, op):
+        self.filter_value_input.setEnabled(self.add_filter_btn.isEnabled() and op not in ('is empty', 'is not empty'))
+
+    def update_group_value(self, aggregate):
+        self.group_value_combo.setEnabled(self.group_btn.isEnabled() and aggregate != 'count')
+
+    def add_result_filter(self):
+        column = self.filter_column_combo.currentIndex()
+        if self.result_view is None or column < 0:
+            return
+        started = time.monotonic()
+        try:
+            self.result_view.add_filter(column, self.filter_op_combo.currentText(), self.filter_value_input.text())
+        except ValueError as error:
+            QMessageBox.warning(self, "Filter", str(error))
+            return
+        self.filter_value_input.clear()
+        self.show_result_view(started)
 
-        # Resize columns to contents
-        self.table.resizeColumnsToContents()
+    def clear_result_filters(self):
+        if self.result_view is None:
+            return
+        started = time.monotonic()
+        self.result_view.clear_filters()
+        self.show_result_view(started)
 
-        # Adjust column widths if they're too narrow
-        min_width = 100  # Minimum width in pixels
-        for col in range(self.table.columnCount()):
-            if self.table.columnWidth(col) < min_width:
-                self.table.setColumnWidth(col, min_width)
+    def sort_results(self, column):
+        view = self.group_view or self.result_view
+        if view is None:
+            return
+        started = time.monotonic()
+        ascending = view.sort != (column, True)
+        view.sort_by(column, ascending)
+        self.table_model.set_rows(view.rows)
+        header = self.table.horizontalHeader()
+        header.setSortIndicator(column, Qt.AscendingOrder if ascending else Qt.DescendingOrder)
+        header.setSortIndicatorShown(True)
+        self.update_view_label(started)
+
+    def group_results(self):
+        by = self.group_column_combo.currentIndex()
+        if self.result_view is None or by < 0:
+            return
+        started = time.monotonic()
+        aggregate = self.group_aggregate_combo.currentText()
+        column = None if aggregate == 'count' else self.group_value_combo.currentIndex()
+        if self.show_group((by, aggregate, column)):
+            self.update_view_label(started)
+
+    def show_group(self, group_settings):
+        try:
+            grouped = self.result_view.group(*group_settings)
+        except ValueError as error:
+            QMessageBox.warning(self, "Group By", str(error))
+            return False
+        self.group_settings = group_settings
+        self.group_view = ResultView(grouped)
+        self.table_model.set_dataframe(grouped)
+        self.table.horizontalHeader().setSortIndicatorShown(False)
+        self.resize_result_columns()
+        return True
 
-        # Set the table size to fit its contents
-        self.table.resizeRowsToContents()
-        table_width = sum(self.table.columnWidth(c) for c in range(self.table.columnCount())) + self.table.verticalHeader().width()
-        table_height = sum(self.table.rowHeight(r) for r in range(self.table.rowCount())) + self.table.horizontalHeader().height()
-        self.table.setFixedSize(table_width, table_height)
+    def ungroup_results(self):
+        if self.group_view is None:
+            return
+        started = time.monotonic()
+        self.group_view = None
+        self.group_settings = None
+        self.table_model.set_dataframe(self.current_df)
+        self.table_model.set_rows(self.result_view.rows)
+        sort = self.result_view.sort
+        header = self.table.horizontalHeader()
+        if sort is not None:
+            header.setSortIndicator(sort[0], Qt.AscendingOrder if sort[1] else Qt.DescendingOrder)
+        header.setSortIndicatorShown(sort is not None)
+        self.resize_result_columns()
+        self.update_view_label(started)
+
+    def show_result_view(self, started):
+        # After the filters change: regroup, or show the rows that pass
+        if self.group_settings is not None:
+            self.show_group(self.group_settings)
+        else:
+            self.table_model.set_rows(self.result_view.rows)
+        self.update_view_label(started)
 
-        self.shape_label.setText(f"Shape: {df.shape[0]} rows, {df.shape[1]} columns")
+    def update_view_label(self, started=None):
+        view = self.result_view
+        if view is None or (not view.filters and view.sort is None and self.group_view is None):
+            self.view_label.setText("")
+            return
+        parts = [f"{view.row_count:,} of {len(view.df):,} rows"]
+        if view.filters:
+            parts.append("where " + view.describe())
+        if self.group_view is not None:
+            parts.append(f"{self.group_view.row_count:,} groups")
+        if started is not None:
+            parts.append(f"{(time.monotonic() - started) * 1000:.0f} ms")
+        self.view_label.setText(" - ".join(parts))
+
+    def visible_frame(self):
+        # What the grid shows: the grouped rows, or the filtered and sorted rows of the result.
+        # Rows streamed by a run that hasn't finished aren't the result yet.
+        if self.result_view is None or self.result_view.df is not self.current_df:
+            return self.current_df
+        if self.group_view is not None:
+            return self.group_view.frame()
+        return self.result_view.frame()
+
+    def restore_results(self):
+        # After a cancelled or failed run, show the last complete result again instead of the
+        # rows the run streamed before it stopped
+        if self.result_view is not None and self.result_view.df is self.current_df:
+            return
+        if self.saved_result_model is not None:
+            return
+        if self.current_df is not None:
+            self.display_results(self.current_df)
+            return
+        self.table_model.clear()
+        self.reset_result_view(None)
+        self.shape_label.setText("")
+        self.show_memory_usage(None)
 
+    def resize_result_columns(self):
+        # Estimate column widths from a sample of rows instead of measuring every cell
+        min_width = 100  # Minimum width in pixels
+        max_width = 400
+        cell_metrics = self.table.fontMetrics()
+        header_metrics = self.table.horizontalHeader().fontMetrics()
+        model = self.table.model()
+        rows = model.sample_rows()
+        for col in range(model.columnCount()):
+            width = header_metrics.horizontalAdvance(model.headers[col])
+            for row in rows:
+                width = max(width, cell_metrics.horizontalAdvance(model.data(model.index(row, col)) or ''))
+            self.table.setColumnWidth(col, min(max(width + 20, min_width), max_width))
+
+    def ask_export_path(self):
+        # Returns (file name, export format), or None when the dialog was cancelled
+        formats = available_formats()
+        filters = [f"{EXPORT_FORMATS[f].label} (*{EXPORT_FORMATS[f].extension})" for f in formats]
+        options = QFileDialog.Options()
+        fileName, selected_filter = QFileDialog.getSaveFileName(self, "Save File", "", ";;".join(filters), options=options)
+        if not fileName:
+            return None
+        export_format = formats[filters.index(selected_filter)] if selected_filter in filters else format_for_path(fileName)
+        extension = EXPORT_FORMATS[export_format].extension
+        if not fileName.endswith(extension):
+            fileName += extension
+        return fileName, export_format
 
     def download_results(self):
         if self.current_df is not None:
-            options = QFileDialog.Options()
-            fileName, _ = QFileDialog.getSaveFileName(self, "Save File", "", "CSV Files (*.csv);;All Files (*)", options=options)
-            if fileName:
-                self.current_df.to_csv(fileName, index=False)
-                QMessageBox.information(self, "Download Complete", f"File saved as {fileName}")
+            target = self.ask_export_path()
+            if target:
+                fileName, export_format = target
+                # Serializing a large result can take a while; keep the window responsive
+                self.download_btn.setEnabled(False)
+                df = self.visible_frame()
+                self.progress_label.setText(f"Saving {len(df)} rows to {fileName}...")
+                timings = QueryTimings('export', self.db_combo.currentText(), self.current_query)
+                self.export_worker = ExportWorker(df, export_format, fileName, timings, self)
+                self.start_export(self.current_query)
+
+    def export_query_to_file(self, db_config, query, params=None):
+        target = self.ask_export_path()
+        if target:
+            fileName, export_format = target
+            self.download_btn.setEnabled(False)
+            self.progress_label.setText(f"Streaming the query result to {fileName}...")
+            timings = QueryTimings('stream_export', db_config['name'], query, params)
+            self.export_worker = QueryExportWorker(self.connection_pools.pool_for(db_config), query,
+                                                   export_format, fileName, timings, self, params)
+            self.start_export(query)
+
+    def start_export(self, query):
+        self.export_source = (self.db_combo.currentText(), query)
+        self.export_worker.export_finished.connect(self.on_export_finished)
+        self.export_worker.export_failed.connect(self.on_export_failed)
+        self.export_worker.start()
+
+    def on_export_finished(self, fileName, rows):
+        database, query = self.export_source
+        date_range = find_date_range(query) if query else None
+        self.results_catalog.record(fileName, self.export_worker.export_format, rows, self.export_worker.columns,
+                                    database=database, query=query,
+                                    range_start=date_range[0] if date_range else None,
+                                    range_end=date_range[1] if date_range else None)
+        self.record_timings(self.export_worker.timings, 'ok', rows, os.path.getsize(fileName))
+        self.download_btn.setEnabled(True)
+        self.progress_label.setText("")
+        QMessageBox.information(self, "Download Complete", f"File saved as {fileName}")
+
+    def on_export_failed(self, message):
+        self.record_timings(self.export_worker.timings, 'failed')
+        self.download_btn.setEnabled(True)
+        self.progress_label.setText("")
+        QMessageBox.critical(self, "Download Failed", f"Could not save the results: {message}")
+
+    def init_results_catalog(self):
+        self.results_catalog = ResultsCatalog()
+        if self.results_catalog.count() == 0:
+            # First run with the catalog: pick up the exports that are already in the folder
+            self.results_catalog.rescan('.')
 
     def init_history_db(self):
-        self.history_db = sqlite3.connect('query_history.db')
-        cursor = self.history_db.cursor()
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS query_history
-            (id INTEGER PRIMARY KEY AUTOINCREMENT,
-             timestamp DATETIME,
-             database TEXT,
-             query TEXT)
-        ''')
-        self.history_db.commit()
+        self.history_db = HistoryStore()
     
-    def add_to_history(self, query):
-        DATETIME_FORMAT = "%Y-%m-%d %H:%M:%S"
-        cursor = self.history_db.cursor()
-        cursor.execute('''
-            INSERT INTO query_history (timestamp, database, query)
-            VALUES (?, ?, ?)
-        ''', (datetime.now().strftime(DATETIME_FORMAT), self.db_combo.currentText(), query))
-        self.history_db.commit()
+    def add_to_history(self, query, df=None, duration=None, cached=False, bytes_fetched=None, params=None):
+        rows = None if df is None else len(df)
+        if bytes_fetched is None and df is not None and not cached:
+            bytes_fetched = frame_size(df)
+        if params is not None:
+            # The bound text only runs with its template active; Reuse needs SQL that runs as it is
+            query = self.running_literal
+        self.history_db.add(self.db_combo.currentText(), query, duration=duration, rows=rows,
+                            bytes_fetched=bytes_fetched, cached=cached)
 
     def show_query_history(self):
+        self.history_db.flush()
         dialog = QueryHistoryDialog(self.history_db, self)
         dialog.exec_()
 
-    def is_read_only_query(self, query):
-        # List of allowed keywords
-        allowed_keywords = ['select', 'show', 'describe', 'desc', 'explain']
-        
-        # Remove comments and split the query into words
-        clean_query = re.sub(r'--.*$', '', query, flags=re.MULTILINE)
-        clean_query = re.sub(r'/\*.*?\*/', '', clean_query, flags=re.DOTALL)
-        words = re.findall(r'\b\w+\b', clean_query.lower())
-        
-        # Check if the first word is in the allowed list
-        if words and words[0] not in allowed_keywords:
-            return False
-        
-        # Additional checks for prohibited operations
-        prohibited_keywords = ['create', 'alter', 'drop', 'insert', 'update', 'delete', 'truncate', 'rename', 'replace', 'load']
-        if any(word in prohibited_keywords for word in words):
-            return False
-        
-        return True
+    def check_read_only(self, query, action="Only SELECT, SHOW, DESCRIBE, and EXPLAIN queries are allowed."):
+        info = classify_query(query)
+        if not info.read_only:
+            QMessageBox.warning(self, "Read-Only Access",
+                                f"This system is for read-only access. {action}\n\n{info.reason}.")
+        return info
+
+    def database_backend(self, db_config):
+        # None, after telling the user, when the entry's type is unknown or its driver isn't installed
+        try:
+            return backend_for(db_config)
+        except (ValueError, ImportError) as error:
+            QMessageBox.warning(self, "Database Type", str(error))
+            return None
+
+    def execute_query(self, force_refresh=False):
+        if self.query_worker is not None and self.query_worker.isRunning():
+            QMessageBox.warning(self, "Query Running", "Please wait for the current query to finish or cancel it.")
+            return
+
+        db_config = self.db_configs[self.db_combo.currentIndex()]
+        query = self.query_input.toPlainText()
+
+        info = self.check_read_only(query)
+        if not info.read_only:
+            return
+        backend = self.database_backend(db_config)
+        if backend is None:
+            return
+        bound = self.bind_template(query, backend)
+        if bound is None:
+            return
+        query, params = bound
+        # History and the preflight's date range check work on the SQL text, so they need the values written in
+        self.running_literal = None
+        if params is not None:
+            self.running_literal = self.bind_template(self.query_input.toPlainText(), backend, literal=True)[0]
+
+        self.cache_label.setText("")
+        self.running_cache_key = None
+        if self.use_cache_checkbox.isChecked() and info.cacheable:
+            self.running_cache_key = cache_key(db_config['name'], query, params)
+            timings = QueryTimings('cache', db_config['name'], query, params)
+            with timings.phase('cache'):
+                cached = None if force_refresh else self.result_cache.get(
+                    self.running_cache_key, db_config.get('cache_ttl', DEFAULT_CACHE_TTL))
+            if cached is not None:
+                self.show_cached_result(query, *cached, timings=timings, params=params)
+                return
+
+        preview = self.preview_checkbox.isChecked() and info.cacheable
+        # A preview is bounded by its LIMIT already, so it skips the preflight.
+        # It relies on EXPLAIN FORMAT=JSON, which only the MySQL backends have.
+        if db_config.get('preflight') and backend.explain_json and info.cacheable and not preview:
+            self.start_preflight(db_config, query, params)
+            return
+
+        if preview:
+            self.preview_db_config = db_config
+            self.preview_estimate = None
+            self.preview_pager = PreviewPager(query, self.preview_rows_spin.value(), backend, params)
+            self.start_preview_page()
+        else:
+            self.preview_run = None
+            self.start_query_worker(db_config, query, params=params)
+
+    def start_preview_page(self):
+        # The worker builds the page's SQL; the first page also looks up the key to order pages by
+        pager = self.preview_pager
+        pager.rows = self.preview_rows_spin.value()
+        self.preview_run = (pager.query, pager.fetched)
+        estimate = pager.fetched == 0 and pager.backend.explain_json
+        self.start_query_worker(self.preview_db_config, pager.query, estimate_query=pager.query if estimate else None,
+                                params=pager.params, pager=pager)
+
+    def start_query_worker(self, db_config, query, estimate_query=None, params=None, pager=None):
+        self.running_query = query
+        self.running_params = params
+        self.fetched_rows = 0
+        self.query_started = time.monotonic()
+        if self.preview_run is None:
+            self.query_timings = QueryTimings('query', db_config['name'], query, params)
+        else:
+            self.query_timings = QueryTimings('preview', db_config['name'], self.preview_run[0], params)
+
+        self.query_worker = QueryWorker(self.connection_pools.pool_for(db_config), query,
+                                        estimate_query=estimate_query, timings=self.query_timings, parent=self,
+                                        params=params, pager=pager)
+        if self.preview_run is None or self.preview_run[1] == 0:
+            # Later preview pages are appended when they finish instead of replacing the table
+            self.query_worker.preview_ready.connect(self.on_query_preview)
+        self.query_worker.estimate_ready.connect(self.on_estimate_ready)
+        self.query_worker.rows_fetched.connect(self.on_rows_fetched)
+        self.query_worker.query_finished.connect(self.on_query_finished)
+        self.query_worker.query_failed.connect(self.on_query_failed)
+        self.query_worker.query_cancelled.connect(self.on_query_cancelled)
+        self.query_worker.finished.connect(self.update_pool_status)
+
+        self.execute_btn.setEnabled(False)
+        self.cancel_btn.setEnabled(True)
+        self.progress_timer.start(500)
+        self.update_progress_label()
+        self.query_worker.start()
+
+    def start_preflight(self, db_config, query, params=None):
+        # EXPLAINs the query on a worker first; on_preflight_ready decides whether and how it runs
+        self.preview_run = None
+        self.query_worker = PreflightWorker(self.connection_pools, db_config, query, params, self.running_literal,
+                                            self)
+        self.query_worker.report_ready.connect(self.on_preflight_ready)
+        self.query_worker.finished.connect(self.update_pool_status)
+        self.execute_btn.setEnabled(False)
+        self.cancel_btn.setEnabled(True)
+        self.progress_label.setText("Checking the query plan...")
+        self.query_worker.start()
+
+    def on_preflight_ready(self, report):
+        worker = self.sender()
+        self.finish_query_run()
+        if worker.cancel_requested:
+            self.progress_label.setText("Query cancelled")
+            return
+        self.progress_label.setText("")
+        query = self.confirm_preflight(worker.db_config, worker.query, worker.params, report)
+        if query is None:
+            return
+        if self.running_cache_key is not None:
+            self.running_cache_key = cache_key(worker.db_config['name'], query, worker.params)
+        self.start_query_worker(worker.db_config, query, params=worker.params)
+
+    def confirm_preflight(self, db_config, query, params, report):
+        # Asks before running a query the EXPLAIN says is expensive.
+        # Returns the query to run (possibly with a row limit added), or None when it shouldn't run here.
+        if report is None:
+            return query  # Can't be explained right now; don't block the run on it
+        warnings = report.warnings(*preflight_thresholds(db_config))
+        if not warnings:
+            return query
+
+        limit = db_config.get('preflight_row_limit', DEFAULT_ROW_LIMIT)
+        box = QMessageBox(self)
+        box.setIcon(QMessageBox.Warning)
+        box.setWindowTitle("Expensive Query")
+        box.setText("EXPLAIN suggests this query is expensive:\n\n" + "\n".join(warnings))
+        run_btn = box.addButton("Run Anyway", QMessageBox.AcceptRole)
+        limit_btn = box.addButton(f"Limit to {limit:,} Rows", QMessageBox.AcceptRole)
+        export_btn = box.addButton("Stream to File...", QMessageBox.AcceptRole)
+        box.addButton(QMessageBox.Cancel)
+        box.exec_()
+        clicked = box.clickedButton()
+        if clicked is run_btn:
+            return query
+        if clicked is limit_btn:
+            return limited_query(query, limit)
+        if clicked is export_btn:
+            self.export_query_to_file(db_config, query, params)
+        return None
+
+    def show_cached_result(self, query, df, created, timings=None, params=None):
+        started = time.monotonic()
+        timings = timings or QueryTimings('cache', self.db_combo.currentText(), query, params)
+        self.current_df = df
+        self.current_query = query
+        with timings.phase('render'):
+            self.display_results(df)
+        age_minutes = int((time.time() - created) // 60)
+        self.cache_label.setText(f"Served from cache, age {age_minutes} min")
+        self.progress_label.setText("")
+        with timings.phase('history'):
+            self.add_to_history(query, df, time.monotonic() - started, cached=True, params=params)
+        self.record_timings(timings, 'ok', len(df))
+        self.show_success_notification("Query served from cache")
+        self.generate_script_btn.setEnabled(True)
+
+    def execute_partitioned_query(self):
+        if self.query_worker is not None and self.query_worker.isRunning():
+            QMessageBox.warning(self, "Query Running", "Please wait for the current query to finish or cancel it.")
+            return
 
-    def execute_query(self):
         db_config = self.db_configs[self.db_combo.currentIndex()]
         query = self.query_input.toPlainText()
 
-        if not self.is_read_only_query(query):
-            QMessageBox.warning(self, "Read-Only Access", 
-                                "This system is for read-only access. Only SELECT, SHOW, DESCRIBE, and EXPLAIN queries are allowed.")
+        info = self.check_read_only(query)
+        if not info.read_only:
+            return
+        backend = self.database_backend(db_config)
+        if backend is None:
+            return
+        # Partitions are cut from the date literals in the text, so a template's values are written in
+        bound = self.bind_template(query, backend, literal=True)
+        if bound is None:
+            return
+        query = bound[0]
+        if find_date_range(query) is None:
+            QMessageBox.warning(self, "No Date Range",
+                                "Partitioned execution needs a BETWEEN 'yyyy-mm-dd' AND 'yyyy-mm-dd' date range, "
+                                "like the CTA report template uses.")
             return
 
-        connection_config = {k: v for k, v in db_config.items() if k != 'name'}
+        unit = self.partition_unit.currentText().lower()
+        self.partitioned_query = PartitionedQuery(self.connection_pools, db_config, query, unit)
+        self.partitioned_query_text = query
+        self.query_started = time.monotonic()
+        self.query_timings = QueryTimings('partitioned', db_config['name'], query)
+        self.partition_dialog = PartitionProgressDialog(self.partitioned_query, self)
+        self.partition_dialog.retry_btn.clicked.connect(self.run_partitions)
+        self.partition_dialog.show()
+        self.run_partitions()
+
+    def run_partitions(self):
+        self.query_worker = PartitionWorker(self.partitioned_query, self, self.query_timings)
+        self.query_worker.partition_updated.connect(self.partition_dialog.update_partition)
+        self.query_worker.run_finished.connect(self.on_partitions_finished)
+        self.query_worker.finished.connect(self.update_pool_status)
+        self.partition_dialog.set_running(True)
+        self.execute_btn.setEnabled(False)
+        self.partition_btn.setEnabled(False)
+        self.query_worker.start()
+
+    def on_partitions_finished(self, complete):
+        self.partition_dialog.set_running(False)
+        self.execute_btn.setEnabled(True)
+        self.partition_btn.setEnabled(True)
+        if not complete:
+            return
 
-        try:
-            # Check if SSL is required
-            if db_config.get('requires_ssl', False):
-                connection_config['ssl_ca'] = db_config.get('ssl_ca')
-                connection_config['ssl_verify_cert'] = True
-
-            connection = mysql.connector.connect(**connection_config)
-            cursor = connection.cursor()
-            cursor.execute(query)
-            result = cursor.fetchall()
-            columns = [column[0] for column in cursor.description]
-            
-            self.current_df = pd.DataFrame(result, columns=columns)
+        timings = self.query_timings
+        with timings.phase('build'):
+            self.current_df = self.partitioned_query.to_dataframe()
+        self.current_query = self.partitioned_query_text
+        with timings.phase('render'):
             self.display_results(self.current_df)
-            
-            cursor.close()
-            connection.close()
-
-            # Add query to history
-            self.add_to_history(query)  # Use the add_to_history method
-            self.show_success_notification("Query executed successfully!")
-            self.generate_script_btn.setEnabled(True)  # Enable the Generate Script button
-
-        except mysql.connector.Error as error:
-            if isinstance(error, mysql.connector.ProgrammingError):
-                QMessageBox.warning(self, "Query Error", f"Syntax error in your SQL query: {error}")
-            elif isinstance(error, mysql.connector.IntegrityError):
-                QMessageBox.warning(self, "Data Integrity Error", f"The query violates database integrity constraints: {error}")
-            elif isinstance(error, mysql.connector.OperationalError):
-                QMessageBox.critical(self, "Connection Error", f"Unable to connect to the database. Please check your network connection and database settings: {error}")
-            else:
-                QMessageBox.critical(self, "Query Error", f"An unexpected error occurred: {error}")
-            self.generate_script_btn.setEnabled(False)
+        self.cache_label.setText("")
+        bytes_fetched = frame_size(self.current_df)
+        with timings.phase('history'):
+            self.add_to_history(self.partitioned_query_text, self.current_df, time.monotonic() - self.query_started,
+                                bytes_fetched=bytes_fetched)
+        self.record_timings(timings, 'ok', len(self.current_df), bytes_fetched)
+        self.show_success_notification(f"Query executed in {len(self.partitioned_query.partitions)} partitions")
+        self.generate_script_btn.setEnabled(True)
+        self.partition_dialog.accept()
+
+    def cancel_query(self):
+        if self.query_worker is not None and self.query_worker.isRunning():
+            self.query_worker.cancel()
+            self.progress_label.setText("Cancelling query...")
+
+    def on_query_preview(self, df):
+        self.display_results(df)
+        self.set_refine_enabled(False)  # the full result replaces these rows when it arrives
+        self.shape_label.setText(f"Showing the first {len(df)} rows while the rest of the result is fetched...")
+
+    def on_rows_fetched(self, rows):
+        self.fetched_rows = rows
+        self.update_progress_label()
+
+    def update_progress_label(self):
+        elapsed = time.monotonic() - self.query_started
+        rows = self.fetched_rows
+        rate = rows / elapsed if elapsed > 0 else 0
+        self.progress_label.setText(f"Fetched {rows} rows in {elapsed:.1f}s ({rate:.0f} rows/s)")
+
+    def finish_query_run(self):
+        self.progress_timer.stop()
+        self.execute_btn.setEnabled(True)
+        self.cancel_btn.setEnabled(False)
+
+    def update_pool_status(self):
+        parts = []
+        for name, stats in self.connection_pools.stats().items():
+            part = (f"{name}: {stats['open']} open ({stats['idle']} idle), "
+                    f"{stats['hits']} hits, {stats['misses']} misses")
+            if stats['prepared_hits'] or stats['prepared_misses']:
+                part += f", {stats['prepared_hits']} of {stats['prepared_hits'] + stats['prepared_misses']} " \
+                        "template runs reused a prepared statement"
+            parts.append(part)
+        self.statusBar().showMessage("Connection pools - " + "; ".join(parts) if parts else "")
+
+    def on_query_finished(self, df):
+        self.update_progress_label()
+        self.finish_query_run()
+        if self.preview_run is not None:
+            self.on_preview_page(df)
+            return
+
+        timings = self.query_timings
+        self.current_df = df
+        self.current_query = self.running_query
+        with timings.phase('render'):
+            self.display_results(self.current_df)
+        if self.running_cache_key is not None:
+            self.result_cache.put(self.running_cache_key, df)
+
+        # Add query to history
+        bytes_fetched = frame_size(df)
+        with timings.phase('history'):
+            self.add_to_history(self.running_query, df, time.monotonic() - self.query_started,
+                                bytes_fetched=bytes_fetched, params=self.running_params)
+        self.record_timings(timings, 'ok', len(df), bytes_fetched)
+        self.show_success_notification("Query executed successfully!")
+        self.generate_script_btn.setEnabled(True)  # Enable the Generate Script button
+
+    def on_estimate_ready(self, rows):
+        self.preview_estimate = rows
+
+    def on_preview_page(self, df):
+        query, offset = self.preview_run
+        self.preview_run = None
+        self.preview_pager.add_page(df)
+        complete = self.preview_pager.complete  # a short page means the server has no more rows
+        timings = self.query_timings
+        bytes_fetched = frame_size(df)
+        if offset:
+            with timings.phase('render'):
+                self.current_df = concat_frames([self.current_df, df])
+                self.show_memory_usage(self.current_df)
+                if self.result_view.filters or self.result_view.sort or self.group_view is not None:
+                    self.table_model.set_dataframe(self.current_df)
+                else:
+                    self.table_model.extend_dataframe(self.current_df)
+                self.reset_result_view(self.current_df, keep_refinements=True)
+        else:
+            self.current_df = df
+            self.current_query = query
+            with timings.phase('render'):
+                self.display_results(df)
+            with timings.phase('history'):
+                self.add_to_history(query, df, time.monotonic() - self.query_started, bytes_fetched=bytes_fetched,
+                                    params=self.preview_pager.params)
+            self.show_success_notification("Preview fetched")
+            self.generate_script_btn.setEnabled(True)
+        if complete and self.running_cache_key is not None:
+            self.result_cache.put(self.running_cache_key, self.current_df)
+        self.set_preview_state(None if complete else query)
+        if complete:
+            self.shape_label.setText(f"Shape: {self.current_df.shape[0]} rows, {self.current_df.shape[1]} columns")
+        self.record_timings(timings, 'ok', len(df), bytes_fetched)
+
+    def record_timings(self, timings, status, rows=None, bytes_fetched=None):
+        # Logs the run as a JSON line and shows its phase breakdown next to the shape
+        if timings is None:
+            return
+        timings.finish(status, rows, bytes_fetched)
+        self.metrics_log.write(timings)
+        if status != 'ok':
+            return
+        self.timing_label.setText(timings.summary())
+        details = [f"Total {format_seconds(timings.total)}"]
+        if timings.rows is not None:
+            details.append(f"{timings.rows} rows")
+        if timings.bytes is not None:
+            details.append(f"{timings.bytes / 1024 / 1024:.1f} MB")
+        self.timing_label.setToolTip(", ".join(details))
+
+    def set_preview_state(self, query):
+        self.preview_query = query
+        self.fetch_more_btn.setEnabled(query is not None)
+        self.export_full_btn.setEnabled(query is not None)
+        if query is None:
+            return
+        rows, columns = self.current_df.shape
+        if self.preview_estimate:
+            text = f"Preview: {rows} of about {max(self.preview_estimate, rows):,} rows, {columns} columns"
+        else:
+            text = f"Preview: first {rows} rows, {columns} columns"
+        if self.preview_pager.order_by is None:
+            text += " (no unique key to page by, so Fetch More may repeat or skip rows)"
+        self.shape_label.setText(text)
+
+    def fetch_more_rows(self):
+        if self.preview_query is None:
+            return
+        if self.query_worker is not None and self.query_worker.isRunning():
+            QMessageBox.warning(self, "Query Running", "Please wait for the current query to finish or cancel it.")
+            return
+        self.fetch_more_btn.setEnabled(False)
+        self.start_preview_page()
+
+    def export_full_result(self):
+        # Streams the whole result to a file without loading it into the table
+        if self.preview_query is not None:
+            self.export_query_to_file(self.preview_db_config, self.preview_query, self.preview_pager.params)
+
+    def on_query_cancelled(self):
+        self.finish_query_run()
+        self.record_timings(self.query_timings, 'cancelled')
+        self.preview_run = None
+        self.restore_results()
+        self.fetch_more_btn.setEnabled(self.preview_query is not None)
+        self.progress_label.setText("Query cancelled")
+
+    def on_query_failed(self, error):
+        self.finish_query_run()
+        self.record_timings(self.query_timings, 'failed')
+        self.preview_run = None
+        self.restore_results()
+        self.fetch_more_btn.setEnabled(self.preview_query is not None)
+        self.progress_label.setText("")
+        if isinstance(error, PROGRAMMING_ERRORS):
+            QMessageBox.warning(self, "Query Error", f"Syntax error in your SQL query: {error}")
+        elif isinstance(error, INTEGRITY_ERRORS):
+            QMessageBox.warning(self, "Data Integrity Error", f"The query violates database integrity constraints: {error}")
+        elif isinstance(error, OPERATIONAL_ERRORS):
+            QMessageBox.critical(self, "Connection Error", f"Unable to connect to the database. Please check your network connection and database settings: {error}")
+        else:
+            QMessageBox.critical(self, "Query Error", f"An unexpected error occurred: {error}")
+        self.generate_script_btn.setEnabled(False)
 
 
     def show_success_notification(self, message):
@@ -613,178 +1855,66 @@ class DatabaseApp(QMainWindow):
 
         query = self.query_input.toPlainText().strip()
         
-        if not self.is_read_only_query(query):
-            QMessageBox.warning(self, "Read-Only Access", 
-                                "This system is for read-only access. You cannot generate scripts for non-SELECT operations.")
+        info = self.check_read_only(query, "You cannot generate scripts for non-SELECT operations.")
+        if not info.read_only:
             return
 
         db_config = self.db_configs[self.db_combo.currentIndex()]
-        
-        # Check if SSL is required
-        requires_ssl = db_config.get('requires_ssl', False)
-        
-        ssl_config = ""
-        if requires_ssl:
-            ssl_config = f"""
-            # SSL Configuration
-            ssl_args = {{
-                'ssl': {{
-                    'ca': '{db_config['ssl_ca']}',
-                    'check_hostname': True
-                }}
-            }}
-            """
-        else:
-            ssl_config = "ssl_args = {}"
-
-        script_template = f"""
-    import pymysql
-    import pandas as pd
-
-    # Database connection details
-    host = '{db_config["host"]}'
-    user = '{db_config["user"]}'
-    password = '{db_config["password"]}'
-    database = '{db_config["database"]}'
-
-    {ssl_config}
-
-    # Establish a connection to the database
-    connection = mysql.connector.connect(
-        host=host,
-        user=user,
-        password=password,
-        database=database,
-        **ssl_args
-    )
-
-    # Create a cursor to execute SQL queries
-    cursor = connection.cursor()
-
-    # SQL query
-    sql_template = '''
-    {query}
-    '''
-
-    # Set chunk size
-    chunk_size = 100000
-    offset = 0
-    all_rows = []
-
-    # Loop until all rows are fetched
-    while True:
-        # Execute the query with LIMIT and OFFSET
-        cursor.execute(sql_template + ' LIMIT %s OFFSET %s', (chunk_size, offset))
-        
-        # Fetch the rows
-        rows = cursor.fetchall()
-        
-        # Break the loop if no more rows are returned
-        if not rows:
-            break
-        
-        # Append the fetched rows to the list
-        all_rows.extend(rows)
-        
-        # Increment the offset for the next iteration
-        offset += chunk_size
-
-    # Get the column names
-    columns = [col[0] for col in cursor.description]
-
-    # Close the cursor and the database connection
-    cursor.close()
-    connection.close()
-
-    # Create a DataFrame
-    result_df = pd.DataFrame(all_rows, columns=columns)
-
-    # Display the shape of the DataFrame
-    print(f"Shape of the result: {{result_df.shape}}")
-
-    # Display the first few rows of the DataFrame
-    print(result_df.head())
+        if db_config.get('type', DEFAULT_BACKEND) not in MYSQL_BACKENDS:
+            QMessageBox.warning(self, "Generate Script", "Generated scripts connect with mysql-connector, "
+                                "so they're only available for MySQL databases.")
+            return
+        bound = self.bind_template(query, backend_for(db_config), literal=True)
+        if bound is None:
+            return
+        query = bound[0]
 
-    # Optionally, save the DataFrame to a CSV file
-    # result_df.to_csv('query_results.csv', index=False)
+        if info.statement_type != 'select':
+            self.show_script_options(db_config, query, None)
+            return
+        self.generate_script_btn.setEnabled(False)
+        self.key_worker = PrimaryKeyWorker(self.connection_pools, db_config, query, self)
+        self.key_worker.key_ready.connect(lambda key_column: self.show_script_options(db_config, query, key_column))
+        self.key_worker.start()
+
+    def show_script_options(self, db_config, query, key_column):
+        self.generate_script_btn.setEnabled(True)
+        dialog = ScriptOptionsDialog(key_column, self)
+        if not dialog.exec_():
+            return
 
-    # Display the DataFrame
-    result_df
-    """
+        script_template = build_script(db_config, query, dialog.key_column(), dialog.output_format(),
+                                       dialog.output_file())
 
         script_dialog = ScriptDialog(script_template, self)
         script_dialog.exec_()
 
     def load_scheduled_queries(self):
-        try:
-            with open('scheduled_queries.json', 'r') as f:
-                self.scheduled_queries = json.load(f)
-            
-            # Convert any float timestamps to strings and add missing keys
-            for query in self.scheduled_queries:
-                if isinstance(query['next_run'], float):
-                    query['next_run'] = datetime.fromtimestamp(query['next_run']).isoformat()
-                if 'output_file' not in query:
-                    query['output_file'] = 'default_output'
-                if 'database' not in query:
-                    if self.db_combo.count() > 0:
-                        query['database'] = self.db_combo.itemText(0)  # Use the first database as default
-                    else:
-                        query['database'] = "No database available"  # Or some other default value
-            
+        default_database = self.db_combo.itemText(0) if self.db_combo.count() > 0 else None
+        self.scheduled_queries = load_jobs(default_database=default_database)
+        if self.scheduled_queries:
             # Save the updated queries
-            self.save_scheduled_queries()
-        except FileNotFoundError:
-            self.scheduled_queries = []
+            save_jobs(self.scheduled_queries)
 
     def save_scheduled_queries(self):
-        with open('scheduled_queries.json', 'w') as f:
-            json.dump(self.scheduled_queries, f)
+        self.scheduler.save()
 
     def start_scheduler(self):
-        self.scheduler_timer = QTimer(self)
-        self.scheduler_timer.timeout.connect(self.check_scheduled_queries)
-        self.scheduler_timer.start(60000)  # Check every minute
-
-    def check_scheduled_queries(self):
-        current_time = datetime.now()
-        for query in self.scheduled_queries:
-            next_run = datetime.fromisoformat(query['next_run'])
-            if current_time >= next_run:
-                self.run_scheduled_query(query)
-                query['next_run'] = (current_time + timedelta(seconds=query['interval'])).isoformat()
-        self.save_scheduled_queries()
-
-    def run_scheduled_query(self, query):
-        database = query.get('database', self.db_combo.itemText(0))  # Use first database as default
-        db_index = self.db_combo.findText(database)
-        if db_index == -1:
-            self.show_error_notification(f"Database '{database}' not found. Using default.")
-            db_index = 0
-
-        db_config = self.db_configs[db_index]
-        connection_config = {k: v for k, v in db_config.items() if k != 'name'}
-
-        try:
-            connection = mysql.connector.connect(**connection_config)
-            cursor = connection.cursor()
-            cursor.execute(query['query'])
-            result = cursor.fetchall()
-            columns = [column[0] for column in cursor.description]
-            
-            df = pd.DataFrame(result, columns=columns)
-            
-            # Generate unique filename
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            filename = f"{query['output_file']}_{timestamp}.csv"
-            df.to_csv(filename, index=False)
-            
-            cursor.close()
-            connection.close()
-
-            self.show_success_notification(f"Scheduled query executed and saved as {filename}")
-        except mysql.connector.Error as error:
-            self.show_error_notification(f"Error executing scheduled query: {error}")
+        # Jobs run on the scheduler's own worker threads, never on the GUI thread
+        self.scheduler_signals = SchedulerSignals(self)
+        self.scheduler_signals.job_finished.connect(self.on_scheduled_job_finished)
+        self.scheduler = JobScheduler(self.scheduled_queries, self.db_configs, self.connection_pools,
+                                      on_job_finished=self.scheduler_signals.job_finished.emit,
+                                      catalog=self.results_catalog, history=self.history_db,
+                                      metrics=self.metrics_log)
+        self.scheduler.start()
+
+    def on_scheduled_job_finished(self, query, status, filename):
+        self.update_pool_status()
+        if status.startswith('error'):
+            self.statusBar().showMessage(f"Scheduled query failed: {status}")
+        else:
+            self.show_success_notification(f"Scheduled query executed and saved {query['last_rows']} rows to {filename}")
 
     def schedule_query(self):
         dialog = ScheduleQueryDialog(self)
@@ -793,6 +1923,7 @@ class DatabaseApp(QMainWindow):
             interval = int(dialog.interval_input.text())
             unit = dialog.interval_unit.currentText()
             output_file = dialog.output_file.text() or 'default_output'  # Provide a default if empty
+            watermark_column = dialog.watermark_column.text().strip()
 
             if unit == "Minutes":
                 interval *= 60
@@ -801,16 +1932,26 @@ class DatabaseApp(QMainWindow):
             else:  # Days
                 interval *= 86400
 
-            next_run = (datetime.now() + timedelta(seconds=interval)).isoformat()
+            try:
+                jitter = max(0, int(dialog.jitter_input.text() or 0))
+            except ValueError:
+                jitter = 0
 
-            self.scheduled_queries.append({
+            scheduled_query = {
                 'query': query,
                 'interval': interval,
-                'next_run': next_run,
                 'output_file': output_file,
-                'database': self.db_combo.currentText()
-            })
-            self.save_scheduled_queries()
+                'database': self.db_combo.currentText(),
+                'overlap': OVERLAP_POLICIES[dialog.overlap_policy.currentIndex()],
+                'catch_up': CATCH_UP_POLICIES[dialog.catch_up_policy.currentIndex()],
+                'jitter': jitter,
+                'format': dialog.output_formats[dialog.output_format.currentIndex()]
+            }
+            scheduled_query['next_run'] = next_run_after(scheduled_query, datetime.now())
+            if watermark_column:
+                scheduled_query['watermark_column'] = watermark_column
+                scheduled_query['watermark'] = None
+            self.scheduler.add_job(scheduled_query)
             self.show_success_notification("Query scheduled successfully")
 
     def view_scheduled_queries(self):
@@ -818,10 +1959,14 @@ class DatabaseApp(QMainWindow):
         dialog.setWindowTitle("Scheduled Queries")
         layout = QVBoxLayout(dialog)
         table = QTableWidget()
-        table.setColumnCount(5)  # Add one more column for database
-        table.setHorizontalHeaderLabels(["Query", "Interval", "Next Run", "Output File", "Database"])
+        table.setColumnCount(10)
+        table.setHorizontalHeaderLabels(["Query", "Interval", "Next Run", "Output File", "Database", "Watermark",
+                                         "Last Run", "Last Duration", "Last Status", "Format"])
         
-        for query in self.scheduled_queries:
+        # The scheduler updates the jobs from its worker threads
+        with self.scheduler.lock:
+            jobs = [dict(job) for job in self.scheduled_queries]
+        for query in jobs:
             row = table.rowCount()
             table.insertRow(row)
             table.setItem(row, 0, QTableWidgetItem(query['query']))
@@ -838,32 +1983,73 @@ class DatabaseApp(QMainWindow):
             database = query.get('database', 'Not specified')
             table.setItem(row, 4, QTableWidgetItem(database))
 
+            watermark = ""
+            if query.get('watermark_column'):
+                watermark = f"{query['watermark_column']} > {query.get('watermark')}"
+            table.setItem(row, 5, QTableWidgetItem(watermark))
+
+            table.setItem(row, 6, QTableWidgetItem(query.get('last_run', 'Never')))
+            last_duration = query.get('last_duration')
+            table.setItem(row, 7, QTableWidgetItem("" if last_duration is None else f"{last_duration:.1f} s"))
+            table.setItem(row, 8, QTableWidgetItem(query.get('last_status', '')))
+            table.setItem(row, 9, QTableWidgetItem(EXPORT_FORMATS[query.get('format', 'csv')].label))
+
         layout.addWidget(table)
         dialog.exec_()
 
     def view_saved_results(self):
-        dialog = QDialog(self)
-        dialog.setWindowTitle("Saved Query Results")
-        layout = QVBoxLayout()
-        list_widget = QListWidget()
-
-        csv_files = [f for f in os.listdir('.') if f.endswith('.csv')]
-        list_widget.addItems(csv_files)
-
-        open_button = QPushButton("Open Selected File")
-        open_button.clicked.connect(lambda: self.open_csv_file(list_widget.currentItem().text()))
-
-        layout.addWidget(list_widget)
-        layout.addWidget(open_button)
-        dialog.setLayout(layout)
-        dialog.exec_()
+        dialog = SavedResultsDialog(self.results_catalog, self)
+        if dialog.exec_() == QDialog.Accepted and dialog.selected_path:
+            self.open_csv_file(dialog.selected_path)
 
     def open_csv_file(self, filename):
         if filename:
-            df = pd.read_csv(filename)
-            self.display_results(df)
+            # The file is indexed in the background; the first page is shown right away
+            try:
+                source = open_saved_result(filename)
+            except Exception as e:
+                self.show_error_notification(f"Could not open {filename}: {e}")
+                return
+            self.close_saved_result()
+            self.set_preview_state(None)
+            self.timing_label.setText("")
+            self.show_memory_usage(None)
+            self.reset_result_view(None)
+            self.saved_result_model = LazyResultModel(source, self)
+            self.table.setModel(self.saved_result_model)
+            self.resize_result_columns()
+            self.saved_result_name = filename
+            self.update_saved_result_progress()
+            if not source.complete:
+                self.saved_result_timer = QTimer(self)
+                self.saved_result_timer.timeout.connect(self.update_saved_result_progress)
+                self.saved_result_timer.start(200)
             self.show_success_notification(f"Loaded results from {filename}")
 
+    def update_saved_result_progress(self):
+        model = self.saved_result_model
+        if model is None:
+            return
+        complete = model.refresh_row_count()
+        if complete and self.saved_result_timer is not None:
+            self.saved_result_timer.stop()
+        if model.source.error is not None:
+            self.show_error_notification(f"Error reading {self.saved_result_name}: {model.source.error}")
+        elif complete:
+            self.shape_label.setText(f"Shape: {model.row_count} rows, {len(model.headers)} columns")
+        else:
+            self.shape_label.setText(f"Shape: {model.row_count}+ rows, {len(model.headers)} columns (indexing {self.saved_result_name}...)")
+
+    def close_saved_result(self):
+        if self.saved_result_model is None:
+            return
+        if self.saved_result_timer is not None:
+            self.saved_result_timer.stop()
+            self.saved_result_timer = None
+        self.table.setModel(self.table_model)
+        self.saved_result_model.close()
+        self.saved_result_model = None
+
     def show_success_notification(self, message):
         notification = NotificationWidget(message, self)
         geometry = self.geometry()
@@ -874,6 +2060,184 @@ class DatabaseApp(QMainWindow):
     def show_error_notification(self, message):
         QMessageBox.critical(self, "Error", message)
 
+    def closeEvent(self, event):
+        if self.query_worker is not None and self.query_worker.isRunning():
+            self.query_worker.cancel()
+            self.query_worker.wait(5000)
+        self.scheduler.stop(wait=False)
+        self.close_saved_result()
+        self.history_db.close()
+        self.connection_pools.close_all()
+        super().closeEvent(event)
+
+class SavedResultsDialog(QDialog):
+    SORT_LABELS = {'newest': "Newest first", 'oldest': "Oldest first", 'largest': "Largest first",
+                   'most_rows': "Most rows first", 'name': "Name"}
+
+    def __init__(self, catalog, parent=None):
+        super().__init__(parent)
+        self.catalog = catalog
+        self.selected_path = None
+        self.initUI()
+
+    def initUI(self):
+        self.setWindowTitle("Saved Query Results")
+        self.setGeometry(100, 100, 1100, 600)
+
+        layout = QVBoxLayout(self)
+
+        # Filters run as indexed queries against the catalog, not over the export folder
+        filter_layout = QHBoxLayout()
+        self.name_filter = QLineEdit()
+        self.name_filter.setPlaceholderText("File name contains...")
+        filter_layout.addWidget(self.name_filter)
+
+        self.job_filter = QComboBox()
+        filter_layout.addWidget(QLabel("Job:"))
+        filter_layout.addWidget(self.job_filter)
+
+        self.db_filter = QComboBox()
+        filter_layout.addWidget(QLabel("Database:"))
+        filter_layout.addWidget(self.db_filter)
+
+        self.format_filter = QComboBox()
+        filter_layout.addWidget(QLabel("Format:"))
+        filter_layout.addWidget(self.format_filter)
+
+        self.sort_combo = QComboBox()
+        self.sort_combo.addItems([self.SORT_LABELS[sort] for sort in SORT_COLUMNS])
+        filter_layout.addWidget(QLabel("Sort:"))
+        filter_layout.addWidget(self.sort_combo)
+
+        search_btn = QPushButton("Search")
+        search_btn.clicked.connect(self.load_results)
+        filter_layout.addWidget(search_btn)
+        layout.addLayout(filter_layout)
+
+        self.table = QTableWidget()
+        self.table.setColumnCount(8)
+        self.table.setHorizontalHeaderLabels(["File", "Created", "Job", "Database", "Format", "Rows", "Size",
+                                              "Range"])
+        self.table.horizontalHeader().setSectionResizeMode(QHeaderView.Interactive)
+        self.table.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.table.cellDoubleClicked.connect(self.open_selected)
+        layout.addWidget(self.table)
+
+        self.summary_label = QLabel()
+        layout.addWidget(self.summary_label)
+
+        # Retention: delete old exports and/or gzip old plain CSVs
+        retention_layout = QHBoxLayout()
+        self.max_age_input = QLineEdit()
+        self.max_age_input.setPlaceholderText("days")
+        retention_layout.addWidget(QLabel("Delete exports older than:"))
+        retention_layout.addWidget(self.max_age_input)
+        self.compress_after_input = QLineEdit()
+        self.compress_after_input.setPlaceholderText("days")
+        retention_layout.addWidget(QLabel("Compress CSVs older than:"))
+        retention_layout.addWidget(self.compress_after_input)
+        retention_btn = QPushButton("Apply Retention")
+        retention_btn.clicked.connect(self.apply_retention)
+        retention_layout.addWidget(retention_btn)
+        layout.addLayout(retention_layout)
+
+        button_layout = QHBoxLayout()
+        rescan_btn = QPushButton("Rescan Folder")
+        rescan_btn.clicked.connect(self.rescan)
+        button_layout.addWidget(rescan_btn)
+        open_button = QPushButton("Open Selected File")
+        open_button.clicked.connect(self.open_selected)
+        button_layout.addWidget(open_button)
+        layout.addLayout(button_layout)
+
+        self.load_filters()
+        self.load_results()
+
+    def load_filters(self):
+        for combo, column in ((self.job_filter, 'job_name'), (self.db_filter, 'database'),
+                              (self.format_filter, 'format')):
+            current = combo.currentText()
+            combo.clear()
+            combo.addItem("All")
+            combo.addItems(self.catalog.distinct(column))
+            if combo.findText(current) >= 0:
+                combo.setCurrentText(current)
+
+    def filter_value(self, combo):
+        return None if combo.currentText() == "All" else combo.currentText()
+
+    def load_results(self):
+        sort = list(SORT_COLUMNS)[self.sort_combo.currentIndex()]
+        results = self.catalog.search(name=self.name_filter.text(), job_name=self.filter_value(self.job_filter),
+                                      database=self.filter_value(self.db_filter),
+                                      export_format=self.filter_value(self.format_filter), sort=sort)
+        self.table.setRowCount(len(results))
+        for i, result in enumerate(results):
+            name_item = QTableWidgetItem(os.path.basename(result['path']))
+            name_item.setData(Qt.UserRole, result['path'])
+            name_item.setToolTip(result['path'])
+            self.table.setItem(i, 0, name_item)
+            self.table.setItem(i, 1, QTableWidgetItem(result['created_at'] or ""))
+            self.table.setItem(i, 2, QTableWidgetItem(result['job_name'] or ""))
+            self.table.setItem(i, 3, QTableWidgetItem(result['database'] or ""))
+            self.table.setItem(i, 4, QTableWidgetItem(result['format'] or ""))
+            self.table.setItem(i, 5, QTableWidgetItem("" if result['rows'] is None else str(result['rows'])))
+            self.table.setItem(i, 6, QTableWidgetItem(f"{(result['bytes'] or 0) / 1024 / 1024:.1f} MB"))
+            date_range = ""
+            if result['range_start'] is not None or result['range_end'] is not None:
+                date_range = f"{result['range_start'] or ''} - {result['range_end'] or ''}"
+            self.table.setItem(i, 7, QTableWidgetItem(date_range))
+        self.table.resizeColumnsToContents()
+        self.summary_label.setText(f"Showing {len(results)} of {self.catalog.count()} catalogued exports")
+
+    def rescan(self):
+        added, removed = self.catalog.rescan('.')
+        self.load_filters()
+        self.load_results()
+        self.summary_label.setText(self.summary_label.text() +
+                                   f" ({added} new files found, {removed} missing files dropped)")
+
+    def apply_retention(self):
+        try:
+            max_age = float(self.max_age_input.text()) if self.max_age_input.text().strip() else None
+            compress_after = float(self.compress_after_input.text()) if self.compress_after_input.text().strip() else None
+        except ValueError:
+            QMessageBox.warning(self, "Invalid Input", "Please enter the number of days.")
+            return
+        if max_age is None and compress_after is None:
+            return
+        confirm = QMessageBox.question(self, "Apply Retention",
+                                       "Old export files will be deleted or compressed on disk. Continue?",
+                                       QMessageBox.Yes | QMessageBox.No)
+        if confirm != QMessageBox.Yes:
+            return
+        include_rescanned = False
+        rescanned = self.catalog.rescanned_due(max_age, compress_after)
+        if rescanned:
+            # Rescans catalog every matching file in the folder, whether or not this app wrote it
+            answer = QMessageBox.question(self, "Apply Retention",
+                                          f"{rescanned} of the old files were found by Rescan Folder rather than "
+                                          "exported by this app. Delete or compress those too?",
+                                          QMessageBox.Yes | QMessageBox.No | QMessageBox.Cancel, QMessageBox.No)
+            if answer == QMessageBox.Cancel:
+                return
+            include_rescanned = answer == QMessageBox.Yes
+        deleted, compressed, freed = self.catalog.apply_retention(max_age, compress_after,
+                                                                  include_rescanned=include_rescanned)
+        self.load_filters()
+        self.load_results()
+        QMessageBox.information(self, "Retention Applied",
+                                f"Deleted {deleted} files and compressed {compressed}, "
+                                f"freeing {freed / 1024 / 1024:.1f} MB.")
+
+    def open_selected(self, *args):
+        row = self.table.currentRow()
+        if row < 0:
+            return
+        self.selected_path = self.table.item(row, 0).data(Qt.UserRole)
+        self.accept()
+
 class QueryHistoryDialog(QDialog):
     def __init__(self, history_db, parent=None):
         super().__init__(parent)
@@ -912,16 +2276,22 @@ class QueryHistoryDialog(QDialog):
         filter_layout.addWidget(QLabel("Database:"))
         filter_layout.addWidget(self.db_filter)
 
+        self.sort_combo = QComboBox()
+        self.sort_combo.addItems(["Newest", "Most frequent", "Most expensive"])
+        filter_layout.addWidget(QLabel("Sort:"))
+        filter_layout.addWidget(self.sort_combo)
+
         search_btn = QPushButton("Search")
         search_btn.clicked.connect(self.update_history)
         filter_layout.addWidget(search_btn)
 
         layout.addLayout(filter_layout)
 
-        # Results table
+        # Results table; one row per distinct query (literals ignored) and database
         self.table = QTableWidget()
-        self.table.setColumnCount(4)
-        self.table.setHorizontalHeaderLabels(["Timestamp", "Database", "Query", "Actions"])
+        self.table.setColumnCount(7)
+        self.table.setHorizontalHeaderLabels(["Last Run", "Database", "Query", "Runs", "Avg Time", "Total Time",
+                                              "Actions"])
         self.table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
         layout.addWidget(self.table)
 
@@ -946,72 +2316,59 @@ class QueryHistoryDialog(QDialog):
         self.update_history()
 
     def get_database_list(self):
-        cursor = self.history_db.cursor()
-        cursor.execute("SELECT DISTINCT database FROM query_history ORDER BY database")
-        return [row[0] for row in cursor.fetchall()]
+        return self.history_db.databases()
 
     def update_history(self):
+        # page_starts[i] is the sort key just above page i; None for the first page
         self.current_page = 0
+        self.page_starts = [None]
         self.load_page()
 
-    def load_page(self):
-        start_date = self.start_date.date().toString("yyyy-MM-dd")
-        end_date = self.end_date.date().toString("yyyy-MM-dd")
-        search_term = self.search_input.text()
+    def current_filters(self):
         selected_db = self.db_filter.currentText()
+        return (self.start_date.date().toString("yyyy-MM-dd"),
+                self.end_date.date().toString("yyyy-MM-dd") + " 23:59:59",
+                self.search_input.text(),
+                None if selected_db == "All Databases" else selected_db)
 
-        cursor = self.history_db.cursor()
-        
-        # Count total matching rows
-        count_query = """
-            SELECT COUNT(*) FROM query_history 
-            WHERE timestamp BETWEEN ? AND ?
-        """
-        params = [start_date, end_date + " 23:59:59"]
-
-        if search_term:
-            count_query += " AND query LIKE ?"
-            params.append(f"%{search_term}%")
-
-        if selected_db != "All Databases":
-            count_query += " AND database = ?"
-            params.append(selected_db)
-
-        cursor.execute(count_query, params)
-        total_rows = cursor.fetchone()[0]
-        self.total_pages = (total_rows - 1) // self.page_size + 1
-
-        # Fetch page data
-        offset = self.current_page * self.page_size
-        data_query = f"""
-            SELECT timestamp, database, query FROM query_history 
-            WHERE timestamp BETWEEN ? AND ?
-        """
-        if search_term:
-            data_query += " AND query LIKE ?"
-        if selected_db != "All Databases":
-            data_query += " AND database = ?"
-        data_query += f" ORDER BY timestamp DESC LIMIT {self.page_size} OFFSET {offset}"
-
-        cursor.execute(data_query, params)
-        results = cursor.fetchall()
+    def load_page(self):
+        filters = self.current_filters()
+        sort = list(HISTORY_SORTS)[self.sort_combo.currentIndex()]
+        total_rows, self.count_exact = self.history_db.count(*filters)
+        self.total_pages = max((total_rows - 1) // self.page_size + 1, 1)
+
+        results = self.history_db.search(*filters, sort=sort, before=self.page_starts[self.current_page],
+                                         limit=self.page_size)
+        self.last_key = self.history_db.page_key(results[-1], sort) if results else None
 
         self.table.setRowCount(len(results))
-        for i, (timestamp, database, query) in enumerate(results):
+        for i, (_, timestamp, database, query, run_count, total_duration, fingerprint) in enumerate(results):
             self.table.setItem(i, 0, QTableWidgetItem(timestamp))
             self.table.setItem(i, 1, QTableWidgetItem(database))
             self.table.setItem(i, 2, QTableWidgetItem(query))
-            
+            self.table.setItem(i, 3, QTableWidgetItem(str(run_count)))
+            self.table.setItem(i, 4, QTableWidgetItem(f"{(total_duration or 0) / max(run_count, 1):.2f} s"))
+            self.table.setItem(i, 5, QTableWidgetItem(f"{total_duration or 0:.1f} s"))
+
+            actions = QWidget()
+            actions_layout = QHBoxLayout(actions)
+            actions_layout.setContentsMargins(0, 0, 0, 0)
             reuse_btn = QPushButton("Reuse")
             reuse_btn.clicked.connect(lambda _, q=query: self.reuse_query(q))
-            self.table.setCellWidget(i, 3, reuse_btn)
+            actions_layout.addWidget(reuse_btn)
+            runs_btn = QPushButton("Runs")
+            runs_btn.clicked.connect(lambda _, f=fingerprint, d=database: self.show_runs(f, d))
+            actions_layout.addWidget(runs_btn)
+            self.table.setCellWidget(i, 6, actions)
 
+        self.has_next = len(results) == self.page_size
         self.update_pagination_controls()
 
     def update_pagination_controls(self):
-        self.page_label.setText(f"Page {self.current_page + 1} of {self.total_pages}")
+        total_pages = str(self.total_pages) if self.count_exact else f"{self.total_pages}+"
+        self.page_label.setText(f"Page {self.current_page + 1} of {total_pages}")
         self.prev_btn.setEnabled(self.current_page > 0)
-        self.next_btn.setEnabled(self.current_page < self.total_pages - 1)
+        self.next_btn.setEnabled(self.has_next and (self.current_page < self.total_pages - 1 or not self.count_exact))
 
     def prev_page(self):
         if self.current_page > 0:
@@ -1019,10 +2376,31 @@ class QueryHistoryDialog(QDialog):
             self.load_page()
 
     def next_page(self):
-        if self.current_page < self.total_pages - 1:
+        if self.has_next and self.last_key is not None:
             self.current_page += 1
+            del self.page_starts[self.current_page:]
+            self.page_starts.append(self.last_key)
             self.load_page()
 
+    def show_runs(self, fingerprint, database):
+        runs = self.history_db.runs(fingerprint, database)
+        dialog = QDialog(self)
+        dialog.setWindowTitle("Recent Runs")
+        dialog.resize(700, 400)
+        layout = QVBoxLayout(dialog)
+        table = QTableWidget(len(runs), 6)
+        table.setHorizontalHeaderLabels(["Time", "Database", "Duration", "Rows", "Bytes", "Cached"])
+        table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+        for i, (timestamp, database, duration, rows, bytes_fetched, cached) in enumerate(runs):
+            values = [timestamp, database, "" if duration is None else f"{duration:.2f} s",
+                      "" if rows is None else str(rows),
+                      "" if bytes_fetched is None else f"{bytes_fetched / 1024 / 1024:.1f} MB",
+                      "Yes" if cached else ""]
+            for j, value in enumerate(values):
+                table.setItem(i, j, QTableWidgetItem(value))
+        layout.addWidget(table)
+        dialog.exec_()
+
     def reuse_query(self, query):
         self.parent().query_input.setPlainText(query)
         self.accept()
@@ -0,0 +1,132 @@
+import re
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+
+from query_metrics import timed
+from result_buffers import fetch_dataframe, concat_frames
+
+DEFAULT_PARALLELISM = 4
+PARTITION_UNITS = {'day': 1, 'week': 7}
+
+# A date-bounded predicate like the one the CTA report template writes with its values filled in
+DATE_RANGE = re.compile(r"BETWEEN\s+(?P<first>'(?P<start>\d{4}-\d{2}-\d{2})(?:\s+00:00:00(?:\.0+)?)?')\s+"
+                        r"AND\s+(?P<last>'(?P<end>\d{4}-\d{2}-\d{2})(?:\s+23:59:59(?:\.9+)?)?')", re.IGNORECASE)
+
+
+def find_date_range(query):
+    match = DATE_RANGE.search(query)
+    if not match:
+        return None
+    return date.fromisoformat(match.group('start')), date.fromisoformat(match.group('end'))
+
+
+def partition_ranges(start, end, unit='day'):
+    step = timedelta(days=PARTITION_UNITS[unit])
+    ranges = []
+    while start <= end:
+        ranges.append((start, min(start + step - timedelta(days=1), end)))
+        start += step
+    return ranges
+
+
+def date_range_predicate(start, end, first=None, last=None):
+    # first and last are the query's own bound literals, kept as written for the outermost
+    # partitions: '2024-03-02' as an end bound stops at midnight, not at the end of that day.
+    # A split starts at the bare date, which also compares right against datetimes stored as text.
+    first = first or f"'{start.isoformat()}'"
+    last = last or f"'{end.isoformat()} 23:59:59.999999'"
+    return f"BETWEEN {first} AND {last}"
+
+
+class Partition:
+    def __init__(self, index, start, end, query):
+        self.index = index
+        self.start = start
+        self.end = end
+        self.query = query
+        self.status = 'pending'
+        self.rows = 0
+        self.error = None
+        self.df = None
+
+    def label(self):
+        if self.start == self.end:
+            return self.start.isoformat()
+        return f"{self.start.isoformat()} - {self.end.isoformat()}"
+
+
+class PartitionedQuery:
+    def __init__(self, pools, db_config, query, unit='day', parallelism=None):
+        match = DATE_RANGE.search(query)
+        if not match:
+            raise ValueError("The query has no BETWEEN 'yyyy-mm-dd' AND 'yyyy-mm-dd' date range to partition")
+        start, end = date.fromisoformat(match.group('start')), date.fromisoformat(match.group('end'))
+        self.pools = pools
+        self.db_config = db_config
+        self.parallelism = parallelism or db_config.get('max_parallel_partitions', DEFAULT_PARALLELISM)
+        self.cancel_requested = False
+        self.partitions = []
+        ranges = partition_ranges(start, end, unit)
+        for index, (part_start, part_end) in enumerate(ranges):
+            predicate = date_range_predicate(part_start, part_end, match.group('first') if index == 0 else None,
+                                             match.group('last') if index == len(ranges) - 1 else None)
+            part_query = query[:match.start()] + predicate + query[match.end():]
+            self.partitions.append(Partition(index, part_start, part_end, part_query))
+
+    def pending(self):
+        return [partition for partition in self.partitions if partition.status != 'done']
+
+    def run(self, on_update=None, timings=None):
+        # Runs every partition that hasn't completed yet, so calling it again retries only the failures.
+        # Phase times in timings are summed over partitions, so they can add up to more than the wall time.
+        def notify(partition):
+            if on_update is not None:
+                on_update(partition)
+
+        backend = self.pools.pool_for(self.db_config).backend
+
+        def run_partition(partition):
+            if self.cancel_requested:
+                return
+            partition.status = 'running'
+            partition.rows = 0
+            partition.error = None
+            notify(partition)
+
+            def on_batch(rows, total_rows):
+                partition.rows = total_rows
+                notify(partition)
+
+            try:
+                with self.pools.connection(self.db_config, timings=timings) as connection:
+                    cursor = backend.streaming_cursor(connection)
+                    with timed(timings, 'execute'):
+                        cursor.execute(partition.query)
+                    df = fetch_dataframe(cursor, on_batch=on_batch, should_stop=lambda: self.cancel_requested,
+                                         timings=timings)
+                    if self.cancel_requested:
+                        raise InterruptedError("Cancelled")
+                    cursor.close()
+            except Exception as error:
+                partition.status = 'failed'
+                partition.error = error
+            else:
+                partition.df = df
+                partition.rows = len(df)
+                partition.status = 'done'
+            notify(partition)
+
+        self.cancel_requested = False
+        with ThreadPoolExecutor(max_workers=self.parallelism) as executor:
+            list(executor.map(run_partition, self.pending()))
+        return not self.pending()
+
+    def cancel(self):
+        self.cancel_requested = True
+
+    def to_dataframe(self):
+        # Partitions are merged in date order regardless of which finished first
+        frames = [partition.df for partition in self.partitions]
+        if len(frames) == 1:
+            return frames[0]
+        return concat_frames(frames)
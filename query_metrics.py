@@ -0,0 +1,97 @@
+import json
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from datetime import datetime
+
+from history_store import fingerprint
+
+METRICS_LOG = 'query_metrics.jsonl'
+# Display order; a run only has the phases it went through
+PHASES = ('cache', 'acquire', 'connect', 'execute', 'fetch', 'build', 'render', 'export', 'history')
+
+
+class QueryTimings:
+    # Phase durations, rows and bytes for one run. Phases are timed on the worker thread and
+    # the GUI thread, and a phase entered several times (fetch, build) accumulates.
+    def __init__(self, kind, database=None, query=None, params=None):
+        self.kind = kind
+        self.database = database
+        self.fingerprint = fingerprint(query, params) if query else None
+        self.timestamp = datetime.now().isoformat(timespec='milliseconds')
+        self.started = time.perf_counter()
+        self.phases = {}
+        self.rows = None
+        self.bytes = None
+        self.status = None
+        self.total = None
+        self.lock = threading.Lock()
+
+    @contextmanager
+    def phase(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - started)
+
+    def add(self, name, seconds):
+        with self.lock:
+            self.phases[name] = self.phases.get(name, 0.0) + seconds
+
+    def finish(self, status='ok', rows=None, bytes_fetched=None):
+        self.status = status
+        if rows is not None:
+            self.rows = rows
+        if bytes_fetched is not None:
+            self.bytes = bytes_fetched
+        self.total = time.perf_counter() - self.started
+
+    def summary(self):
+        with self.lock:
+            phases = dict(self.phases)
+        names = [name for name in PHASES if name in phases] + sorted(set(phases) - set(PHASES))
+        return " · ".join(f"{name} {format_seconds(phases[name])}" for name in names)
+
+    def record(self):
+        with self.lock:
+            phases = {name: round(seconds, 6) for name, seconds in self.phases.items()}
+        return {
+            'timestamp': self.timestamp,
+            'kind': self.kind,
+            'database': self.database,
+            'fingerprint': self.fingerprint,
+            'status': self.status,
+            'rows': self.rows,
+            'bytes': self.bytes,
+            'total': None if self.total is None else round(self.total, 6),
+            'phases': phases,
+        }
+
+
+def timed(timings, name):
+    # For code paths where instrumentation is optional
+    return nullcontext() if timings is None else timings.phase(name)
+
+
+def format_seconds(seconds):
+    if seconds < 1:
+        return f"{seconds * 1000:.0f} ms"
+    return f"{seconds:.2f} s"
+
+
+class MetricsLog:
+    # One JSON object per line, so runs can be compared across databases and releases with any JSON tool.
+    # Shared by the GUI thread and scheduler workers.
+    def __init__(self, path=METRICS_LOG):
+        self.path = path
+        self.lock = threading.Lock()
+
+    def write(self, timings):
+        line = json.dumps(timings.record(), default=str)
+        with self.lock:
+            try:
+                with open(self.path, 'a') as f:
+                    f.write(line + '\n')
+            except OSError:
+                pass  # Metrics must never make a query fail
@@ -0,0 +1,166 @@
+import json
+
+import numpy as np
+import pandas as pd
+
+from db_backends import MYSQL_BACKENDS
+from partitioned_query import find_date_range
+from query_validation import strip_comments
+from script_generator import detect_primary_key, selects_column
+
+# Per-database thresholds; set "preflight": true in a db_configs entry to turn the check on
+DEFAULT_MAX_EXAMINED_ROWS = 1000000
+DEFAULT_MAX_SCAN_ROWS = 100000
+DEFAULT_ROW_LIMIT = 10000
+FULL_SCAN_ACCESS = ('ALL', 'index')  # every row of the table, or of one of its indexes
+# Plan nodes that wrap the join without changing how many rows it returns
+PLAN_WRAPPERS = ('ordering_operation', 'windowing')
+
+
+def explain_plan(connection, query, params=None, backend=None):
+    # A template's query is explained with its values bound, on the backend's prepared cursor
+    cursor = connection.cursor() if params is None else backend.prepared_cursor(connection)
+    cursor.execute("EXPLAIN FORMAT=JSON " + strip_comments(query), params)
+    plan = cursor.fetchone()[0]
+    cursor.close()
+    if isinstance(plan, (bytes, bytearray)):
+        plan = plan.decode('utf-8')
+    return json.loads(plan)
+
+
+def plan_tables(node, loops=1):
+    # Yields (table access, times it runs) for every table in an EXPLAIN FORMAT=JSON plan.
+    # In a nested loop each table is scanned once per row the tables before it produced.
+    if isinstance(node, list):
+        for item in node:
+            yield from plan_tables(item, loops)
+    elif isinstance(node, dict):
+        for key, value in node.items():
+            if key == 'nested_loop':
+                prefix = loops
+                for item in value:
+                    yield from plan_tables(item, prefix)
+                    table = item.get('table', {})
+                    prefix = loops * max(float(table.get('rows_produced_per_join', 1)), 1)
+            elif key == 'table' and isinstance(value, dict):
+                yield value, loops
+                # Derived tables and subqueries below are materialized once
+                yield from plan_tables(value, 1)
+            elif isinstance(value, (dict, list)):
+                yield from plan_tables(value, loops)
+
+
+class PreflightReport:
+    def __init__(self, plan, query):
+        self.examined_rows = 0
+        self.full_scans = []  # (table name, rows examined, the date range filter is applied to it)
+        date_range = find_date_range(query)
+        for table, loops in plan_tables(plan):
+            rows = int(float(table.get('rows_examined_per_scan', 0)) * loops)
+            self.examined_rows += rows
+            if table.get('access_type') in FULL_SCAN_ACCESS:
+                filters_dates = date_range is not None and \
+                    date_range[0].isoformat() in table.get('attached_condition', '')
+                self.full_scans.append((table.get('table_name', '?'), rows, filters_dates))
+
+    def warnings(self, max_examined_rows=DEFAULT_MAX_EXAMINED_ROWS, max_scan_rows=DEFAULT_MAX_SCAN_ROWS):
+        warnings = []
+        if self.examined_rows > max_examined_rows:
+            warnings.append(f"About {self.examined_rows:,} rows would be examined "
+                            f"(threshold {max_examined_rows:,})")
+        for table, rows, filters_dates in self.full_scans:
+            if rows <= max_scan_rows:
+                continue
+            if filters_dates:
+                warnings.append(f"The date range on {table} can't use an index; all {rows:,} rows are scanned")
+            else:
+                warnings.append(f"Full scan of {table} ({rows:,} rows)")
+        return warnings
+
+
+def preflight_query(connection, query, params=None, backend=None, literal_query=None):
+    # literal_query is the same SQL with any bound values written in; the plan comes from the bound
+    # one, but the date range is only visible in the text of the literal one
+    return PreflightReport(explain_plan(connection, query, params, backend), literal_query or query)
+
+
+def preflight_thresholds(db_config):
+    return (db_config.get('preflight_max_rows', DEFAULT_MAX_EXAMINED_ROWS),
+            db_config.get('preflight_scan_rows', DEFAULT_MAX_SCAN_ROWS))
+
+
+def estimated_result_rows(plan):
+    # The optimizer's guess at how many rows the query returns: what the last table of the
+    # outermost join produces. None for plans it can't be read from (UNION, GROUP BY and the like).
+    node = plan.get('query_block', {})
+    while True:
+        if 'nested_loop' in node:
+            table = node['nested_loop'][-1].get('table', {})
+        elif isinstance(node.get('table'), dict):
+            table = node['table']
+        else:
+            node = next((node[key] for key in PLAN_WRAPPERS if key in node), None)
+            if node is None:
+                return None
+            continue
+        if 'rows_produced_per_join' not in table:
+            return None
+        return int(float(table['rows_produced_per_join']))
+
+
+def limited_query(query, limit, offset=0, order_by=None):
+    # Wrapping keeps any LIMIT, ORDER BY or UNION in the user's SQL intact. The server may return
+    # the wrapped rows in any order, so pages only line up when order_by names a unique key.
+    query = f"SELECT * FROM (\n{strip_comments(query)}\n) AS limited"
+    if order_by is not None:
+        query += f"\nORDER BY {order_by}"
+    query += f"\nLIMIT {int(limit)}"
+    return query + f" OFFSET {int(offset)}" if offset else query
+
+
+class PreviewPager:
+    # Pages through a query's result for the preview. Ordered by a unique key, each page after the
+    # first continues past the last key shown, so a page costs the same however far down it is.
+    # Without a key, pages fall back to OFFSET, which may repeat or skip rows.
+    def __init__(self, query, rows, backend, params=None, order_by=None):
+        self.query = query
+        self.rows = rows
+        self.backend = backend
+        self.params = params  # a template's bound values
+        self.order_by = order_by  # unique key column in the result, or None
+        self.fetched = 0
+        self.last_key = None
+        self.complete = False
+
+    def find_order(self, connection):
+        # The MySQL backends can report a single-table query's primary key, if the result has it
+        if self.backend.name not in MYSQL_BACKENDS:
+            return
+        key = detect_primary_key(connection, self.query)
+        if key is not None and selects_column(self.query, key):
+            self.order_by = key
+
+    def page(self):
+        # (sql, params) of the next page
+        key = None if self.order_by is None else self.backend.quote_identifier(self.order_by)
+        if self.fetched == 0 or key is None:
+            return limited_query(self.query, self.rows, self.fetched, key), self.params
+        query = strip_comments(self.query)
+        if self.params is None and self.backend.prepared_placeholder == '%s':
+            query = query.replace('%', '%%')  # the driver interpolates the key value itself
+        page = (f"SELECT * FROM (\n{query}\n) AS limited\n"
+                f"WHERE {key} > {self.backend.prepared_placeholder}\nORDER BY {key}\nLIMIT {int(self.rows)}")
+        return page, tuple(self.params or ()) + (self.last_key,)
+
+    def add_page(self, df):
+        self.fetched += len(df)
+        self.complete = len(df) < self.rows
+        if self.order_by is None or not len(df):
+            return
+        names = [str(name).lower() for name in df.columns]
+        value = df.iloc[-1, names.index(self.order_by.lower())]
+        if isinstance(value, pd.Timestamp):
+            value = value.to_pydatetime()
+        elif isinstance(value, np.generic):
+            value = value.item()
+        self.last_key = self.backend.adapt(value)
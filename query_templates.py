@@ -0,0 +1,138 @@
+import json
+import re
+from datetime import date, datetime, time
+
+from query_validation import TOKEN
+
+TEMPLATES_FILE = 'query_templates.json'
+PARAMETER_TYPES = ('date', 'datetime', 'int', 'float', 'text')
+# Main window widgets a parameter can take its value from; the others get an input of their own
+PARAMETER_SOURCES = ('start_date', 'end_date')
+PARAMETER_NAME = re.compile(r"[A-Za-z_]\w*")
+
+DEFAULT_TEMPLATES = [
+    {
+        "name": "CTA report by date",
+        "query": "SELECT * FROM `cta_report`\nWHERE `added_on` BETWEEN :start AND :end",
+        "params": [
+            {"name": "start", "type": "datetime", "source": "start_date"},
+            {"name": "end", "type": "datetime", "source": "end_date"}
+        ]
+    }
+]
+
+
+def placeholders(query):
+    # (start, end, name) of every :name outside strings, comments and quoted identifiers.
+    # :: casts and := assignments are left alone.
+    spans = []
+    position = 0
+    while position < len(query):
+        match = TOKEN.match(query, position)
+        if match.lastgroup == 'end_executable':
+            position += 1
+            continue
+        position = match.end()
+        if match.group() != ':' or query[match.start() - 1:match.start()] == ':':
+            continue
+        name = PARAMETER_NAME.match(query, position)
+        if name is not None and TOKEN.match(query, position).end() == name.end():
+            spans.append((match.start(), name.end(), name.group()))
+            position = name.end()
+    return spans
+
+
+def parameter_value(param, value):
+    # Converts a widget value to the parameter's type. A datetime taken from the end date
+    # picker runs to the end of that day, so the range includes the whole day.
+    kind = param['type']
+    if kind == 'datetime':
+        if isinstance(value, datetime):
+            return value
+        day = value if isinstance(value, date) else date.fromisoformat(str(value))
+        return datetime.combine(day, time.max if param.get('source') == 'end_date' else time.min)
+    if kind == 'date':
+        if isinstance(value, datetime):
+            return value.date()
+        return value if isinstance(value, date) else date.fromisoformat(str(value))
+    if kind == 'int':
+        return int(value)
+    if kind == 'float':
+        return float(value)
+    return str(value)
+
+
+def sql_literal(value, backend):
+    if isinstance(value, datetime):
+        return f"'{value.isoformat(sep=' ')}'"
+    if isinstance(value, date):
+        return f"'{value.isoformat()}'"
+    if isinstance(value, (int, float)):
+        return repr(value)
+    return backend.quote_literal(value)
+
+
+class QueryTemplate:
+    def __init__(self, name, query, params=()):
+        self.name = name
+        self.query = query.strip()
+        self.params = [dict(param) for param in params]
+        declared = {param['name'] for param in self.params}
+        for param in self.params:
+            if param.get('type', 'text') not in PARAMETER_TYPES:
+                raise ValueError(f"Template '{name}': unknown type '{param['type']}' for :{param['name']}")
+            if param.get('source') not in (None,) + PARAMETER_SOURCES:
+                raise ValueError(f"Template '{name}': unknown source '{param['source']}' for :{param['name']}")
+            param.setdefault('type', 'text')
+        used = {placeholder_name for _, _, placeholder_name in placeholders(self.query)}
+        if used - declared:
+            raise ValueError(f"Template '{name}' uses undeclared parameters: "
+                             + ", ".join(f":{unknown}" for unknown in sorted(used - declared)))
+
+    def matches(self, query):
+        # The editor still holds this template as it was loaded
+        return query.strip() == self.query
+
+    def values(self, raw_values):
+        return {param['name']: parameter_value(param, raw_values.get(param['name'], param.get('default')))
+                for param in self.params}
+
+    def bind(self, raw_values, backend):
+        # The query with each :name replaced by the backend's placeholder, and the values in that order.
+        # Drivers that interpolate %s themselves need literal percent signs escaped.
+        values = self.values(raw_values)
+        escape = backend.prepared_placeholder == '%s'
+        parts = []
+        params = []
+        position = 0
+        for start, end, name in placeholders(self.query):
+            text = self.query[position:start]
+            parts.append(text.replace('%', '%%') if escape else text)
+            parts.append(backend.prepared_placeholder)
+            params.append(backend.adapt(values[name]))
+            position = end
+        text = self.query[position:]
+        parts.append(text.replace('%', '%%') if escape else text)
+        return ''.join(parts), tuple(params)
+
+    def literal_query(self, raw_values, backend):
+        # Values written into the SQL, for partitioned runs and generated scripts, which work on the text
+        values = self.values(raw_values)
+        parts = []
+        position = 0
+        for start, end, name in placeholders(self.query):
+            parts.append(self.query[position:start])
+            parts.append(sql_literal(values[name], backend))
+            position = end
+        parts.append(self.query[position:])
+        return ''.join(parts)
+
+
+def load_templates(path=TEMPLATES_FILE):
+    try:
+        with open(path, 'r') as f:
+            entries = json.load(f)
+    except FileNotFoundError:
+        entries = DEFAULT_TEMPLATES
+    return [QueryTemplate(entry['name'], entry['query'], entry.get('params', ())) for entry in entries]
+
@@ -0,0 +1,120 @@
+import argparse
+import logging
+import signal
+import sys
+import threading
+
+from app_config import load_db_configs, DB_CONFIGS_FILE
+from connection_pool import ConnectionPools
+from results_catalog import ResultsCatalog, CATALOG_DB
+from history_store import HistoryStore, HISTORY_DB
+from query_metrics import MetricsLog, METRICS_LOG
+from scheduled_jobs import JobScheduler, load_jobs, SCHEDULED_QUERIES_FILE
+
+# Headless entry point: nothing here may import PyQt5, so it runs on servers without a display.
+#
+#   python query_tool.py run-scheduler
+#   python query_tool.py run-scheduler --once
+#   python query_tool.py clean-results --max-age-days 90 --compress-after-days 7
+
+
+def log_job(job, status, filename):
+    if status.startswith('error'):
+        logging.error("Job %s (%s) failed: %s", job['id'], job['output_file'], status)
+    else:
+        logging.info("Job %s wrote %s rows to %s in %.1fs", job['id'], job.get('last_rows'), filename,
+                     job.get('last_duration', 0))
+
+
+def run_scheduler(args):
+    db_configs = load_db_configs(args.db_configs)
+    default_database = db_configs[0]['name'] if db_configs else None
+    jobs = load_jobs(args.jobs, default_database=default_database)
+    pools = ConnectionPools()
+    catalog = ResultsCatalog(args.catalog)
+    history = HistoryStore(args.history_db)
+    scheduler = JobScheduler(jobs, db_configs, pools, path=args.jobs, max_workers=args.workers,
+                             check_interval=args.check_interval, on_job_finished=log_job, catalog=catalog,
+                             history=history, metrics=MetricsLog(args.metrics_log))
+    logging.info("Loaded %d scheduled queries from %s", len(jobs), args.jobs)
+
+    if args.once:
+        # Run whatever is due right now, wait for it, and exit (for cron-style use)
+        scheduler.check_due()
+        scheduler.wait_until_idle()
+        scheduler.stop(wait=True)
+        pools.close_all()
+        catalog.close()
+        history.close()
+        return 0
+
+    stopped = threading.Event()
+
+    def request_stop(signum, frame):
+        logging.info("Received signal %d, stopping after running jobs finish", signum)
+        stopped.set()
+
+    signal.signal(signal.SIGTERM, request_stop)
+    signal.signal(signal.SIGINT, request_stop)
+
+    scheduler.start()
+    while not stopped.wait(1):
+        pass
+    scheduler.stop(wait=True)
+    pools.close_all()
+    catalog.close()
+    history.close()
+    return 0
+
+
+def clean_results(args):
+    catalog = ResultsCatalog(args.catalog)
+    if args.rescan:
+        added, removed = catalog.rescan(args.rescan)
+        logging.info("Catalog rescan of %s: %d files added, %d missing files dropped", args.rescan, added, removed)
+    deleted, compressed, freed = catalog.apply_retention(args.max_age_days, args.compress_after_days,
+                                                         include_rescanned=args.include_rescanned)
+    logging.info("Deleted %d exports, compressed %d, freed %.1f MB", deleted, compressed, freed / 1024 / 1024)
+    catalog.close()
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='query-tool', description="Database Query Tool command line")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    scheduler_parser = subparsers.add_parser('run-scheduler', help="Run scheduled queries without the GUI")
+    scheduler_parser.add_argument('--jobs', default=SCHEDULED_QUERIES_FILE,
+                                  help="Scheduled queries file (default: %(default)s)")
+    scheduler_parser.add_argument('--db-configs', default=DB_CONFIGS_FILE,
+                                  help="Database configurations file (default: %(default)s)")
+    scheduler_parser.add_argument('--workers', type=int, default=2,
+                                  help="Jobs that may run at the same time (default: %(default)s)")
+    scheduler_parser.add_argument('--check-interval', type=int, default=30,
+                                  help="Seconds between checks for due jobs (default: %(default)s)")
+    scheduler_parser.add_argument('--once', action='store_true', help="Run the jobs that are due now and exit")
+    scheduler_parser.add_argument('--catalog', default=CATALOG_DB,
+                                  help="Database the saved results catalog is kept in (default: %(default)s)")
+    scheduler_parser.add_argument('--history-db', default=HISTORY_DB,
+                                  help="Query history database runs are logged to (default: %(default)s)")
+    scheduler_parser.add_argument('--metrics-log', default=METRICS_LOG,
+                                  help="JSON lines file each run's timings are appended to (default: %(default)s)")
+    scheduler_parser.set_defaults(func=run_scheduler)
+
+    clean_parser = subparsers.add_parser('clean-results', help="Apply a retention policy to saved results")
+    clean_parser.add_argument('--max-age-days', type=float, help="Delete exports older than this")
+    clean_parser.add_argument('--compress-after-days', type=float, help="Gzip plain CSV exports older than this")
+    clean_parser.add_argument('--rescan', metavar='DIR', help="Catalog export files in DIR that aren't catalogued yet")
+    clean_parser.add_argument('--include-rescanned', action='store_true',
+                              help="Also delete or compress files that were only found by a rescan")
+    clean_parser.add_argument('--catalog', default=CATALOG_DB,
+                              help="Database the saved results catalog is kept in (default: %(default)s)")
+    clean_parser.set_defaults(func=clean_results)
+
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    return args.func(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
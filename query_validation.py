@@ -0,0 +1,159 @@
+import re
+from functools import lru_cache
+
+# Statement types that only read data
+READ_ONLY_STATEMENTS = ('select', 'show', 'describe', 'explain')
+STATEMENT_ALIASES = {'desc': 'describe', 'with': 'select', 'table': 'select', 'values': 'select'}
+# What can follow EXPLAIN/DESCRIBE when it explains a statement rather than a table
+EXPLAINABLE = ('select', 'with', 'table', 'values', 'insert', 'replace', 'update', 'delete')
+
+# One pass over the text. MySQL runs the body of /*! ... */ comments, so only their markers are dropped.
+TOKEN = re.compile(r"""
+    (?P<space>\s+)
+  | (?P<comment>--(?=\s|$)[^\n]*|\#[^\n]*|/\*(?!!).*?(?:\*/|\Z))
+  | (?P<executable>/\*!\d*)
+  | (?P<end_executable>\*/)
+  | (?P<string>'(?:[^'\\]|\\.|'')*(?:'|\Z)|"(?:[^"\\]|\\.|"")*(?:"|\Z))
+  | (?P<identifier>`(?:[^`]|``)*(?:`|\Z))
+  | (?P<number>(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?(?![\w$]))
+  | (?P<word>[\w$]+)
+  | (?P<symbol>.)
+""", re.VERBOSE | re.DOTALL)
+
+
+class QueryInfo:
+    def __init__(self, statement_types, read_only, reason, normalized):
+        self.statement_types = statement_types
+        self.statement_type = statement_types[0] if statement_types else None
+        self.read_only = read_only
+        self.reason = reason
+        self.normalized = normalized
+
+    @property
+    def cacheable(self):
+        # SHOW and EXPLAIN output describes server state, not data, so it isn't worth caching
+        return len(self.statement_types) == 1 and self.statement_type == 'select'
+
+
+def tokenize(query, fold_case=True):
+    # Returns (kind, text) pairs with whitespace and comments dropped; words are lower-cased unless fold_case is off
+    tokens = []
+    in_executable = False
+    position = 0
+    while position < len(query):
+        match = TOKEN.match(query, position)
+        kind = match.lastgroup
+        if kind == 'end_executable' and not in_executable:
+            # A multiplication right before a comment, as in 2*/* note */3
+            tokens.append(('symbol', '*'))
+            position += 1
+            continue
+        position = match.end()
+        if kind in ('space', 'comment'):
+            continue
+        if kind in ('executable', 'end_executable'):
+            in_executable = kind == 'executable'
+            continue
+        text = match.group()
+        tokens.append((kind, text.lower() if fold_case and kind == 'word' else text))
+    return tokens
+
+
+def strip_comments(query):
+    # The query as written, minus comments and trailing semicolons, for wrapping in more SQL.
+    # Unlike tokenize() it keeps strings, case and spacing, and /*! ... */ comments, which MySQL runs.
+    parts = []
+    in_executable = False
+    position = 0
+    while position < len(query):
+        match = TOKEN.match(query, position)
+        kind = match.lastgroup
+        if kind == 'end_executable' and not in_executable:
+            parts.append('*')  # as in tokenize(): a multiplication right before a comment
+            position += 1
+            continue
+        position = match.end()
+        if kind in ('executable', 'end_executable'):
+            in_executable = kind == 'executable'
+        parts.append(' ' if kind == 'comment' else match.group())
+    text = ''.join(parts).strip()
+    while text.endswith(';'):
+        text = text[:-1].rstrip()
+    return text
+
+
+def split_statements(tokens):
+    statements = [[]]
+    for token in tokens:
+        if token == ('symbol', ';'):
+            statements.append([])
+        else:
+            statements[-1].append(token)
+    return [statement for statement in statements if statement]
+
+
+def top_level_words(tokens):
+    # Words outside any parentheses, so subqueries and function arguments don't count
+    depth = 0
+    for kind, text in tokens:
+        if kind == 'symbol':
+            if text == '(':
+                depth += 1
+            elif text == ')':
+                depth = max(depth - 1, 0)
+        elif kind == 'word' and depth == 0:
+            yield text
+
+
+def classify_statement(tokens):
+    # Returns (statement type, reason it isn't read-only or None)
+    words = [text for kind, text in tokens if kind == 'word']
+    if not words:
+        return 'unknown', "The query has no statement"
+    first = words[0]
+    if first in ('explain', 'describe', 'desc'):
+        for position, (kind, text) in enumerate(tokens[1:], 1):
+            if kind == 'word' and text in EXPLAINABLE:
+                explained, reason = classify_statement(tokens[position:])
+                if reason is not None:
+                    return 'explain', f"EXPLAIN {explained.upper()} is not allowed"
+                return 'explain', None
+        return STATEMENT_ALIASES.get(first, first), None
+
+    statement_type = STATEMENT_ALIASES.get(first, first)
+    if first == 'with':
+        # The statement after the common table expressions decides what the query does
+        main = next((word for word in top_level_words(tokens) if word in EXPLAINABLE and word != 'with'), 'select')
+        statement_type = STATEMENT_ALIASES.get(main, main)
+    if statement_type not in READ_ONLY_STATEMENTS:
+        return statement_type, f"{statement_type.upper()} statements are not allowed"
+    if statement_type == 'select':
+        previous = None
+        for word in top_level_words(tokens):
+            if previous == 'into' and word in ('outfile', 'dumpfile'):
+                return statement_type, "SELECT ... INTO OUTFILE writes to the server"
+            if previous == 'for' and word == 'update':
+                return statement_type, "SELECT ... FOR UPDATE locks rows"
+            previous = word
+    return statement_type, None
+
+
+@lru_cache(maxsize=256)
+def classify_query(query):
+    # Memoized on the query text; execution, caching, export and script generation all ask about the same query
+    tokens = tokenize(query)
+    statement_types = []
+    reason = None
+    for statement in split_statements(tokens):
+        statement_type, statement_reason = classify_statement(statement)
+        statement_types.append(statement_type)
+        reason = reason or statement_reason
+    if not statement_types:
+        reason = "The query has no statement"
+    # Case is kept: unquoted table names and aliases can be case-sensitive, and aliases name the result columns
+    normalized = ' '.join(text for kind, text in tokenize(query, fold_case=False)).rstrip(';').strip()
+    return QueryInfo(statement_types, reason is None, reason, normalized)
+
+
+def is_read_only_query(query):
+    return classify_query(query).read_only
@@ -0,0 +1,161 @@
+import numpy as np
+import pandas as pd
+from mysql.connector.constants import FieldType, FieldFlag
+
+from query_metrics import timed
+
+try:
+    import pyarrow  # noqa: F401  (backs the string columns)
+    STRING_DTYPE = pd.StringDtype('pyarrow')
+except ImportError:
+    STRING_DTYPE = None
+
+DEFAULT_BATCH_SIZE = 10000
+# Text columns with at most this share of distinct values are stored as categoricals
+CATEGORY_MAX_RATIO = 0.5
+CATEGORY_SAMPLE = 10000
+
+# Bits per MySQL integer type; PyMySQL uses the same type codes
+INTEGER_BITS = {FieldType.TINY: 8, FieldType.SHORT: 16, FieldType.INT24: 32, FieldType.LONG: 32,
+                FieldType.LONGLONG: 64, FieldType.YEAR: 16}
+FLOAT_TYPES = {FieldType.FLOAT: 'float32', FieldType.DOUBLE: 'float64'}
+# DuckDB describes columns with its own type names
+DUCKDB_TYPES = {'TINYINT': 'int8', 'SMALLINT': 'int16', 'INTEGER': 'int32', 'BIGINT': 'int64',
+                'UTINYINT': 'uint8', 'USMALLINT': 'uint16', 'UINTEGER': 'uint32', 'UBIGINT': 'uint64',
+                'FLOAT': 'float32', 'DOUBLE': 'float64'}
+
+
+def dtype_for(column):
+    # column is a cursor.description entry: (name, type_code, ..., null_ok, flags, ...)
+    type_code = column[1]
+    if isinstance(type_code, int):
+        if type_code in INTEGER_BITS:
+            bits = INTEGER_BITS[type_code]
+            if len(column) > 7:
+                return np.dtype(f"{'uint' if (column[7] or 0) & FieldFlag.UNSIGNED else 'int'}{bits}")
+            # No flags (PyMySQL): an unsigned value needs the next size up to fit a signed type.
+            # Nothing holds both signed and unsigned BIGINT, so those stay Python ints.
+            return np.dtype(f"int{bits * 2}") if bits < 64 else np.dtype(object)
+        if type_code in FLOAT_TYPES:
+            return np.dtype(FLOAT_TYPES[type_code])
+    elif type_code is not None and str(type_code) in DUCKDB_TYPES:
+        return np.dtype(DUCKDB_TYPES[str(type_code)])
+    # Decimals, strings, dates and anything from drivers without type codes
+    return np.dtype(object)
+
+
+def text_series(values):
+    # An object array of strings as a categorical when few values repeat, else as Arrow-backed
+    # strings. The sample keeps high-cardinality columns from paying for a full factorize.
+    sample = values[:CATEGORY_SAMPLE]
+    if len(pd.unique(sample)) <= len(sample) * CATEGORY_MAX_RATIO:
+        codes, uniques = pd.factorize(values, sort=True)
+        if len(uniques) <= len(values) * CATEGORY_MAX_RATIO:
+            categories = pd.CategoricalDtype(pd.Index(uniques, dtype=STRING_DTYPE))
+            return pd.Series(pd.Categorical.from_codes(codes, dtype=categories))
+    return pd.Series(pd.array(values, dtype=STRING_DTYPE))
+
+
+def concat_frames(frames):
+    # pd.concat decodes categoricals with different categories, and may leave a categorical next to
+    # a string column as objects; keep them compact
+    df = pd.concat(frames, ignore_index=True)
+    for j in range(df.shape[1]):
+        parts = [frame.iloc[:, j] for frame in frames]
+        if isinstance(df.iloc[:, j].dtype, pd.CategoricalDtype):
+            continue
+        if all(isinstance(part.dtype, pd.CategoricalDtype) for part in parts):
+            df.isetitem(j, pd.api.types.union_categoricals(parts, sort_categories=True))
+        elif df.iloc[:, j].dtype == object and all(isinstance(part.dtype, (pd.CategoricalDtype, pd.StringDtype))
+                                                  for part in parts):
+            df.isetitem(j, text_series(df.iloc[:, j].to_numpy(dtype=object, na_value=None)))
+    return df
+
+
+class ColumnBuffer:
+    def __init__(self, dtype, capacity):
+        self.dtype = dtype
+        self.values = np.empty(capacity, dtype=dtype)
+        # Integer arrays can't hold NULL, so track it separately
+        self.mask = np.zeros(capacity, dtype=bool) if dtype.kind in 'iu' else None
+        self.size = 0
+
+    def reserve(self, count):
+        needed = self.size + count
+        if needed <= len(self.values):
+            return
+        capacity = max(needed, len(self.values) * 2)
+        self.values = self.grow(self.values, capacity)
+        if self.mask is not None:
+            self.mask = self.grow(self.mask, capacity)
+
+    def grow(self, array, capacity):
+        grown = np.zeros(capacity, dtype=array.dtype) if array.dtype == bool else np.empty(capacity, dtype=array.dtype)
+        grown[:self.size] = array[:self.size]
+        return grown
+
+    def append(self, column_values):
+        count = len(column_values)
+        self.reserve(count)
+        end = self.size + count
+        if self.mask is not None and None in column_values:
+            self.mask[self.size:end] = [value is None for value in column_values]
+            column_values = [0 if value is None else value for value in column_values]
+        if self.dtype == object:
+            # fromiter keeps sequence-like values (bytes, JSON arrays) as single cells
+            column_values = np.fromiter(column_values, dtype=object, count=count)
+        self.values[self.size:end] = column_values
+        self.size = end
+
+    def to_series(self):
+        # Shrink in place rather than slicing so the spare capacity is released
+        self.values.resize(self.size, refcheck=False)
+        if self.mask is not None:
+            self.mask.resize(self.size, refcheck=False)
+            if self.mask.any():
+                return pd.Series(pd.arrays.IntegerArray(self.values, self.mask))
+            return pd.Series(self.values)
+        if self.dtype == object:
+            if STRING_DTYPE is not None and pd.api.types.infer_dtype(self.values, skipna=True) == 'string':
+                return text_series(self.values)
+            # Let pandas pick datetime dtypes the same way the DataFrame constructor does
+            return pd.Series(self.values).infer_objects()
+        return pd.Series(self.values)
+
+
+class ResultAssembler:
+    def __init__(self, description, capacity=DEFAULT_BATCH_SIZE):
+        self.columns = [column[0] for column in description]
+        self.buffers = [ColumnBuffer(dtype_for(column), capacity) for column in description]
+        self.row_count = 0
+
+    def add_rows(self, rows):
+        if not rows:
+            return
+        for buffer, column_values in zip(self.buffers, zip(*rows)):
+            buffer.append(column_values)
+        self.row_count += len(rows)
+
+    def to_dataframe(self):
+        series = [buffer.to_series() for buffer in self.buffers]
+        self.buffers = []
+        # Positional keys keep duplicate column names intact; copy=False avoids a second copy of the data
+        df = pd.DataFrame(dict(enumerate(series)), copy=False)
+        df.columns = self.columns
+        return df
+
+
+def fetch_dataframe(cursor, batch_size=DEFAULT_BATCH_SIZE, on_batch=None, should_stop=None, timings=None):
+    # With a QueryTimings, time spent waiting on the server is 'fetch' and filling the column buffers is 'build'
+    assembler = ResultAssembler(cursor.description, batch_size)
+    while should_stop is None or not should_stop():
+        with timed(timings, 'fetch'):
+            rows = cursor.fetchmany(batch_size)
+        if not rows:
+            break
+        with timed(timings, 'build'):
+            assembler.add_rows(rows)
+        if on_batch is not None:
+            on_batch(rows, assembler.row_count)
+    with timed(timings, 'build'):
+        return assembler.to_dataframe()
@@ -0,0 +1,139 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import pandas as pd
+
+from query_validation import classify_query
+
+try:
+    import pyarrow  # noqa: F401  (only needed for the Parquet spill files)
+    SPILL_EXTENSION = '.parquet'
+except ImportError:
+    SPILL_EXTENSION = '.pkl'
+
+DEFAULT_CACHE_TTL = 600  # seconds, used when a db_configs entry enables caching without a TTL
+DEFAULT_MEMORY_BUDGET = 512 * 1024 * 1024
+DEFAULT_DISK_BUDGET = 4 * 1024 * 1024 * 1024
+DEFAULT_CACHE_DIR = 'query_cache'
+
+
+def normalize_query(query):
+    # Comments and whitespace never change the result; everything else, including the case of words, is kept
+    return classify_query(query).normalized
+
+
+def cache_key(database, query, params=None):
+    payload = json.dumps([database, normalize_query(query), params], default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def frame_size(df):
+    return int(df.memory_usage(index=True, deep=True).sum())
+
+
+class ResultCache:
+    def __init__(self, memory_budget=DEFAULT_MEMORY_BUDGET, cache_dir=DEFAULT_CACHE_DIR,
+                 disk_budget=DEFAULT_DISK_BUDGET):
+        self.memory_budget = memory_budget
+        self.cache_dir = cache_dir
+        self.disk_budget = disk_budget
+        self.entries = OrderedDict()  # key -> (df, created, size), least recently used first
+        self.memory_used = 0
+        self.lock = threading.Lock()
+
+    def get(self, key, ttl):
+        # Returns (df, created) for a fresh entry, else None
+        now = time.time()
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                df, created, _ = entry
+                if now - created <= ttl:
+                    self.entries.move_to_end(key)
+                    return df, created
+                self.drop(key)
+        return self.load_spilled(key, ttl, now)
+
+    def put(self, key, df):
+        size = frame_size(df)
+        self.invalidate(key)
+        if size > self.memory_budget:
+            # Too big to keep in memory; go straight to disk
+            self.spill(key, df, time.time())
+            return
+        with self.lock:
+            self.entries[key] = (df, time.time(), size)
+            self.memory_used += size
+            evicted = []
+            while self.memory_used > self.memory_budget:
+                old_key, (old_df, old_created, _) = next(iter(self.entries.items()))
+                self.drop(old_key)
+                evicted.append((old_key, old_df, old_created))
+        for old_key, old_df, old_created in evicted:
+            self.spill(old_key, old_df, old_created)
+
+    def invalidate(self, key):
+        with self.lock:
+            self.drop(key)
+        path = self.spill_path(key)
+        if os.path.exists(path):
+            os.remove(path)
+
+    def drop(self, key):
+        # Called with the lock held
+        entry = self.entries.pop(key, None)
+        if entry is not None:
+            self.memory_used -= entry[2]
+
+    def spill_path(self, key):
+        return os.path.join(self.cache_dir, key + SPILL_EXTENSION)
+
+    def spill(self, key, df, created):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        path = self.spill_path(key)
+        try:
+            if SPILL_EXTENSION == '.parquet':
+                df.to_parquet(path, index=False)
+            else:
+                df.to_pickle(path)
+        except Exception:
+            # Some results (mixed-type or duplicate columns) can't be written; just don't cache them
+            if os.path.exists(path):
+                os.remove(path)
+            return
+        # The file's modification time doubles as the entry's creation time
+        os.utime(path, (created, created))
+        self.trim_disk()
+
+    def load_spilled(self, key, ttl, now):
+        path = self.spill_path(key)
+        try:
+            created = os.path.getmtime(path)
+        except OSError:
+            return None
+        if now - created > ttl:
+            os.remove(path)
+            return None
+        if SPILL_EXTENSION == '.parquet':
+            df = pd.read_parquet(path)
+        else:
+            df = pd.read_pickle(path)
+        return df, created
+
+    def trim_disk(self):
+        files = []
+        for name in os.listdir(self.cache_dir):
+            if name.endswith(SPILL_EXTENSION):
+                path = os.path.join(self.cache_dir, name)
+                stat = os.stat(path)
+                files.append((stat.st_mtime, stat.st_size, path))
+        total = sum(size for _, size, _ in files)
+        for _, size, path in sorted(files):
+            if total <= self.disk_budget:
+                break
+            os.remove(path)
+            total -= size
@@ -0,0 +1,217 @@
+import operator
+
+import numpy as np
+import pandas as pd
+
+FILTER_OPERATORS = ('contains', '=', '!=', '>', '>=', '<', '<=', 'is empty', 'is not empty')
+AGGREGATES = ('count', 'sum', 'mean', 'min', 'max', 'nunique')
+COMPARISONS = {'=': operator.eq, '!=': operator.ne, '>': operator.gt, '>=': operator.ge,
+               '<': operator.lt, '<=': operator.le}
+# What pandas infers for object columns the drivers fill with Decimal, date and datetime values
+NUMERIC_KINDS = ('integer', 'floating', 'mixed-integer-float', 'decimal')
+DATE_KINDS = ('date', 'datetime', 'datetime64')
+
+
+def sort_keys(values):
+    # (numpy array that orders like the column, missing mask)
+    missing = values.isna().to_numpy(dtype=bool)
+    if pd.api.types.is_datetime64_any_dtype(values):
+        return values.array.asi8, missing
+    if values.dtype.kind in 'iub' and not missing.any():
+        return values.to_numpy(), missing
+    return values.to_numpy(dtype='float64', na_value=np.nan), missing
+
+
+def tie_runs(ordered):
+    # Start of each run of equal values in a sorted array, and the run each position belongs to
+    starts = np.flatnonzero(np.r_[True, ordered[1:] != ordered[:-1]])
+    runs = np.repeat(np.arange(len(starts)), np.diff(np.r_[starts, len(ordered)]))
+    return starts, runs
+
+
+def stable_argsort(keys, missing):
+    # Ascending, ties in row order, missing values last. A quicksort plus fixing up the tied runs
+    # is several times faster than a stable sort on random data.
+    valid = None if not missing.any() else np.flatnonzero(~missing)
+    if valid is None:
+        order = np.argsort(keys)
+    else:
+        order = valid[np.argsort(keys[valid])]
+    ordered = keys[order]
+    if (ordered[1:] == ordered[:-1]).any():
+        _, runs = tie_runs(ordered)
+        order = order[np.argsort(runs * len(keys) + order)]
+    if valid is None:
+        return order
+    return np.concatenate([order, np.flatnonzero(missing)])
+
+
+def reversed_order(order, keys, missing):
+    # The descending counterpart of a stable ascending order: reversed, with ties put back in row
+    # order and missing values still last
+    present = len(order) - np.count_nonzero(missing)
+    reverse = order[:present][::-1]
+    ordered = keys[reverse]
+    if (ordered[1:] == ordered[:-1]).any():
+        starts, runs = tie_runs(ordered)
+        ends = np.r_[starts[1:], present]
+        reverse = reverse[starts[runs] + ends[runs] - 1 - np.arange(present)]
+    return np.concatenate([reverse, order[present:]])
+
+
+class ResultView:
+    # Filters, sort order and grouping over a loaded result, without re-querying. The visible rows
+    # are an index permutation into the original columns, so nothing is copied until an export
+    # needs the rows. Columns are referred to by position, since result headers can repeat.
+    def __init__(self, df):
+        self.df = df
+        self.filters = []  # (column, operator, value) descriptions, in the order they were added
+        self.mask = None  # rows passing every filter, or None without filters
+        self.sort = None  # (column, ascending)
+        self.orders = {}  # (column, ascending) -> stable argsort of the whole column
+        self.comparables = {}  # column -> (values to compare and sort, parser for a typed-in value)
+        self.factors = {}  # column -> (codes, distinct values as strings)
+        self.rows = None  # visible row positions, or None for every row in its original order
+
+    @property
+    def row_count(self):
+        return len(self.df) if self.rows is None else len(self.rows)
+
+    def add_filter(self, column, op, value=''):
+        # Raises ValueError when the value doesn't parse as the column's type
+        mask = self.filter_mask(column, op, value)
+        self.mask = mask if self.mask is None else self.mask & mask
+        self.filters.append((column, op, value))
+        self.update_rows()
+
+    def clear_filters(self):
+        self.filters = []
+        self.mask = None
+        self.update_rows()
+
+    def sort_by(self, column, ascending=True):
+        self.sort = None if column is None else (column, ascending)
+        self.update_rows()
+
+    def update_rows(self):
+        # A sorted order is computed once per column; filtering it again only takes the rows that pass
+        if self.sort is None:
+            self.rows = None if self.mask is None else np.flatnonzero(self.mask)
+            return
+        order = self.sort_order(*self.sort)
+        self.rows = order if self.mask is None else order[self.mask[order]]
+
+    def sort_order(self, column, ascending):
+        key = (column, ascending)
+        if key not in self.orders:
+            values = self.comparable(column)[0]
+            if values is None:
+                # Text: sort the distinct values, then order the rows by their rank
+                codes, uniques = self.factorized(column)
+                rank = np.empty(len(uniques) + 1, dtype=np.intp)
+                rank[np.asarray(uniques.array.argsort(ascending=ascending, kind='stable'))] = np.arange(len(uniques))
+                rank[-1] = len(uniques)  # missing values last either way
+                order = np.argsort(rank[codes], kind='stable')
+            else:
+                keys, missing = sort_keys(values)
+                if ascending:
+                    order = stable_argsort(keys, missing)
+                else:
+                    order = reversed_order(self.sort_order(column, True), keys, missing)
+            self.orders[key] = np.asarray(order, dtype=np.intp)
+        return self.orders[key]
+
+    def comparable(self, column):
+        # (values to compare and sort, parser for a typed-in value). Text columns have no values
+        # here; they go through factorized() instead.
+        if column not in self.comparables:
+            series = self.df.iloc[:, column]
+            if pd.api.types.is_bool_dtype(series):
+                parse = lambda value: value.strip().lower() in ('1', 'true', 'yes')
+            elif pd.api.types.is_numeric_dtype(series):
+                parse = float
+            elif pd.api.types.is_datetime64_any_dtype(series):
+                parse = pd.Timestamp
+            else:
+                kind = pd.api.types.infer_dtype(series, skipna=True)
+                if kind in NUMERIC_KINDS:
+                    try:
+                        series = series.astype('float64')
+                    except (TypeError, ValueError):
+                        series = pd.to_numeric(series, errors='coerce')
+                    parse = float
+                elif kind in DATE_KINDS:
+                    series = pd.to_datetime(series, errors='coerce')
+                    parse = pd.Timestamp
+                else:
+                    series = None
+                    parse = str
+            self.comparables[column] = (series, parse)
+        return self.comparables[column]
+
+    def factorized(self, column):
+        # (code per row, distinct values as strings). Text filters test each distinct value once and
+        # map the answer back through the codes, which stays fast for repeated values. Missing values
+        # have code -1, which indexes the extra slot callers append.
+        if column not in self.factors:
+            codes, uniques = pd.factorize(self.df.iloc[:, column], use_na_sentinel=True)
+            self.factors[column] = (codes, pd.Series(uniques).astype('string'))
+        return self.factors[column]
+
+    def text_mask(self, column, test, missing=False):
+        codes, uniques = self.factorized(column)
+        hits = test(uniques).to_numpy(dtype=bool, na_value=False)
+        return np.append(hits, missing)[codes]
+
+    def filter_mask(self, column, op, value):
+        values, parse = self.comparable(column)
+        if op in ('is empty', 'is not empty'):
+            if values is None:
+                empty = self.text_mask(column, lambda uniques: uniques == '', missing=True)
+            else:
+                empty = values.isna().to_numpy(dtype=bool)
+            return empty if op == 'is empty' else ~empty
+        if op == 'contains':
+            return self.text_mask(column, lambda uniques: uniques.str.contains(value, case=False, regex=False))
+        if op not in COMPARISONS:
+            raise ValueError(f"Unknown filter operator '{op}'")
+        try:
+            target = parse(value)
+        except (TypeError, ValueError):
+            raise ValueError(f"'{value}' isn't a valid value for {self.df.columns[column]}") from None
+        if values is None:
+            return self.text_mask(column, lambda uniques: COMPARISONS[op](uniques, target))
+        return COMPARISONS[op](values, target).to_numpy(dtype=bool, na_value=False)
+
+    def frame(self):
+        # The visible rows as their own frame, for exports
+        if self.rows is None:
+            return self.df
+        return self.df.take(self.rows).reset_index(drop=True)
+
+    def group(self, by, aggregate, column=None):
+        # One row per value of the by column over the filtered rows. Only the two columns involved are read.
+        keys = self.df.iloc[:, by]
+        values = None if column is None or aggregate == 'count' else self.comparable(column)[0]
+        if values is None:
+            if aggregate in ('sum', 'mean'):
+                raise ValueError(f"Can't take the {aggregate} of {self.df.columns[column]}, it holds text")
+            values = keys if column is None or aggregate == 'count' else self.df.iloc[:, column]
+        if self.mask is not None:
+            keys = keys[self.mask]
+            values = values[self.mask]
+        grouped = values.groupby(keys, dropna=False, observed=True, sort=True)
+        if aggregate == 'count':
+            result = grouped.size()
+            name = 'count'
+        else:
+            try:
+                result = grouped.agg(aggregate)
+            except TypeError:
+                raise ValueError(f"Can't take the {aggregate} of {self.df.columns[column]}") from None
+            name = f"{aggregate}({self.df.columns[column]})"
+        return pd.DataFrame({self.df.columns[by]: result.index, name: result.to_numpy()})
+
+    def describe(self):
+        names = self.df.columns
+        return ", ".join(f"{names[column]} {op} {value}".rstrip() for column, op, value in self.filters)
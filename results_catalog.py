@@ -0,0 +1,232 @@
+import gzip
+import hashlib
+import json
+import os
+import shutil
+import sqlite3
+import threading
+from datetime import datetime, timedelta
+
+from exporters import EXPORT_FORMATS, format_for_path
+
+CATALOG_DB = 'query_history.db'
+# Written next to saved results by saved_results.py; they go wherever their data file goes
+SIDECAR_SUFFIXES = ('.schema.json', '.offsets.npy')
+DATETIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+SORT_COLUMNS = {
+    'newest': 'created_at DESC',
+    'oldest': 'created_at ASC',
+    'largest': 'bytes DESC',
+    'most_rows': 'rows DESC',
+    'name': 'path ASC',
+}
+
+
+def query_hash(query):
+    if not query:
+        return None
+    return hashlib.sha256(' '.join(query.split()).rstrip(';').encode('utf-8')).hexdigest()
+
+
+def remove_export_file(path):
+    for filename in (path,) + tuple(path + suffix for suffix in SIDECAR_SUFFIXES):
+        try:
+            os.remove(filename)
+        except FileNotFoundError:
+            pass
+
+
+class ResultsCatalog:
+    # One row per export file, so the saved results dialog never has to scan the export folder.
+    # Scheduled jobs record from worker threads, so the connection is shared behind a lock.
+    def __init__(self, path=CATALOG_DB):
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self.db.row_factory = sqlite3.Row
+        self.db.executescript('''
+            CREATE TABLE IF NOT EXISTS saved_results
+            (id INTEGER PRIMARY KEY AUTOINCREMENT,
+             path TEXT NOT NULL UNIQUE,
+             format TEXT,
+             job_id TEXT,
+             job_name TEXT,
+             database TEXT,
+             query_hash TEXT,
+             rows INTEGER,
+             bytes INTEGER,
+             columns TEXT,
+             created_at DATETIME,
+             range_start TEXT,
+             range_end TEXT,
+             rolling INTEGER DEFAULT 0,
+             rescanned INTEGER DEFAULT 0);
+            CREATE INDEX IF NOT EXISTS idx_saved_results_created ON saved_results(created_at);
+            CREATE INDEX IF NOT EXISTS idx_saved_results_job ON saved_results(job_name, created_at);
+            CREATE INDEX IF NOT EXISTS idx_saved_results_database ON saved_results(database, created_at);
+            CREATE INDEX IF NOT EXISTS idx_saved_results_format ON saved_results(format, created_at);
+            CREATE INDEX IF NOT EXISTS idx_saved_results_bytes ON saved_results(bytes);
+            CREATE INDEX IF NOT EXISTS idx_saved_results_rows ON saved_results(rows);
+            CREATE INDEX IF NOT EXISTS idx_saved_results_query ON saved_results(query_hash);
+        ''')
+        columns = [row[1] for row in self.db.execute("PRAGMA table_info(saved_results)")]
+        if 'rescanned' not in columns:
+            # Older catalogs: recorded exports always have a row count or query, rescanned files have neither
+            self.db.execute('ALTER TABLE saved_results ADD COLUMN rescanned INTEGER DEFAULT 0')
+            self.db.execute('UPDATE saved_results SET rescanned = 1 WHERE rows IS NULL AND query_hash IS NULL')
+        self.db.commit()
+
+    def record(self, path, export_format=None, rows=None, columns=None, job=None, database=None, query=None,
+               range_start=None, range_end=None, append=False):
+        # Appending to a rolling file (incremental jobs) adds to its row count and widens its range
+        path = os.path.abspath(path)
+        values = {
+            'path': path,
+            'format': export_format or format_for_path(path),
+            'job_id': job['id'] if job else None,
+            'job_name': job['output_file'] if job else None,
+            'database': database,
+            'query_hash': query_hash(query),
+            'rows': rows,
+            'bytes': os.path.getsize(path),
+            'columns': json.dumps(list(columns)) if columns is not None else None,
+            'created_at': datetime.now().strftime(DATETIME_FORMAT),
+            'range_start': None if range_start is None else str(range_start),
+            'range_end': None if range_end is None else str(range_end),
+            'rolling': int(append),
+            'rescanned': 0,
+        }
+        if append:
+            conflict = '''rows = COALESCE(rows, 0) + excluded.rows, bytes = excluded.bytes,
+                          created_at = excluded.created_at, range_end = excluded.range_end, rolling = 1,
+                          rescanned = 0'''
+        else:
+            conflict = ', '.join(f"{name} = excluded.{name}" for name in values if name != 'path')
+        with self.lock:
+            self.db.execute(f'''
+                INSERT INTO saved_results ({', '.join(values)})
+                VALUES ({', '.join(':' + name for name in values)})
+                ON CONFLICT(path) DO UPDATE SET {conflict}
+            ''', values)
+            self.db.commit()
+
+    def rescan(self, directory='.'):
+        # Picks up exports written before the catalog existed (or by other tools) and drops
+        # entries whose files are gone. Found files are marked rescanned, since nothing says they
+        # are exports; retention leaves them alone unless asked. Returns (added, removed).
+        extensions = tuple(exporter.extension for exporter in EXPORT_FORMATS.values())
+        known = {row['path'] for row in self.query('SELECT path FROM saved_results')}
+        added = 0
+        on_disk = set()
+        with self.lock:
+            for entry in os.scandir(directory):
+                if not entry.is_file() or not entry.name.endswith(extensions):
+                    continue
+                path = os.path.abspath(entry.path)
+                on_disk.add(path)
+                if path in known:
+                    continue
+                stat = entry.stat()
+                self.db.execute('''
+                    INSERT INTO saved_results (path, format, bytes, created_at, rescanned) VALUES (?, ?, ?, ?, 1)
+                ''', (path, format_for_path(path), stat.st_size,
+                      datetime.fromtimestamp(stat.st_mtime).strftime(DATETIME_FORMAT)))
+                added += 1
+            directory = os.path.abspath(directory)
+            missing = [path for path in known if os.path.dirname(path) == directory and path not in on_disk]
+            self.db.executemany('DELETE FROM saved_results WHERE path = ?', [(path,) for path in missing])
+            self.db.commit()
+        return added, len(missing)
+
+    def query(self, sql, params=()):
+        with self.lock:
+            return self.db.execute(sql, params).fetchall()
+
+    def count(self):
+        return self.query('SELECT COUNT(*) FROM saved_results')[0][0]
+
+    def distinct(self, column):
+        # Served from the (column, created_at) indexes
+        return [row[0] for row in self.query(
+            f'SELECT DISTINCT {column} FROM saved_results WHERE {column} IS NOT NULL ORDER BY {column}')]
+
+    def search(self, name=None, job_name=None, database=None, export_format=None, sort='newest', limit=500):
+        conditions = []
+        params = []
+        if job_name:
+            conditions.append('job_name = ?')
+            params.append(job_name)
+        if database:
+            conditions.append('database = ?')
+            params.append(database)
+        if export_format:
+            conditions.append('format = ?')
+            params.append(export_format)
+        if name:
+            conditions.append('path LIKE ?')
+            params.append(f'%{name}%')
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+        return self.query(f'''
+            SELECT * FROM saved_results {where}
+            ORDER BY {SORT_COLUMNS[sort]} LIMIT ?
+        ''', params + [limit])
+
+    def forget(self, path):
+        with self.lock:
+            self.db.execute('DELETE FROM saved_results WHERE path = ?', (os.path.abspath(path),))
+            self.db.commit()
+
+    def rescanned_due(self, max_age_days=None, compress_after_days=None, now=None):
+        # How many rescanned files a retention run with include_rescanned would touch
+        now = now or datetime.now()
+        cutoffs = [now - timedelta(days=days) for days in (max_age_days, compress_after_days) if days is not None]
+        if not cutoffs:
+            return 0
+        cutoff = max(cutoffs).strftime(DATETIME_FORMAT)
+        return self.query('SELECT COUNT(*) FROM saved_results WHERE rescanned = 1 AND created_at < ?',
+                          (cutoff,))[0][0]
+
+    def apply_retention(self, max_age_days=None, compress_after_days=None, now=None, include_rescanned=False):
+        # Deletes exports older than max_age_days and gzips plain CSVs older than compress_after_days.
+        # Rolling files that incremental jobs still append to are never compressed, and files only
+        # found by a rescan are skipped unless include_rescanned.
+        # Returns (files deleted, files compressed, bytes freed).
+        now = now or datetime.now()
+        deleted = compressed = freed = 0
+        scope = '' if include_rescanned else ' AND rescanned = 0'
+        if max_age_days is not None:
+            cutoff = (now - timedelta(days=max_age_days)).strftime(DATETIME_FORMAT)
+            for row in self.query(f'SELECT path, bytes FROM saved_results WHERE created_at < ?{scope}', (cutoff,)):
+                remove_export_file(row['path'])
+                self.forget(row['path'])
+                deleted += 1
+                freed += row['bytes'] or 0
+        if compress_after_days is not None:
+            cutoff = (now - timedelta(days=compress_after_days)).strftime(DATETIME_FORMAT)
+            rows = self.query(f'''
+                SELECT path, bytes FROM saved_results
+                WHERE format = 'csv' AND rolling = 0 AND created_at < ?{scope}
+            ''', (cutoff,))
+            for row in rows:
+                if not os.path.exists(row['path']):
+                    self.forget(row['path'])
+                    continue
+                target = row['path'] + '.gz'
+                if os.path.exists(target) or self.query('SELECT 1 FROM saved_results WHERE path = ?', (target,)):
+                    continue  # never overwrite another file; the CSV stays as it is
+                with open(row['path'], 'rb') as source, gzip.open(target, 'wb', compresslevel=6) as sink:
+                    shutil.copyfileobj(source, sink, 1024 * 1024)
+                remove_export_file(row['path'])
+                size = os.path.getsize(target)
+                with self.lock:
+                    self.db.execute('''
+                        UPDATE saved_results SET path = ?, format = 'csv.gz', bytes = ? WHERE path = ?
+                    ''', (target, size, row['path']))
+                    self.db.commit()
+                compressed += 1
+                freed += (row['bytes'] or 0) - size
+        return deleted, compressed, freed
+
+    def close(self):
+        with self.lock:
+            self.db.close()
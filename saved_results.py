@@ -0,0 +1,323 @@
+import csv
+import io
+import json
+import mmap
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.ipc
+    import pyarrow.parquet
+except ImportError:
+    pa = None
+
+from exporters import EXPORT_FORMATS, format_for_path
+
+SCHEMA_SUFFIX = '.schema.json'
+OFFSETS_SUFFIX = '.offsets.npy'
+SCHEMA_SAMPLE_ROWS = 1000
+FIRST_INDEX_CHUNK = 1024 * 1024  # indexed up front so the first page shows immediately
+INDEX_CHUNK = 64 * 1024 * 1024
+LOAD_CHUNK_ROWS = 100000  # compressed CSVs load in chunks so closing one doesn't wait for the whole file
+
+
+def file_signature(path):
+    stat = os.stat(path)
+    return {'size': stat.st_size, 'mtime': stat.st_mtime}
+
+
+def load_schema(path):
+    # The sidecar is only trusted while the data file is unchanged
+    try:
+        with open(path + SCHEMA_SUFFIX, 'r') as f:
+            schema = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if schema.get('signature') != file_signature(path):
+        return None
+    return schema
+
+
+def save_schema(path, schema):
+    schema['signature'] = file_signature(path)
+    try:
+        with open(path + SCHEMA_SUFFIX, 'w') as f:
+            json.dump(schema, f)
+    except OSError:
+        pass  # Read-only export folders just don't get a sidecar
+
+
+def infer_schema(path):
+    sample = pd.read_csv(path, nrows=SCHEMA_SAMPLE_ROWS)
+    return {'columns': [str(column) for column in sample.columns],
+            'dtypes': [str(dtype) for dtype in sample.dtypes]}
+
+
+def read_dtypes(schema):
+    # Integer columns may have NULLs further down than the sample reached
+    dtypes = {}
+    for column, dtype in zip(schema['columns'], schema['dtypes']):
+        if dtype.startswith('int'):
+            dtypes[column] = 'Int64'
+        elif dtype.startswith('float') or dtype == 'bool':
+            dtypes[column] = dtype
+        else:
+            dtypes[column] = 'object'
+    return dtypes
+
+
+def load_frame(path):
+    # Full read that reuses the cached schema instead of running type inference again
+    schema = load_schema(path)
+    if schema is None:
+        schema = infer_schema(path)
+        save_schema(path, schema)
+    return pd.read_csv(path, dtype=read_dtypes(schema))
+
+
+class CsvRowSource:
+    # Memory-maps an uncompressed CSV and indexes row start offsets in the background,
+    # so any page can be parsed on demand without reading the whole file
+    def __init__(self, path):
+        self.path = path
+        self.size = os.path.getsize(path)
+        self.complete = False
+        self.error = None
+        self.stop_requested = False
+        self.file = open(path, 'rb')
+        self.mm = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ) if self.size else None
+
+        self.schema = load_schema(path)
+        if self.schema is None:
+            self.schema = infer_schema(path) if self.size else {'columns': [], 'dtypes': []}
+        self.columns = self.schema['columns']
+        self.dtypes = self.schema['dtypes']
+
+        # starts[i] is the byte offset where line i begins; line 0 is the header
+        self.starts = np.zeros(1024, dtype=np.int64)
+        self.line_count = 0
+        self.indexed_to = 0
+        self.lock = threading.Lock()  # guards starts, line_count, indexed_to and complete together
+        self.in_quotes = False
+        self.has_quotes = self.mm is not None and self.mm.find(b'"') != -1
+        self.thread = None
+
+        cached = self.load_cached_offsets()
+        if not cached:
+            self.append_starts(np.zeros(1, dtype=np.int64))
+            self.index_chunk(FIRST_INDEX_CHUNK)
+
+    @property
+    def row_count(self):
+        with self.lock:
+            return self.rows_indexed(self.line_count, self.complete)
+
+    @staticmethod
+    def rows_indexed(line_count, complete):
+        # Until indexing finishes, the last known line may still run past the indexed bytes
+        return max(line_count - (1 if complete else 2), 0)
+
+    def load_cached_offsets(self):
+        if 'rows' not in self.schema:
+            return False
+        try:
+            starts = np.load(self.path + OFFSETS_SUFFIX, mmap_mode='r')
+        except (OSError, ValueError):
+            return False
+        if len(starts) != self.schema['rows'] + 1:
+            return False
+        self.starts = starts
+        self.line_count = len(starts)
+        self.indexed_to = self.size
+        self.complete = True
+        return True
+
+    def append_starts(self, new_starts):
+        needed = self.line_count + len(new_starts)
+        if needed > len(self.starts):
+            grown = np.zeros(max(needed, len(self.starts) * 2), dtype=np.int64)
+            grown[:self.line_count] = self.starts[:self.line_count]
+            self.starts = grown
+        self.starts[self.line_count:needed] = new_starts
+        self.line_count = needed
+
+    def index_chunk(self, chunk_size):
+        if self.indexed_to >= self.size:
+            with self.lock:
+                self.complete = True
+            return
+        start = self.indexed_to
+        count = min(chunk_size, self.size - start)
+        data = np.frombuffer(self.mm, dtype=np.uint8, count=count, offset=start)
+        newlines = np.flatnonzero(data == 10)
+        if self.has_quotes:
+            # A newline only ends a row when it isn't inside a quoted field
+            quotes = np.flatnonzero(data == 34)
+            quotes_before = np.searchsorted(quotes, newlines) + int(self.in_quotes)
+            newlines = newlines[quotes_before % 2 == 0]
+            self.in_quotes = (int(self.in_quotes) + len(quotes)) % 2 == 1
+        del data
+        line_starts = newlines + start + 1
+        with self.lock:
+            self.append_starts(line_starts[line_starts < self.size])
+            self.indexed_to = start + count
+            if self.indexed_to >= self.size:
+                self.complete = True
+
+    def build_index(self):
+        try:
+            while not self.complete and not self.stop_requested:
+                self.index_chunk(INDEX_CHUNK)
+        except Exception as error:
+            self.error = error
+            with self.lock:
+                self.complete = True
+            return
+        if self.complete and not self.stop_requested:
+            self.save_offsets()
+
+    def save_offsets(self):
+        self.schema['rows'] = self.row_count
+        try:
+            np.save(self.path + OFFSETS_SUFFIX, self.starts[:self.line_count])
+        except OSError:
+            return
+        save_schema(self.path, self.schema)
+
+    def start_indexing(self):
+        if not self.complete:
+            self.thread = threading.Thread(target=self.build_index, daemon=True)
+            self.thread.start()
+
+    def read_rows(self, start, stop):
+        # One consistent snapshot; the indexer may replace starts with a grown copy at any time
+        with self.lock:
+            starts, line_count, indexed_to = self.starts, self.line_count, self.indexed_to
+            stop = min(stop, self.rows_indexed(line_count, self.complete))
+        if start >= stop:
+            return []
+        begin = int(starts[start + 1])
+        end = int(starts[stop + 1]) if stop + 1 < line_count else indexed_to
+        text = self.mm[begin:end].decode('utf-8', errors='replace')
+        return [tuple(row) for row in csv.reader(io.StringIO(text, newline=''))][:stop - start]
+
+    def close(self):
+        self.stop_requested = True
+        if self.thread is not None:
+            self.thread.join()
+        if self.mm is not None:
+            self.mm.close()
+        self.file.close()
+
+
+class ArrowRowSource:
+    # Parquet row groups and Arrow IPC record batches are already randomly addressable
+    def __init__(self, path):
+        if pa is None:
+            raise ImportError("Opening Parquet or Arrow files needs the pyarrow package")
+        self.path = path
+        self.complete = True
+        self.error = None
+        if path.endswith(EXPORT_FORMATS['parquet'].extension):
+            self.reader = pyarrow.parquet.ParquetFile(path)
+            schema = self.reader.schema_arrow
+            sizes = [self.reader.metadata.row_group(i).num_rows for i in range(self.reader.num_row_groups)]
+            self.read_group = self.reader.read_row_group
+        else:
+            self.reader = pyarrow.ipc.open_file(pa.memory_map(path, 'r'))
+            schema = self.reader.schema
+            sizes = [self.reader.get_batch(i).num_rows for i in range(self.reader.num_record_batches)]
+            self.read_group = self.reader.get_batch
+        self.columns = schema.names
+        self.dtypes = [str(field.type) for field in schema]
+        self.group_starts = np.concatenate([[0], np.cumsum(sizes, dtype=np.int64)])
+        self.row_count = int(self.group_starts[-1])
+        self.cached_group = (None, None)
+
+    def start_indexing(self):
+        pass
+
+    def group(self, index):
+        if self.cached_group[0] != index:
+            self.cached_group = (index, self.read_group(index))
+        return self.cached_group[1]
+
+    def read_rows(self, start, stop):
+        stop = min(stop, self.row_count)
+        rows = []
+        while start < stop:
+            index = int(np.searchsorted(self.group_starts, start, side='right')) - 1
+            group_start = int(self.group_starts[index])
+            group_stop = min(stop, int(self.group_starts[index + 1]))
+            part = self.group(index).slice(start - group_start, group_stop - start)
+            rows.extend(zip(*[column.to_pylist() for column in part.columns]))
+            start = group_stop
+        return rows
+
+    def close(self):
+        self.cached_group = (None, None)
+
+
+class FrameRowSource:
+    # Compressed CSVs can't be addressed by offset; load them in the background with the cached schema
+    def __init__(self, path):
+        self.path = path
+        self.complete = False
+        self.error = None
+        self.df = None
+        self.schema = load_schema(path)
+        if self.schema is None:
+            self.schema = infer_schema(path)
+        self.columns = self.schema['columns']
+        self.dtypes = self.schema['dtypes']
+        # Show the head straight away while the rest loads
+        self.head = pd.read_csv(path, nrows=SCHEMA_SAMPLE_ROWS, dtype=read_dtypes(self.schema))
+        self.row_count = len(self.head)
+        self.stop_requested = False
+        self.thread = None
+
+    def load(self):
+        chunks = []
+        try:
+            reader = pd.read_csv(self.path, dtype=read_dtypes(self.schema), chunksize=LOAD_CHUNK_ROWS)
+            with reader:
+                for chunk in reader:
+                    if self.stop_requested:
+                        return
+                    chunks.append(chunk)
+            self.df = pd.concat(chunks, ignore_index=True) if chunks else self.head
+            save_schema(self.path, self.schema)
+            self.row_count = len(self.df)
+        except Exception as error:
+            self.error = error
+        self.complete = True
+
+    def start_indexing(self):
+        self.thread = threading.Thread(target=self.load, daemon=True)
+        self.thread.start()
+
+    def read_rows(self, start, stop):
+        df = self.df if self.df is not None else self.head
+        return list(df.iloc[start:stop].itertuples(index=False, name=None))
+
+    def close(self):
+        # The loader stops at its next chunk
+        self.stop_requested = True
+        if self.thread is not None:
+            self.thread.join()
+
+
+def open_saved_result(path):
+    export_format = format_for_path(path)
+    if export_format in ('parquet', 'arrow'):
+        source = ArrowRowSource(path)
+    elif export_format == 'csv':
+        source = CsvRowSource(path)
+    else:
+        source = FrameRowSource(path)
+    source.start_indexing()
+    return source
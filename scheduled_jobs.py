@@ -0,0 +1,307 @@
+import json
+import numbers
+import os
+import random
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from db_backends import BACKENDS, DEFAULT_BACKEND
+from query_validation import classify_query, strip_comments
+from exporters import EXPORT_FORMATS, DEFAULT_EXPORT_BATCH_SIZE, export_cursor, open_exporter
+from query_metrics import QueryTimings, timed
+
+SCHEDULED_QUERIES_FILE = 'scheduled_queries.json'
+OVERLAP_POLICIES = ('skip', 'queue')
+CATCH_UP_POLICIES = ('run_once', 'run_all', 'skip')
+
+
+def incremental_query(query, watermark_column, backend=BACKENDS[DEFAULT_BACKEND]):
+    # Only rows past the stored high-water mark; the derived table lets MySQL push the predicate down.
+    # With the MySQL drivers the watermark is bound as %s, so literal percent signs in the job's SQL are escaped.
+    # Comments go first: a trailing -- comment would otherwise swallow the wrapper.
+    query = strip_comments(query)
+    if backend.placeholder == '%s':
+        query = query.replace('%', '%%')
+    column = backend.quote_identifier(watermark_column)
+    return (f"SELECT * FROM (\n{query}\n) AS incremental\n"
+            f"WHERE {column} > {backend.placeholder}\nORDER BY {column}")
+
+
+def watermark_value(value):
+    # Stored in scheduled_queries.json, so keep it JSON friendly
+    if isinstance(value, numbers.Integral):
+        return int(value)
+    if isinstance(value, numbers.Real):
+        return float(value)
+    return str(value)
+
+
+def timestamped_filename(output_file, timestamp, extension):
+    # Runs finishing within the same second must not overwrite each other
+    filename = f"{output_file}_{timestamp}{extension}"
+    counter = 1
+    while os.path.exists(filename):
+        filename = f"{output_file}_{timestamp}_{counter}{extension}"
+        counter += 1
+    return filename
+
+
+def run_job(pools, db_config, job, batch_size=DEFAULT_EXPORT_BATCH_SIZE, catalog=None, timings=None):
+    # Streams the result straight from the cursor into the job's export format and, given a
+    # ResultsCatalog, records the file there. Returns (output filename, rows written).
+    # Fetching and writing interleave, so with timings they are one 'export' phase.
+    info = classify_query(job['query'])
+    if not info.read_only:
+        raise ValueError(f"This system is for read-only access. {info.reason}.")
+
+    export_format = job.get('format', 'csv')
+    extension = EXPORT_FORMATS[export_format].extension
+    watermark_column = job.get('watermark_column')
+    if watermark_column and info.statement_types != ['select']:
+        raise ValueError("Incremental jobs need a SELECT query to wrap with the watermark filter")
+    watermark = job.get('watermark')
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+
+    backend = pools.pool_for(db_config).backend
+    with pools.connection(db_config, timings=timings) as connection:
+        cursor = backend.streaming_cursor(connection)
+        with timed(timings, 'execute'):
+            if watermark_column and watermark is not None:
+                cursor.execute(incremental_query(job['query'], watermark_column, backend), (watermark,))
+            else:
+                cursor.execute(job['query'])
+
+        if not watermark_column:
+            # Generate unique filename
+            filename = timestamped_filename(job['output_file'], timestamp, extension)
+            with timed(timings, 'export'):
+                columns, rows_written = export_cursor(cursor, export_format, filename, batch_size)
+            cursor.close()
+            if catalog is not None:
+                catalog.record(filename, export_format, rows_written, columns, job=job,
+                               database=db_config['name'], query=job['query'])
+            return filename, rows_written
+
+        columns = [column[0] for column in cursor.description]
+        if watermark_column not in columns:
+            raise ValueError(f"Watermark column '{watermark_column}' is not in the query result")
+        key_index = columns.index(watermark_column)
+
+        # Incremental jobs append new rows to one rolling file; formats that can't be
+        # appended to (Parquet, Arrow) get one file per run holding just the new rows
+        if EXPORT_FORMATS[export_format].appendable:
+            filename = f"{job['output_file']}{extension}"
+        else:
+            filename = timestamped_filename(job['output_file'], timestamp, extension)
+        exporter = None
+        high_water_mark = None
+        rows_written = 0
+        try:
+            export_started = time.perf_counter()
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                if exporter is None:
+                    exporter = open_exporter(export_format, filename, columns, append=True)
+                exporter.write_rows(rows)
+                rows_written += len(rows)
+                batch_max = max((row[key_index] for row in rows if row[key_index] is not None), default=None)
+                if batch_max is not None and (high_water_mark is None or batch_max > high_water_mark):
+                    high_water_mark = batch_max
+        finally:
+            if exporter is not None:
+                exporter.close()
+            if timings is not None:
+                timings.add('export', time.perf_counter() - export_started)
+        cursor.close()
+
+    if exporter is not None and catalog is not None:
+        catalog.record(filename, export_format, rows_written, columns, job=job, database=db_config['name'],
+                       query=job['query'], range_start=watermark, range_end=high_water_mark,
+                       append=EXPORT_FORMATS[export_format].appendable)
+    if high_water_mark is not None:
+        job['watermark'] = watermark_value(high_water_mark)
+    return filename, rows_written
+
+
+def load_jobs(path=SCHEDULED_QUERIES_FILE, default_database=None):
+    try:
+        with open(path, 'r') as f:
+            jobs = json.load(f)
+    except FileNotFoundError:
+        return []
+
+    # Convert any float timestamps to strings and add missing keys
+    for job in jobs:
+        if isinstance(job['next_run'], float):
+            job['next_run'] = datetime.fromtimestamp(job['next_run']).isoformat()
+        if 'output_file' not in job:
+            job['output_file'] = 'default_output'
+        if 'database' not in job:
+            job['database'] = default_database or "No database available"
+        if 'id' not in job:
+            job['id'] = uuid.uuid4().hex
+    return jobs
+
+
+def save_jobs(jobs, path=SCHEDULED_QUERIES_FILE):
+    # Write to a temporary file first so a reader never sees a half-written file
+    temp_path = path + '.tmp'
+    with open(temp_path, 'w') as f:
+        json.dump(jobs, f)
+    os.replace(temp_path, path)
+
+
+def find_db_config(db_configs, name):
+    for db_config in db_configs:
+        if db_config['name'] == name:
+            return db_config
+    return None
+
+
+def next_run_after(job, now):
+    # Optional jitter spreads jobs with the same interval so they don't all hit the server at once
+    jitter = random.uniform(0, job.get('jitter', 0) or 0)
+    return (now + timedelta(seconds=job['interval'] + jitter)).isoformat()
+
+
+class JobScheduler:
+    def __init__(self, jobs, db_configs, pools, path=SCHEDULED_QUERIES_FILE, max_workers=2, check_interval=30,
+                 on_job_finished=None, catalog=None, history=None, metrics=None):
+        self.jobs = jobs
+        self.db_configs = db_configs
+        self.pools = pools
+        self.path = path
+        self.check_interval = check_interval
+        self.on_job_finished = on_job_finished
+        self.catalog = catalog
+        self.history = history
+        self.metrics = metrics  # a MetricsLog that gets one line per run
+        self.running = set()  # ids of jobs with a run in flight
+        self.queued_runs = {}  # job id -> runs waiting behind the one in flight
+        self.futures = {}  # job id -> future of its latest submitted run
+        self.lock = threading.RLock()
+        self.stop_event = threading.Event()
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='scheduled-job')
+        self.thread = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self.loop, name='scheduler', daemon=True)
+        self.thread.start()
+
+    def stop(self, wait=True):
+        self.stop_event.set()
+        self.executor.shutdown(wait=wait, cancel_futures=True)
+        with self.lock:
+            # Runs cancelled before they started never reach run(), which is what clears them
+            for job_id, future in self.futures.items():
+                if future.cancelled():
+                    self.running.discard(job_id)
+
+    def wait_until_idle(self, poll_interval=0.2):
+        while True:
+            with self.lock:
+                if not self.running:
+                    return
+            time.sleep(poll_interval)
+
+    def loop(self):
+        self.check_due()
+        while not self.stop_event.wait(self.check_interval):
+            self.check_due()
+
+    def save(self):
+        with self.lock:
+            save_jobs(self.jobs, self.path)
+
+    def add_job(self, job):
+        job.setdefault('id', uuid.uuid4().hex)
+        with self.lock:
+            self.jobs.append(job)
+            self.save()
+
+    def check_due(self, now=None):
+        now = now or datetime.now()
+        with self.lock:
+            for job in self.jobs:
+                next_run = datetime.fromisoformat(job['next_run'])
+                if now < next_run:
+                    continue
+                runs = self.due_runs(job, next_run, now)
+                job['next_run'] = next_run_after(job, now)
+                if runs == 0:
+                    job['last_status'] = 'skipped (missed run)'
+                elif job['id'] in self.running:
+                    if job.get('overlap', 'skip') == 'queue':
+                        self.queued_runs[job['id']] = self.queued_runs.get(job['id'], 0) + runs
+                    else:
+                        job['last_status'] = 'skipped (previous run still going)'
+                else:
+                    self.queued_runs[job['id']] = runs - 1
+                    self.submit(job)
+            self.save()
+
+    def due_runs(self, job, next_run, now):
+        # How many runs to start now, following the job's catch-up policy for missed intervals
+        missed = int((now - next_run).total_seconds() // job['interval']) + 1
+        policy = job.get('catch_up', 'run_once')
+        if policy == 'skip' and missed > 1:
+            return 0
+        if policy == 'run_all':
+            return missed
+        return 1
+
+    def submit(self, job):
+        if self.stop_event.is_set():
+            self.running.discard(job['id'])
+            return
+        self.running.add(job['id'])
+        try:
+            self.futures[job['id']] = self.executor.submit(self.run, job)
+        except RuntimeError:
+            # The executor was shut down between the check above and now
+            self.running.discard(job['id'])
+
+    def run(self, job):
+        started = time.monotonic()
+        filename = None
+        rows = 0
+        db_config = find_db_config(self.db_configs, job.get('database'))
+        note = ""
+        timings = QueryTimings('scheduled', job.get('database'), job['query'])
+        if db_config is None and self.db_configs:
+            db_config = self.db_configs[0]
+            note = f" (database '{job.get('database')}' not found, used '{db_config['name']}')"
+        try:
+            if db_config is None:
+                raise ValueError("No database configured")
+            filename, rows = run_job(self.pools, db_config, job, catalog=self.catalog, timings=timings)
+            status = 'ok' + note
+            if self.history is not None:
+                with timings.phase('history'):
+                    self.history.add(db_config['name'], job['query'], duration=time.monotonic() - started, rows=rows)
+        except Exception as error:
+            status = f"error: {error}"
+        if self.metrics is not None:
+            timings.finish('ok' if status.startswith('ok') else 'failed', rows,
+                           os.path.getsize(filename) if filename and os.path.exists(filename) else None)
+            self.metrics.write(timings)
+
+        with self.lock:
+            job['last_run'] = datetime.now().isoformat(timespec='seconds')
+            job['last_duration'] = round(time.monotonic() - started, 3)
+            job['last_status'] = status
+            job['last_rows'] = rows
+            if self.queued_runs.get(job['id'], 0) > 0:
+                self.queued_runs[job['id']] -= 1
+                self.submit(job)
+            else:
+                self.running.discard(job['id'])
+            self.save()
+
+        if self.on_job_finished is not None:
+            self.on_job_finished(job, status, filename)
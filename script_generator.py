@@ -0,0 +1,260 @@
+import re
+
+from connection_pool import connection_config_for
+from query_validation import TOKEN, tokenize, strip_comments
+
+OUTPUT_FORMATS = ('csv', 'parquet')
+DEFAULT_CHUNK_SIZE = 100000
+
+# Clauses that make it unsafe to splice a keyset predicate and our own ORDER BY/LIMIT into the query
+KEYSET_BLOCKERS = ('join', 'having', 'limit', 'union', 'distinct')
+KEYSET_BLOCKER_PAIRS = (('group', 'by'), ('order', 'by'), ('for', 'update'), ('(', 'select'))
+SINGLE_TABLE_SELECT = re.compile(r'^\s*select\s+.+?\s+from\s+`?(\w+)`?(?:\s+(?:as\s+)?(\w+))?\s*(?:where\s+(.*))?$',
+                                 re.IGNORECASE | re.DOTALL)
+
+
+def strip_query(query):
+    return strip_comments(query)
+
+
+def word_positions(query):
+    # (offset, lower-cased word) for each word outside strings, comments and quoted identifiers
+    position = 0
+    while position < len(query):
+        match = TOKEN.match(query, position)
+        position = max(match.end(), position + 1)
+        if match.lastgroup == 'word':
+            yield match.start(), match.group().lower()
+
+
+def keyset_blocked(query):
+    previous = None
+    for kind, text in tokenize(query):
+        if kind == 'word' and (text in KEYSET_BLOCKERS or (previous, text) in KEYSET_BLOCKER_PAIRS):
+            return True
+        previous = text
+    return False
+
+
+def query_table(query):
+    # The single table a plain SELECT reads from, or None for anything more complex
+    query = strip_query(query)
+    if keyset_blocked(query):
+        return None
+    match = SINGLE_TABLE_SELECT.match(query)
+    if not match or match.group(2) and match.group(2).lower() == 'where':
+        return None
+    return match.group(1)
+
+
+def selects_column(query, column):
+    # The select list has * or the plain column, so the column is in the result under its own name
+    tokens = tokenize(strip_query(query))
+    if not tokens or tokens[0] != ('word', 'select'):
+        return False
+    item = []
+    depth = 0
+    for kind, text in tokens[1:] + [('symbol', ',')]:
+        if kind == 'symbol' and text == '(':
+            depth += 1
+        elif kind == 'symbol' and text == ')':
+            depth -= 1
+        elif depth == 0 and (kind == 'symbol' and text == ',' or kind == 'word' and text == 'from'):
+            if len(item) == 3 and item[1] == ('symbol', '.'):
+                item = item[2:]  # t.column or t.*
+            if len(item) == 1 and (item[0] == ('symbol', '*') or item[0][1].strip('`').lower() == column.lower()):
+                return True
+            if text == 'from':
+                return False
+            item = []
+            continue
+        item.append((kind, text))
+    return False
+
+
+def primary_key_query(table):
+    return f"SHOW KEYS FROM `{table}` WHERE Key_name = 'PRIMARY'"
+
+
+def detect_primary_key(connection, query):
+    # Single-column primary key of the table a plain SELECT reads, or None (MySQL backends only)
+    table = query_table(query)
+    if table is None:
+        return None
+    cursor = connection.cursor()
+    cursor.execute(primary_key_query(table))
+    keys = cursor.fetchall()
+    columns = [column[0] for column in cursor.description]
+    cursor.close()
+    if len(keys) != 1:
+        return None  # no key, or a composite one
+    return keys[0][columns.index('Column_name')]
+
+
+def keyset_queries(query, key_column):
+    # Returns (first_page_sql, next_page_sql) or None when the query can't be paged by key.
+    # Both take %s parameters, so literal percent signs in the user's SQL are escaped.
+    query = strip_query(query)
+    if query_table(query) is None:
+        return None
+    where = next((offset for offset, word in word_positions(query) if word == 'where'), None)
+    key = f"`{key_column}`"
+    if where is not None:
+        base = query[:where].rstrip().replace('%', '%%')
+        condition = query[where + len('where'):].strip().replace('%', '%%')
+        first_page = f"{base}\nWHERE ({condition})"
+        next_page = f"{base}\nWHERE ({condition}) AND {key} > %s"
+    else:
+        first_page = query.replace('%', '%%')
+        next_page = f"{first_page}\nWHERE {key} > %s"
+    order = f"\nORDER BY {key} LIMIT %s"
+    return first_page + order, next_page + order
+
+
+def format_config(connection_config):
+    lines = ["connection_config = {"]
+    for key, value in connection_config.items():
+        lines.append(f"    {key!r}: {value!r},")
+    lines.append("}")
+    return "\n".join(lines)
+
+
+def writer_code(output_format):
+    if output_format == 'parquet':
+        return '''import pyarrow as pa
+import pyarrow.parquet as pq
+
+
+class ChunkWriter:
+    # Appends each chunk as a row group; the schema is taken from the first chunk
+    def __init__(self, path, columns):
+        self.path = path
+        self.columns = columns
+        self.writer = None
+
+    def write(self, rows):
+        table = pa.Table.from_pylist([dict(zip(self.columns, row)) for row in rows])
+        if self.writer is None:
+            self.writer = pq.ParquetWriter(self.path, table.schema)
+        else:
+            table = table.cast(self.writer.schema)
+        self.writer.write_table(table)
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+'''
+    return '''import csv
+
+
+class ChunkWriter:
+    def __init__(self, path, columns):
+        self.file = open(path, 'w', newline='')
+        self.writer = csv.writer(self.file)
+        self.writer.writerow(columns)
+
+    def write(self, rows):
+        self.writer.writerows(rows)
+
+    def close(self):
+        self.file.close()
+'''
+
+
+def build_script(db_config, query, key_column=None, output_format='csv', output_file=None,
+                 chunk_size=DEFAULT_CHUNK_SIZE):
+    output_file = output_file or f"query_results.{output_format}"
+    pages = keyset_queries(query, key_column) if key_column else None
+
+    header = f'''import time
+import mysql.connector
+{writer_code(output_format)}
+# Database connection details
+{format_config(connection_config_for(db_config))}
+
+CHUNK_SIZE = {chunk_size}
+OUTPUT_FILE = {output_file!r}
+'''
+
+    if pages:
+        first_page, next_page = pages
+        body = f'''
+# Keyset pagination: each chunk continues after the last {key_column!r} seen, so the
+# server never rescans skipped rows. The key column must be unique.
+KEY_COLUMN = {key_column!r}
+
+first_page_sql = {first_page!r}
+
+next_page_sql = {next_page!r}
+
+connection = mysql.connector.connect(**connection_config)
+cursor = connection.cursor()
+
+started = time.monotonic()
+writer = None
+last_key = None
+total_rows = 0
+
+while True:
+    if last_key is None:
+        cursor.execute(first_page_sql, (CHUNK_SIZE,))
+    else:
+        cursor.execute(next_page_sql, (last_key, CHUNK_SIZE))
+    rows = cursor.fetchall()
+    if not rows:
+        break
+
+    if writer is None:
+        columns = [col[0] for col in cursor.description]
+        if KEY_COLUMN not in columns:
+            raise SystemExit(f"The query must select the key column {{KEY_COLUMN!r}}")
+        key_index = columns.index(KEY_COLUMN)
+        writer = ChunkWriter(OUTPUT_FILE, columns)
+
+    # Write the chunk straight to the output instead of keeping it in memory
+    writer.write(rows)
+    total_rows += len(rows)
+    last_key = rows[-1][key_index]
+    print(f"{{total_rows}} rows written ({{time.monotonic() - started:.1f}}s)")
+
+    if len(rows) < CHUNK_SIZE:
+        break
+'''
+    else:
+        reason = ("# Single streaming cursor: rows are read from one unbuffered result in chunks."
+                  if not key_column else
+                  "# The query has joins, grouping, ordering or a LIMIT, so it can't be paged by key;\n"
+                  "# read it through a single streaming cursor instead.")
+        body = f'''
+{reason}
+sql = {strip_query(query)!r}
+
+connection = mysql.connector.connect(**connection_config)
+cursor = connection.cursor(buffered=False)
+cursor.execute(sql)
+
+started = time.monotonic()
+columns = [col[0] for col in cursor.description]
+writer = ChunkWriter(OUTPUT_FILE, columns)
+total_rows = 0
+
+while True:
+    rows = cursor.fetchmany(CHUNK_SIZE)
+    if not rows:
+        break
+    writer.write(rows)
+    total_rows += len(rows)
+    print(f"{{total_rows}} rows written ({{time.monotonic() - started:.1f}}s)")
+'''
+
+    footer = '''
+if writer is not None:
+    writer.close()
+
+# Close the cursor and the database connection
+cursor.close()
+connection.close()
+
+print(f"Saved {total_rows} rows to {OUTPUT_FILE}")
+'''
+    return header + body + footer
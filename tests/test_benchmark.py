@@ -0,0 +1,70 @@
+import json
+import sqlite3
+
+import pytest
+
+import benchmark
+from benchmark import compare, label, load_frame, seed_database, seeded_config, summarize, SEEDED_QUERY
+
+
+def entry(stage, rows, p50, database='benchmark', rss=100.0):
+    return {'stage': stage, 'database': database, 'rows': rows, 'latency': {'p50': p50}, 'peak_rss_mb': rss}
+
+
+def test_summarize():
+    result = summarize('fetch', 'benchmark', 1000, [0.4, 0.1, 0.2, 0.3, 0.5], {'execute': 0.01}, 512 * 1024 * 1024)
+    assert result['repeat'] == 5
+    assert result['latency']['min'] == 0.1
+    assert result['latency']['p50'] == 0.3
+    assert result['latency']['max'] == 0.5
+    assert result['latency']['p90'] == pytest.approx(0.46)
+    assert result['rows_per_second'] == pytest.approx(1000 / 0.3)
+    assert result['peak_rss_mb'] == 512.0
+    assert result['phases'] == {'execute': 0.01}
+    json.dumps(result)
+
+
+def test_summarize_instant_run_has_no_rate():
+    assert summarize('fetch', 'benchmark', 10, [0.0], {}, 0)['rows_per_second'] is None
+
+
+def test_compare_matches_stage_database_and_rows(tmp_path, capsys):
+    baseline = str(tmp_path / 'baseline.json')
+    with open(baseline, 'w') as f:
+        json.dump({'results': [entry('fetch', 1000, 0.2), entry('fetch', 1000, 0.5, 'reports'),
+                               entry('export', 1000, 0.0)]}, f)
+    compare([entry('fetch', 1000, 0.1), entry('fetch', 1000, 1.0, 'reports'), entry('fetch', 5000, 1.0),
+             entry('export', 1000, 0.1)], baseline)
+    lines = capsys.readouterr().err.splitlines()
+    assert len(lines) == 3
+    assert lines[0].split()[0] == 'fetch' and '(0.50x)' in lines[0]
+    assert lines[1].split()[0] == 'fetch[reports]' and '(2.00x)' in lines[1]
+    assert '(infx)' in lines[2]
+
+
+def test_label():
+    assert label('fetch', 'benchmark') == 'fetch'
+    assert label('fetch', 'reports') == 'fetch[reports]'
+
+
+def test_seeding_is_deterministic_and_only_adds_missing_rows(tmp_path, monkeypatch):
+    monkeypatch.setattr(benchmark, 'SEED_CHUNK', 32)
+    first, second = str(tmp_path / 'a.db'), str(tmp_path / 'b.db')
+    seed_database(first, 50)
+    seed_database(first, 120)
+    seed_database(second, 120)
+    rows = []
+    for path in (first, second):
+        with sqlite3.connect(path) as db:
+            rows.append(db.execute(SEEDED_QUERY).fetchall())
+        db.close()
+    assert len(rows[0]) == 120
+    assert rows[0] == rows[1]
+
+
+def test_load_frame_reads_the_limited_query(tmp_path):
+    path = str(tmp_path / 'cta_report.db')
+    seed_database(path, 100)
+    df = load_frame((seeded_config(path), SEEDED_QUERY), 40)
+    assert len(df) == 40
+    assert df['id'].tolist() == list(range(40))
@@ -0,0 +1,184 @@
+import sqlite3
+import threading
+import time
+
+import pytest
+
+from connection_pool import ConnectionPool, ConnectionPools, PoolTimeoutError, MAX_PREPARED_STATEMENTS
+from db_backends import BACKENDS
+
+
+class FakeConnection:
+    def __init__(self, number):
+        self.number = number
+        self.closed = False
+        self.dropped = False
+        self.cursors = []
+
+    def cursor(self):
+        cursor = FakeCursor()
+        self.cursors.append(cursor)
+        return cursor
+
+    def close(self):
+        self.closed = True
+
+
+class FakeCursor:
+    closed = False
+
+    def execute(self, query, params):
+        self.executed = (query, params)
+
+    def close(self):
+        self.closed = True
+
+
+class FakeBackend:
+    def __init__(self):
+        self.opened = []
+
+    def connect(self, connection_config):
+        connection = FakeConnection(len(self.opened))
+        self.opened.append(connection)
+        return connection
+
+    def prepared_cursor(self, connection):
+        return connection.cursor()
+
+    def ping(self, connection):
+        if connection.dropped:
+            raise sqlite3.OperationalError("server has gone away")
+
+    def reconnect(self, connection):
+        connection.dropped = False
+
+
+@pytest.fixture
+def backend():
+    return FakeBackend()
+
+
+def test_released_connections_are_reused(backend):
+    pool = ConnectionPool({}, size=2, backend=backend)
+    first = pool.acquire()
+    pool.release(first)
+    assert pool.acquire() is first
+    second = pool.acquire()
+    assert second is not first
+    assert pool.stats()['hits'] == 1
+    assert pool.stats()['misses'] == 2
+    assert pool.stats()['open'] == 2
+
+
+def test_acquire_waits_for_a_free_slot(backend):
+    pool = ConnectionPool({}, size=1, backend=backend)
+    connection = pool.acquire()
+    with pytest.raises(PoolTimeoutError):
+        pool.acquire(timeout=0.05)
+
+    threading.Timer(0.05, pool.release, (connection,)).start()
+    assert pool.acquire(timeout=5) is connection
+    assert len(backend.opened) == 1
+
+
+def test_discarded_connection_frees_its_slot(backend):
+    pool = ConnectionPool({}, size=1, backend=backend)
+    connection = pool.acquire()
+    pool.release(connection, discard=True)
+    assert connection.closed
+    assert pool.acquire(timeout=0.05) is not connection
+    assert pool.stats()['open'] == 1
+
+
+def test_idle_connections_expire(backend):
+    pool = ConnectionPool({}, size=1, idle_timeout=0.05, backend=backend)
+    stale = pool.acquire()
+    pool.release(stale)
+    time.sleep(0.1)
+    fresh = pool.acquire(timeout=0.05)
+    assert stale.closed
+    assert fresh is not stale
+    assert pool.stats()['open'] == 1
+
+
+def test_expired_connections_are_closed_outside_the_lock(backend):
+    pool = ConnectionPool({}, size=2, idle_timeout=0.05, backend=backend)
+    stale = pool.acquire()
+    pool.release(stale)
+    held_lock = []
+    stale.close = lambda: held_lock.append(pool.condition._is_owned())
+    time.sleep(0.1)
+    pool.acquire()
+    assert held_lock == [False]
+
+
+def test_dropped_connection_is_reconnected_on_checkout(backend):
+    pool = ConnectionPool({}, size=1, ping_interval=0, backend=backend)
+    connection = pool.acquire()
+    pool.prepared(connection, "SELECT 1")
+    pool.release(connection)
+    connection.dropped = True
+    time.sleep(0.01)
+    assert pool.acquire() is connection
+    assert not connection.dropped
+    assert pool.stats()['reconnects'] == 1
+    assert id(connection) not in pool.statements
+
+
+def test_prepared_statements_are_kept_per_connection(backend):
+    pool = ConnectionPool({}, backend=backend)
+    connection = pool.acquire()
+    statement = pool.prepared(connection, "SELECT 0")
+    assert pool.prepared(connection, "SELECT 0") is statement
+
+    for i in range(1, MAX_PREPARED_STATEMENTS + 1):
+        pool.prepared(connection, f"SELECT {i}")
+    assert "SELECT 0" not in pool.statements[id(connection)]
+    assert statement.cursor.closed
+    assert len(pool.statements[id(connection)]) == MAX_PREPARED_STATEMENTS
+    assert pool.stats()['prepared_hits'] == 1
+    assert pool.stats()['prepared_misses'] == MAX_PREPARED_STATEMENTS + 1
+
+
+def test_least_recently_used_statement_is_evicted(backend):
+    pool = ConnectionPool({}, backend=backend)
+    connection = pool.acquire()
+    for i in range(MAX_PREPARED_STATEMENTS):
+        pool.prepared(connection, f"SELECT {i}")
+    pool.prepared(connection, "SELECT 0")
+    pool.prepared(connection, "SELECT new")
+    statements = pool.statements[id(connection)]
+    assert "SELECT 0" in statements
+    assert "SELECT 1" not in statements
+
+
+def test_pools_run_queries_on_sqlite(tmp_path):
+    path = str(tmp_path / 'local.db')
+    with sqlite3.connect(path) as connection:
+        connection.execute("CREATE TABLE t (id INTEGER)")
+        connection.executemany("INSERT INTO t VALUES (?)", [(1,), (2,)])
+    pools = ConnectionPools()
+    db_config = {'name': 'local', 'type': 'sqlite', 'database': path, 'pool_size': 1}
+    with pools.connection(db_config) as connection:
+        statement = pools.pool_for(db_config).prepared(connection, "SELECT COUNT(*) FROM t WHERE id > ?")
+        assert statement.execute((1,)).fetchall() == [(1,)]
+    with pools.connection(db_config) as again:
+        assert again is connection
+    assert pools.pool_for(db_config).backend is BACKENDS['sqlite']
+
+    with pytest.raises(sqlite3.OperationalError):
+        with pools.connection(db_config) as connection:
+            connection.execute("INSERT INTO t VALUES (3)")
+    assert pools.stats()['local']['open'] == 0
+    pools.close_all()
+    assert pools.stats() == {}
+
+
+def test_edited_entry_gets_a_new_pool(tmp_path):
+    pools = ConnectionPools()
+    db_config = {'name': 'local', 'type': 'sqlite', 'database': str(tmp_path / 'a.db')}
+    pool = pools.pool_for(db_config)
+    assert pools.pool_for(dict(db_config)) is pool
+    assert pools.pool_for(dict(db_config, database=str(tmp_path / 'b.db'))) is not pool
+    assert pool.closed
@@ -0,0 +1,99 @@
+import sqlite3
+from datetime import date, datetime
+
+import mysql.connector
+import pytest
+
+from db_backends import BACKENDS, PreparedStatement, available_backends, backend_for, pymysql
+
+try:
+    import duckdb
+except ImportError:
+    duckdb = None
+
+needs_duckdb = pytest.mark.skipif(duckdb is None, reason="duckdb is not installed")
+
+
+@pytest.fixture
+def sqlite_path(tmp_path):
+    path = str(tmp_path / 'extract.db')
+    with sqlite3.connect(path) as connection:
+        connection.execute("CREATE TABLE t (id INTEGER, day TEXT)")
+        connection.executemany("INSERT INTO t VALUES (?, ?)", [(1, '2024-01-01'), (2, '2024-01-02')])
+    connection.close()
+    return path
+
+
+@pytest.mark.parametrize('name, module', [('mysql', mysql.connector), ('pymysql', pymysql)])
+def test_mysql_connections_always_autocommit(monkeypatch, name, module):
+    if module is None:
+        pytest.skip(f"{name} is not installed")
+    calls = []
+    monkeypatch.setattr(module, 'connect', lambda **config: calls.append(config))
+    BACKENDS[name].connect({'host': 'db', 'autocommit': False})
+    BACKENDS[name].connect({'host': 'db'})
+    assert calls == [{'host': 'db', 'autocommit': True}] * 2
+
+
+def test_sqlite_opens_the_file_read_only(sqlite_path):
+    backend = BACKENDS['sqlite']
+    connection = backend.connect({'database': sqlite_path})
+    assert connection.execute("SELECT COUNT(*) FROM t").fetchone() == (2,)
+    with pytest.raises(sqlite3.OperationalError):
+        connection.execute("DELETE FROM t")
+    connection.close()
+
+
+def test_sqlite_path_with_uri_characters(tmp_path):
+    path = str(tmp_path / 'a ?#b.db')
+    sqlite3.connect(path).close()
+    BACKENDS['sqlite'].connect({'database': path}).close()
+
+
+def test_sqlite_adapts_dates_to_iso_text():
+    backend = BACKENDS['sqlite']
+    assert backend.adapt(date(2024, 1, 2)) == '2024-01-02'
+    assert backend.adapt(datetime(2024, 1, 2, 3, 4, 5)) == '2024-01-02 03:04:05'
+    assert backend.adapt(5) == 5
+
+
+def test_quoting():
+    assert BACKENDS['sqlite'].quote_identifier('a"b') == '"a""b"'
+    assert BACKENDS['sqlite'].quote_literal("it's") == "'it''s'"
+    assert BACKENDS['mysql'].quote_identifier('a`b') == '`a``b`'
+    assert BACKENDS['mysql'].quote_literal("it's \\") == "'it''s \\\\'"
+
+
+def test_prepared_statement_runs_again_with_new_values(sqlite_path):
+    backend = BACKENDS['sqlite']
+    connection = backend.connect({'database': sqlite_path})
+    statement = PreparedStatement(backend, connection, "SELECT id FROM t WHERE day >= ? ORDER BY id")
+    assert statement.execute((backend.adapt(date(2024, 1, 1)),)).fetchall() == [(1,), (2,)]
+    assert statement.execute((backend.adapt(date(2024, 1, 2)),)).fetchall() == [(2,)]
+    statement.close()
+    with pytest.raises(sqlite3.ProgrammingError):
+        statement.execute(('2024-01-01',))
+    connection.close()
+
+
+@needs_duckdb
+def test_duckdb_opens_the_file_read_only(tmp_path):
+    path = str(tmp_path / 'extract.duckdb')
+    with duckdb.connect(path) as connection:
+        connection.execute("CREATE TABLE t (id INTEGER, day DATE)")
+        connection.execute("INSERT INTO t VALUES (1, DATE '2024-01-01'), (2, DATE '2024-01-02')")
+    backend = BACKENDS['duckdb']
+    connection = backend.connect({'database': path})
+    statement = PreparedStatement(backend, connection, "SELECT id FROM t WHERE day >= ?")
+    assert statement.execute((backend.adapt(date(2024, 1, 2)),)).fetchall() == [(2,)]
+    with pytest.raises(duckdb.Error):
+        connection.execute("DELETE FROM t")
+    connection.close()
+
+
+def test_backend_for():
+    assert backend_for({'name': 'x'}) is BACKENDS['mysql']
+    assert backend_for({'name': 'x', 'type': 'sqlite'}) is BACKENDS['sqlite']
+    with pytest.raises(ValueError):
+        backend_for({'name': 'x', 'type': 'oracle'})
+    assert 'sqlite' in available_backends()
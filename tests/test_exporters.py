@@ -0,0 +1,120 @@
+import sqlite3
+
+import pandas as pd
+import pytest
+
+try:
+    import pyarrow as pa
+    import pyarrow.ipc
+    import pyarrow.parquet
+except ImportError:
+    pa = None
+
+from exporters import (EXPORT_FORMATS, ArrowExporter, ExportError, available_formats, export_cursor, export_frame,
+                       format_for_path, open_exporter)
+
+ROWS = [(1, 'a', 1.5), (2, None, None), (3, 'c,"d"', 2.0)]
+COLUMNS = ['id', 'name', 'score']
+needs_pyarrow = pytest.mark.skipif(pa is None, reason="needs pyarrow")
+
+
+def read_back(export_format, path):
+    if export_format == 'parquet':
+        return pyarrow.parquet.read_table(path).to_pandas()
+    if export_format == 'arrow':
+        with pa.memory_map(path) as source:
+            return pyarrow.ipc.open_file(source).read_all().to_pandas()
+    return pd.read_csv(path, compression='infer')
+
+
+@pytest.mark.parametrize('export_format', available_formats())
+def test_rows_round_trip(tmp_path, export_format):
+    path = str(tmp_path / 'out') + EXPORT_FORMATS[export_format].extension
+    with open_exporter(export_format, path, COLUMNS) as exporter:
+        exporter.write_rows(ROWS[:2])
+        exporter.write_rows(ROWS[2:])
+    assert exporter.rows_written == 3
+    df = read_back(export_format, path)
+    assert df.columns.tolist() == COLUMNS
+    assert df['id'].tolist() == [1, 2, 3]
+    assert df['name'].fillna('').tolist() == ['a', '', 'c,"d"']
+
+
+@pytest.mark.parametrize('export_format', ['csv', pytest.param('parquet', marks=needs_pyarrow),
+                                           pytest.param('arrow', marks=needs_pyarrow)])
+def test_frame_round_trip(tmp_path, export_format):
+    path = str(tmp_path / f'out.{export_format}')
+    df = pd.DataFrame({'id': [1, 2], 'mixed': [1, 'x']})
+    assert export_frame(df, export_format, path) == 2
+    back = read_back(export_format, path)
+    assert back['id'].tolist() == [1, 2]
+    assert back['mixed'].astype(str).tolist() == ['1', 'x']
+
+
+@pytest.mark.parametrize('export_format', ['csv', 'csv.gz'])
+def test_csv_append_writes_one_header(tmp_path, export_format):
+    path = str(tmp_path / 'out.csv') + ('.gz' if export_format == 'csv.gz' else '')
+    for rows in (ROWS[:1], ROWS[1:]):
+        with open_exporter(export_format, path, COLUMNS, append=True) as exporter:
+            exporter.write_rows(rows)
+    assert read_back(export_format, path)['id'].tolist() == [1, 2, 3]
+
+
+@needs_pyarrow
+def test_empty_arrow_export_keeps_the_columns(tmp_path):
+    path = str(tmp_path / 'out.parquet')
+    open_exporter('parquet', path, COLUMNS).close()
+    assert pyarrow.parquet.read_table(path).column_names == COLUMNS
+
+
+@needs_pyarrow
+def test_failed_arrow_export_raises_the_original_error(tmp_path):
+    exporter = open_exporter('arrow', str(tmp_path / 'missing' / 'out.arrow'), COLUMNS)
+    with pytest.raises(OSError):
+        exporter.close()
+
+
+@needs_pyarrow
+def test_arrow_file_is_closed_when_the_writer_fails(tmp_path, monkeypatch):
+    exporter = open_exporter('arrow', str(tmp_path / 'out.arrow'), COLUMNS)
+    exporter.write_rows(ROWS)
+
+    def fail():
+        raise OSError("disk full")
+    monkeypatch.setattr(exporter.writer, 'close', fail, raising=False)
+    with pytest.raises(OSError, match="disk full"):
+        exporter.close()
+    assert exporter.sink.closed
+
+
+@needs_pyarrow
+def test_mixed_first_batch_becomes_text():
+    assert ArrowExporter.to_array((1, 'x'), None).type == pa.string()
+    assert ArrowExporter.to_array((None, None), None).type == pa.string()
+
+
+@needs_pyarrow
+def test_later_batch_is_parsed_as_the_column_type():
+    assert ArrowExporter.to_array(('1', 2), pa.int64()).to_pylist() == [1, 2]
+    with pytest.raises(ExportError, match="Column 'n' changed type"):
+        ArrowExporter.to_array((1, '1.5'), pa.int64(), 'n')
+
+
+def test_export_cursor_streams_every_row(tmp_path):
+    connection = sqlite3.connect(':memory:')
+    cursor = connection.execute("WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n WHERE i < 25) "
+                                "SELECT i FROM n")
+    path = str(tmp_path / 'out.csv')
+    assert export_cursor(cursor, 'csv', path, batch_size=10) == (['i'], 25)
+    assert pd.read_csv(path)['i'].tolist() == list(range(1, 26))
+
+
+def test_format_for_path():
+    assert format_for_path('a.csv.gz') == 'csv.gz'
+    assert format_for_path('a.parquet') == 'parquet'
+    assert format_for_path('a.txt') == 'csv'
+
+
+def test_unknown_format_is_an_export_error(tmp_path):
+    with pytest.raises(ExportError):
+        open_exporter('xlsx', str(tmp_path / 'a.xlsx'), COLUMNS)
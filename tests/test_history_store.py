@@ -0,0 +1,137 @@
+import sqlite3
+import threading
+from datetime import date
+
+import pytest
+
+from db_backends import BACKENDS
+from history_store import HistoryStore, fingerprint
+from query_templates import QueryTemplate
+from query_validation import is_read_only_query
+
+START, END = '2000-01-01 00:00:00', '2999-12-31 23:59:59'
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = HistoryStore(str(tmp_path / 'history.db'))
+    yield store
+    store.close()
+
+
+def test_fingerprint_ignores_literals_and_comments():
+    assert fingerprint("SELECT * FROM t WHERE id = 5 AND s = 'x' -- note") == \
+        fingerprint("select *  from t where id = 7 and s = 'y';")
+    assert fingerprint("SELECT * FROM t WHERE id IN (1, 2, 3)") == fingerprint("SELECT * FROM t WHERE id IN (4)")
+    assert fingerprint("SELECT * FROM t1") != fingerprint("SELECT * FROM t2")
+
+
+def test_fingerprint_keeps_bound_values_apart():
+    assert fingerprint("SELECT ?", (1,)) != fingerprint("SELECT ?", (2,))
+
+
+def test_repeated_runs_fold_into_one_row(store):
+    store.add('db', "SELECT * FROM t WHERE id = 1", duration=1.0, rows=10)
+    store.add('db', "SELECT * FROM t WHERE id = 2", duration=2.0, rows=5)
+    store.add('other', "SELECT * FROM t WHERE id = 3", duration=4.0)
+    store.flush()
+    rows = store.search(START, END)
+    assert [(row[2], row[3], row[4], row[5]) for row in rows] == [
+        ('other', "SELECT * FROM t WHERE id = 3", 1, 4.0),
+        ('db', "SELECT * FROM t WHERE id = 2", 2, 3.0),
+    ]
+    assert len(store.runs(rows[1][6], 'db')) == 2
+
+
+def test_template_run_can_be_reused(store):
+    template = QueryTemplate('t', "SELECT n FROM t WHERE day BETWEEN :start AND :end AND label <> :label",
+                             [{'name': 'start', 'type': 'datetime', 'source': 'start_date'},
+                              {'name': 'end', 'type': 'datetime', 'source': 'end_date'},
+                              {'name': 'label'}])
+    values = {'start': date(2024, 1, 2), 'end': date(2024, 1, 3), 'label': "it's"}
+    store.add('db', template.literal_query(values, BACKENDS['sqlite']))
+    store.flush()
+    reused = store.search(START, END)[0][3]
+
+    connection = sqlite3.connect(':memory:')
+    connection.execute("CREATE TABLE t (n INTEGER, day TEXT, label TEXT)")
+    connection.executemany("INSERT INTO t VALUES (?, ?, ?)",
+                           [(day, f"2024-01-0{day} 12:00:00", "it's" if day == 3 else 'x') for day in range(1, 5)])
+    assert is_read_only_query(reused)
+    assert connection.execute(reused).fetchall() == \
+        connection.execute(*template.bind(values, BACKENDS['sqlite'])).fetchall() == [(2,)]
+
+
+@pytest.mark.parametrize('sort', ['newest', 'frequent', 'expensive'])
+def test_pages_cover_every_row_once(store, sort):
+    for i in range(23):
+        for _ in range(i % 4 + 1):
+            store.add('db', f"SELECT {i} FROM t{i}", duration=float(i % 5))
+    store.flush()
+    seen = []
+    before = None
+    while True:
+        page = store.search(START, END, sort=sort, before=before, limit=5)
+        if not page:
+            break
+        seen.extend(row[0] for row in page)
+        before = store.page_key(page[-1], sort)
+    assert len(seen) == len(set(seen)) == 23
+    assert seen == [row[0] for row in store.search(START, END, sort=sort, limit=100)]
+
+
+def test_search_and_count(store):
+    for i in range(12):
+        store.add('db' if i % 2 else 'other', f"SELECT * FROM orders_{i}")
+    store.add('db', "SELECT * FROM customers")
+    store.flush()
+    assert len(store.search(START, END, search_term='orders')) == 12
+    assert len(store.search(START, END, search_term='orders', database='db')) == 6
+    assert store.count(START, END, search_term='cust') == (1, True)
+    assert store.databases() == ['db', 'other']
+
+
+def test_history_uses_wal(store):
+    assert store.db.execute("PRAGMA journal_mode").fetchone()[0] == 'wal'
+
+
+def test_writes_from_many_threads_all_land(store):
+    def log_runs(database):
+        for i in range(50):
+            store.add(database, f"SELECT * FROM t WHERE id = {i}", duration=0.5, rows=1)
+    threads = [threading.Thread(target=log_runs, args=(f"db{n}",)) for n in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    store.flush()
+    rows = store.search(START, END)
+    assert sorted((row[2], row[4]) for row in rows) == [(f"db{n}", 50) for n in range(4)]
+
+
+def test_close_writes_what_is_queued(tmp_path):
+    path = str(tmp_path / 'history.db')
+    store = HistoryStore(path)
+    store.add('db', "SELECT 1")
+    store.close()
+    store.add('db', "SELECT 2")  # ignored once closed
+
+    store = HistoryStore(path)
+    assert [row[3] for row in store.search(START, END)] == ["SELECT 1"]
+    store.close()
+
+
+def test_two_stores_on_one_file_keep_every_run(tmp_path):
+    # The GUI and the headless scheduler log to the same file from separate connections
+    path = str(tmp_path / 'history.db')
+    stores = [HistoryStore(path), HistoryStore(path)]
+    for i in range(30):
+        for store in stores:
+            store.add('db', "SELECT * FROM t WHERE id = 1", duration=1.0)
+    for store in stores:
+        store.flush()
+    [row] = stores[0].search(START, END)
+    assert row[4] == 60
+    assert len(stores[0].runs(row[6], 'db')) == 60
+    for store in stores:
+        store.close()
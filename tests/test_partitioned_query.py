@@ -0,0 +1,84 @@
+import sqlite3
+from datetime import date
+
+import pytest
+
+from connection_pool import ConnectionPools
+from partitioned_query import PartitionedQuery, find_date_range, partition_ranges
+
+QUERY = "SELECT day, n FROM events WHERE day BETWEEN '2024-01-01 00:00:00' AND '2024-01-10 23:59:59.999999' ORDER BY day"
+
+
+def test_find_date_range():
+    assert find_date_range(QUERY) == (date(2024, 1, 1), date(2024, 1, 10))
+    assert find_date_range("SELECT * FROM t WHERE d between '2024-03-01' and '2024-03-02'") == \
+        (date(2024, 3, 1), date(2024, 3, 2))
+    assert find_date_range("SELECT * FROM t WHERE d BETWEEN ? AND ?") is None
+
+
+def test_partition_ranges_cover_the_range_once():
+    assert partition_ranges(date(2024, 1, 1), date(2024, 1, 3)) == [
+        (date(2024, 1, 1), date(2024, 1, 1)), (date(2024, 1, 2), date(2024, 1, 2)),
+        (date(2024, 1, 3), date(2024, 1, 3))]
+    assert partition_ranges(date(2024, 1, 1), date(2024, 1, 10), 'week') == [
+        (date(2024, 1, 1), date(2024, 1, 7)), (date(2024, 1, 8), date(2024, 1, 10))]
+
+
+def test_partition_queries_replace_only_the_range():
+    partitions = PartitionedQuery(None, {}, QUERY, unit='week').partitions
+    assert [partition.label() for partition in partitions] == ['2024-01-01 - 2024-01-07', '2024-01-08 - 2024-01-10']
+    assert partitions[0].query == ("SELECT day, n FROM events WHERE day BETWEEN '2024-01-01 00:00:00' "
+                                   "AND '2024-01-07 23:59:59.999999' ORDER BY day")
+    assert partitions[1].query == ("SELECT day, n FROM events WHERE day BETWEEN '2024-01-08' "
+                                   "AND '2024-01-10 23:59:59.999999' ORDER BY day")
+
+
+def test_query_without_a_range_is_rejected():
+    with pytest.raises(ValueError):
+        PartitionedQuery(None, {}, "SELECT * FROM events")
+
+
+def events_db(tmp_path):
+    path = str(tmp_path / 'events.db')
+    connection = sqlite3.connect(path)
+    connection.execute("CREATE TABLE events (day TEXT, n INTEGER)")
+    connection.executemany("INSERT INTO events VALUES (?, ?)",
+                           [(f"2024-01-{day:02d} {hour:02d}:00:00", day * 100 + hour)
+                            for day in range(1, 16) for hour in (0, 12)])
+    connection.commit()
+    connection.close()
+    return {'name': 'events', 'type': 'sqlite', 'database': path}
+
+
+def run_partitioned(db_config, query, **options):
+    pools = ConnectionPools()
+    partitioned = PartitionedQuery(pools, db_config, query, **options)
+    try:
+        assert partitioned.run()
+    finally:
+        pools.close_all()
+    return partitioned
+
+
+def run_whole(db_config, query):
+    connection = sqlite3.connect(db_config['database'])
+    rows = [row[1] for row in connection.execute(query)]
+    connection.close()
+    return rows
+
+
+def test_partitions_run_and_merge_in_date_order(tmp_path):
+    db_config = events_db(tmp_path)
+    partitioned = run_partitioned(db_config, QUERY, parallelism=3)
+    assert len(partitioned.partitions) == 10
+    assert partitioned.to_dataframe()['n'].tolist() == run_whole(db_config, QUERY)
+
+
+@pytest.mark.parametrize('unit', ['day', 'week'])
+def test_date_only_bounds_return_the_same_rows(tmp_path, unit):
+    db_config = events_db(tmp_path)
+    query = "SELECT day, n FROM events WHERE day BETWEEN '2024-01-02' AND '2024-01-09' ORDER BY day"
+    partitioned = run_partitioned(db_config, query, unit=unit)
+    assert "BETWEEN '2024-01-02' AND '2024-01-0" in partitioned.partitions[0].query
+    assert "BETWEEN '2024-01-09' AND '2024-01-09'" in partitioned.partitions[-1].query
+    assert partitioned.to_dataframe()['n'].tolist() == run_whole(db_config, query)
@@ -0,0 +1,81 @@
+import json
+import threading
+
+from history_store import fingerprint
+from query_metrics import MetricsLog, QueryTimings, format_seconds, timed
+
+
+def test_phases_accumulate_and_print_in_order():
+    timings = QueryTimings('interactive', 'db', "SELECT 1")
+    timings.add('fetch', 0.25)
+    timings.add('execute', 0.5)
+    timings.add('fetch', 0.25)
+    timings.add('custom', 2)
+    with timings.phase('render'):
+        pass
+    assert timings.phases['fetch'] == 0.5
+    assert timings.summary().startswith("execute 500 ms · fetch 500 ms · render ")
+    assert timings.summary().endswith(" · custom 2.00 s")
+
+
+def test_record_is_one_json_object():
+    timings = QueryTimings('scheduled', 'db', "SELECT * FROM t WHERE id = 5")
+    timings.add('execute', 0.1234567)
+    timings.finish('ok', rows=10, bytes_fetched=2048)
+    record = json.loads(json.dumps(timings.record()))
+    assert record['kind'] == 'scheduled'
+    assert record['database'] == 'db'
+    assert record['fingerprint'] == fingerprint("SELECT * FROM t WHERE id = 7")
+    assert (record['status'], record['rows'], record['bytes']) == ('ok', 10, 2048)
+    assert record['phases'] == {'execute': 0.123457}
+    assert record['total'] >= 0
+
+
+def test_template_runs_keep_their_values_apart():
+    assert QueryTimings('x', query="SELECT ?", params=(1,)).fingerprint != \
+        QueryTimings('x', query="SELECT ?", params=(2,)).fingerprint
+
+
+def test_unfinished_run_has_no_total():
+    record = QueryTimings('interactive').record()
+    assert record['total'] is None
+    assert record['fingerprint'] is None
+
+
+def test_metrics_log_appends_a_line_per_run(tmp_path):
+    path = str(tmp_path / 'metrics.jsonl')
+    log = MetricsLog(path)
+
+    def write_runs(kind):
+        for i in range(25):
+            timings = QueryTimings(kind, 'db', f"SELECT {i}")
+            timings.finish('ok', rows=i)
+            log.write(timings)
+    threads = [threading.Thread(target=write_runs, args=(f"worker{n}",)) for n in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    with open(path) as f:
+        records = [json.loads(line) for line in f]
+    assert len(records) == 100
+    assert {record['kind'] for record in records} == {f"worker{n}" for n in range(4)}
+
+
+def test_metrics_log_never_raises(tmp_path):
+    MetricsLog(str(tmp_path / 'missing' / 'metrics.jsonl')).write(QueryTimings('interactive'))
+
+
+def test_timed_without_timings():
+    with timed(None, 'fetch'):
+        pass
+    timings = QueryTimings('interactive')
+    with timed(timings, 'fetch'):
+        pass
+    assert 'fetch' in timings.phases
+
+
+def test_format_seconds():
+    assert format_seconds(0.0125) == "12 ms"
+    assert format_seconds(3.14159) == "3.14 s"
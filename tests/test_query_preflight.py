@@ -0,0 +1,187 @@
+import json
+import sqlite3
+
+import numpy as np
+import pandas as pd
+
+from db_backends import BACKENDS
+from query_preflight import (PreflightReport, PreviewPager, estimated_result_rows, explain_plan, limited_query,
+                             plan_tables, preflight_query, preflight_thresholds)
+
+JOIN_PLAN = {'query_block': {'nested_loop': [
+    {'table': {'table_name': 'orders', 'access_type': 'ALL', 'rows_examined_per_scan': 200000,
+               'rows_produced_per_join': 50, 'attached_condition': "(`orders`.`day` between '2024-01-01' and "
+                                                                     "'2024-01-31 23:59:59.999999')"}},
+    {'table': {'table_name': 'items', 'access_type': 'ref', 'rows_examined_per_scan': 4,
+               'rows_produced_per_join': 200}},
+]}}
+
+
+class FakeCursor:
+    def __init__(self, plan):
+        self.plan = plan
+        self.executed = []
+
+    def execute(self, sql, params=None):
+        self.executed.append((sql, params))
+
+    def fetchone(self):
+        return (json.dumps(self.plan).encode('utf-8'),)
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    def __init__(self, plan):
+        self.last_cursor = FakeCursor(plan)
+
+    def cursor(self):
+        return self.last_cursor
+
+
+def test_plan_tables_multiply_by_the_rows_before_them():
+    tables = [(table['table_name'], loops) for table, loops in plan_tables(JOIN_PLAN)]
+    assert tables == [('orders', 1), ('items', 50)]
+
+
+def test_plan_tables_find_derived_tables():
+    plan = {'query_block': {'table': {'table_name': 'd', 'access_type': 'ALL', 'materialized_from_subquery': {
+        'query_block': {'table': {'table_name': 'inner', 'access_type': 'ALL'}}}}}}
+    assert [table['table_name'] for table, _ in plan_tables(plan)] == ['d', 'inner']
+
+
+def test_report_counts_rows_and_full_scans():
+    report = PreflightReport(JOIN_PLAN, "SELECT * FROM orders JOIN items USING (id)")
+    assert report.examined_rows == 200000 + 4 * 50
+    assert report.full_scans == [('orders', 200000, False)]
+    assert report.warnings(max_examined_rows=10 ** 6, max_scan_rows=10 ** 6) == []
+    assert report.warnings(max_examined_rows=100000, max_scan_rows=100000) == [
+        "About 200,200 rows would be examined (threshold 100,000)",
+        "Full scan of orders (200,000 rows)"]
+
+
+def test_report_names_an_unindexed_date_range():
+    query = "SELECT * FROM orders WHERE day BETWEEN '2024-01-01' AND '2024-01-31 23:59:59.999999'"
+    report = PreflightReport(JOIN_PLAN, query)
+    assert report.warnings(max_scan_rows=1000)[-1] == \
+        "The date range on orders can't use an index; all 200,000 rows are scanned"
+
+
+def test_preflight_query_explains_without_comments():
+    connection = FakeConnection(JOIN_PLAN)
+    report = preflight_query(connection, "SELECT * FROM orders; -- nightly")
+    assert connection.last_cursor.executed == [("EXPLAIN FORMAT=JSON SELECT * FROM orders", None)]
+    assert report.examined_rows == 200200
+    assert explain_plan(FakeConnection({'a': 1}), "SELECT 1") == {'a': 1}
+
+
+def test_thresholds_come_from_the_db_config():
+    assert preflight_thresholds({'preflight_max_rows': 5, 'preflight_scan_rows': 3}) == (5, 3)
+
+
+def test_estimated_rows_read_the_last_joined_table():
+    assert estimated_result_rows(JOIN_PLAN) == 200
+    assert estimated_result_rows({'query_block': {'ordering_operation': {'table': {'rows_produced_per_join': 7}}}}) == 7
+    assert estimated_result_rows({'query_block': {'union_result': {}}}) is None
+
+
+def test_limited_query_wraps_the_query():
+    assert limited_query("SELECT * FROM t ORDER BY a LIMIT 50; -- top", 10) == \
+        "SELECT * FROM (\nSELECT * FROM t ORDER BY a LIMIT 50\n) AS limited\nLIMIT 10"
+    assert limited_query("SELECT * FROM t", 10, 20, '`id`') == \
+        "SELECT * FROM (\nSELECT * FROM t\n) AS limited\nORDER BY `id`\nLIMIT 10 OFFSET 20"
+
+
+def people(count=23):
+    connection = sqlite3.connect(':memory:')
+    connection.execute("CREATE TABLE people (id INTEGER PRIMARY KEY, name TEXT)")
+    # Inserted out of key order, so only an ORDER BY gives pages in key order
+    connection.executemany("INSERT INTO people VALUES (?, ?)", [(i * 7 % count + 1, f"p{i}%") for i in range(count)])
+    return connection
+
+
+def read_pages(connection, pager):
+    pages = []
+    while not pager.complete:
+        sql, params = pager.page()
+        cursor = connection.execute(sql, params or ())
+        df = pd.DataFrame(cursor.fetchall(), columns=[column[0] for column in cursor.description])
+        pager.add_page(df)
+        pages.append((sql, df))
+    return pages
+
+
+def test_keyset_pages_cover_the_result_once():
+    connection = people()
+    pager = PreviewPager("SELECT id, name FROM people WHERE name LIKE 'p%'; -- all", 5, BACKENDS['sqlite'],
+                         order_by='ID')
+    pages = read_pages(connection, pager)
+    assert len(pages) == 5
+    assert 'OFFSET' not in ''.join(sql for sql, _ in pages)
+    assert pages[1][0].endswith('WHERE "ID" > ?\nORDER BY "ID"\nLIMIT 5')
+    assert pd.concat([df for _, df in pages])['id'].tolist() == list(range(1, 24))
+    assert pager.fetched == 23
+
+
+def test_keyset_pages_bind_after_the_template_values():
+    connection = people()
+    pager = PreviewPager("SELECT * FROM people WHERE id > ?", 10, BACKENDS['sqlite'], params=(3,), order_by='id')
+    pages = read_pages(connection, pager)
+    assert pager.page()[1] == (3, 23)
+    assert pd.concat([df for _, df in pages])['id'].tolist() == list(range(4, 24))
+
+
+def test_pages_without_a_key_use_offset():
+    pager = PreviewPager("SELECT * FROM people", 10, BACKENDS['sqlite'])
+    pager.add_page(pd.DataFrame({'id': range(10)}))
+    assert pager.page() == ("SELECT * FROM (\nSELECT * FROM people\n) AS limited\nLIMIT 10 OFFSET 10", None)
+    pager.add_page(pd.DataFrame({'id': range(4)}))
+    assert pager.complete
+
+
+def test_keyset_page_escapes_percent_for_pymysql():
+    pager = PreviewPager("SELECT * FROM t WHERE s LIKE 'a%'", 10, BACKENDS['pymysql'], order_by='id')
+    pager.add_page(pd.DataFrame({'id': np.arange(10, dtype='int64')}))
+    sql, params = pager.page()
+    assert "LIKE 'a%%'" in sql and sql.endswith("WHERE `id` > %s\nORDER BY `id`\nLIMIT 10")
+    assert params == (9,) and type(params[0]) is int
+
+
+class KeysCursor:
+    description = [('Table',), ('Key_name',), ('Column_name',)]
+
+    def __init__(self, keys):
+        self.keys = keys
+
+    def execute(self, sql):
+        self.sql = sql
+
+    def fetchall(self):
+        return [('t', 'PRIMARY', key) for key in self.keys]
+
+    def close(self):
+        pass
+
+
+class KeysConnection:
+    def __init__(self, *keys):
+        self.keys = keys
+
+    def cursor(self):
+        return KeysCursor(self.keys)
+
+
+def test_find_order_uses_a_selected_primary_key():
+    pager = PreviewPager("SELECT id, name FROM t", 10, BACKENDS['mysql'])
+    pager.find_order(KeysConnection('id'))
+    assert pager.order_by == 'id'
+    for query, connection in [("SELECT name FROM t", KeysConnection('id')),
+                              ("SELECT * FROM t", KeysConnection('a', 'b')),
+                              ("SELECT * FROM t JOIN u USING (id)", KeysConnection('id'))]:
+        pager = PreviewPager(query, 10, BACKENDS['mysql'])
+        pager.find_order(connection)
+        assert pager.order_by is None
+    pager = PreviewPager("SELECT * FROM t", 10, BACKENDS['sqlite'])
+    pager.find_order(None)
+    assert pager.order_by is None
@@ -0,0 +1,55 @@
+from datetime import date, datetime
+
+import pytest
+
+from db_backends import BACKENDS
+from query_templates import DEFAULT_TEMPLATES, QueryTemplate, placeholders
+
+CTA = DEFAULT_TEMPLATES[0]
+
+
+def test_placeholders_skip_strings_comments_and_casts():
+    query = "SELECT ':a', `:b`, x::int, @v := 1 -- :c\nFROM t WHERE d = :d /* :e */"
+    assert [name for _, _, name in placeholders(query)] == ['d']
+
+
+def test_undeclared_parameter_is_an_error():
+    with pytest.raises(ValueError, match=':missing'):
+        QueryTemplate('t', "SELECT * FROM t WHERE a = :missing")
+
+
+def test_unknown_type_is_an_error():
+    with pytest.raises(ValueError, match="unknown type"):
+        QueryTemplate('t', "SELECT :a", [{'name': 'a', 'type': 'blob'}])
+
+
+def test_bind_orders_values_and_covers_the_end_date():
+    template = QueryTemplate(CTA['name'], CTA['query'], CTA['params'])
+    query, params = template.bind({'start': date(2024, 1, 1), 'end': date(2024, 1, 10)}, BACKENDS['mysql'])
+    assert query == "SELECT * FROM `cta_report`\nWHERE `added_on` BETWEEN ? AND ?"
+    assert params == (datetime(2024, 1, 1), datetime(2024, 1, 10, 23, 59, 59, 999999))
+
+
+def test_bind_adapts_values_for_sqlite():
+    template = QueryTemplate('t', "SELECT * FROM t WHERE d >= :d", [{'name': 'd', 'type': 'date'}])
+    assert template.bind({'d': '2024-02-03'}, BACKENDS['sqlite']) == \
+        ("SELECT * FROM t WHERE d >= ?", ('2024-02-03',))
+
+
+def test_bind_escapes_percent_for_pymysql():
+    template = QueryTemplate('t', "SELECT * FROM t WHERE a LIKE '5%' AND b > :n", [{'name': 'n', 'type': 'int'}])
+    assert template.bind({'n': '7'}, BACKENDS['pymysql']) == \
+        ("SELECT * FROM t WHERE a LIKE '5%%' AND b > %s", (7,))
+
+
+def test_bad_value_raises_value_error():
+    template = QueryTemplate('t', "SELECT :n", [{'name': 'n', 'type': 'int'}])
+    with pytest.raises(ValueError):
+        template.bind({'n': 'seven'}, BACKENDS['sqlite'])
+
+
+def test_literal_query_quotes_values():
+    template = QueryTemplate('t', "SELECT * FROM t WHERE name = :name AND n < :n",
+                             [{'name': 'name'}, {'name': 'n', 'type': 'float'}])
+    assert template.literal_query({'name': "O'Brien", 'n': 2}, BACKENDS['sqlite']) == \
+        "SELECT * FROM t WHERE name = 'O''Brien' AND n < 2.0"
@@ -0,0 +1,142 @@
+import glob
+import json
+import os
+import sqlite3
+import subprocess
+import sys
+from datetime import datetime, timedelta
+
+import pandas as pd
+import pytest
+
+import query_tool
+from results_catalog import ResultsCatalog
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    # Every default file name the tool uses is relative, so keep them out of the checkout
+    monkeypatch.chdir(tmp_path)
+    with sqlite3.connect('local.db') as connection:
+        connection.execute("CREATE TABLE t (id INTEGER)")
+        connection.executemany("INSERT INTO t VALUES (?)", [(i,) for i in range(5)])
+    connection.close()
+    with open('db_configs.json', 'w') as f:
+        json.dump([{'name': 'local', 'type': 'sqlite', 'database': 'local.db'}], f)
+    return tmp_path
+
+
+def write_jobs(jobs):
+    with open('jobs.json', 'w') as f:
+        json.dump(jobs, f)
+
+
+def read_jobs():
+    with open('jobs.json') as f:
+        return json.load(f)
+
+
+def run_once():
+    return query_tool.main(['run-scheduler', '--once', '--jobs', 'jobs.json', '--db-configs', 'db_configs.json',
+                            '--catalog', 'catalog.db', '--history-db', 'history.db',
+                            '--metrics-log', 'metrics.jsonl'])
+
+
+def test_run_scheduler_once_runs_the_due_jobs(workdir):
+    due = (datetime.now() - timedelta(minutes=1)).isoformat()
+    later = (datetime.now() + timedelta(hours=1)).isoformat()
+    write_jobs([{'id': 'due', 'query': "SELECT id FROM t", 'interval': 3600, 'next_run': due, 'output_file': 'due'},
+                {'id': 'later', 'query': "SELECT id FROM t", 'interval': 3600, 'next_run': later,
+                 'output_file': 'later'}])
+
+    assert run_once() == 0
+    [filename] = glob.glob('due_*.csv')
+    assert pd.read_csv(filename)['id'].tolist() == list(range(5))
+    assert glob.glob('later_*') == []
+
+    jobs = {job['id']: job for job in read_jobs()}
+    assert jobs['due']['last_status'] == 'ok'
+    assert jobs['due']['last_rows'] == 5
+    assert jobs['due']['database'] == 'local'
+    assert jobs['due']['next_run'] > due
+    assert jobs['later']['next_run'] == later
+    assert 'last_status' not in jobs['later']
+
+    with open('metrics.jsonl') as f:
+        [line] = f.read().splitlines()
+    assert json.loads(line)['rows'] == 5
+    catalog = ResultsCatalog('catalog.db')
+    assert catalog.count() == 1
+    catalog.close()
+
+
+def test_run_scheduler_once_records_a_failed_job(workdir):
+    write_jobs([{'id': 'bad', 'query': "SELECT nope FROM t", 'interval': 60,
+                 'next_run': datetime.now().isoformat(), 'output_file': 'bad'}])
+    assert run_once() == 0
+    assert read_jobs()[0]['last_status'].startswith('error: no such column')
+
+
+def test_clean_results_applies_retention(workdir):
+    catalog = ResultsCatalog('catalog.db')
+    for name in ('old.csv', 'new.csv'):
+        pd.DataFrame({'id': range(100)}).to_csv(name, index=False)
+        catalog.record(name, rows=100)
+    with catalog.lock:
+        catalog.db.execute("UPDATE saved_results SET created_at = '2000-01-01 00:00:00' WHERE path LIKE '%old.csv'")
+        catalog.db.commit()
+    catalog.close()
+    pd.DataFrame({'id': [1]}).to_csv('found.csv', index=False)
+    os.utime('found.csv', (0, 0))
+
+    assert query_tool.main(['clean-results', '--max-age-days', '30', '--rescan', '.', '--catalog', 'catalog.db']) == 0
+    assert not os.path.exists('old.csv')
+    assert os.path.exists('new.csv')
+    # Files only found by the rescan are kept unless --include-rescanned
+    assert os.path.exists('found.csv')
+
+    assert query_tool.main(['clean-results', '--max-age-days', '30', '--include-rescanned',
+                            '--catalog', 'catalog.db']) == 0
+    assert not os.path.exists('found.csv')
+
+
+def test_a_command_is_required(capsys):
+    with pytest.raises(SystemExit) as exit_info:
+        query_tool.main([])
+    assert exit_info.value.code == 2
+    assert 'required' in capsys.readouterr().err
+
+
+@pytest.mark.parametrize('argv', [['run-scheduler', '--workers', 'two'], ['clean-results', '--max-age-days'],
+                                  ['vacuum']])
+def test_bad_arguments_exit_with_usage(argv, capsys):
+    with pytest.raises(SystemExit) as exit_info:
+        query_tool.main(argv)
+    assert exit_info.value.code == 2
+    assert capsys.readouterr().err.startswith('usage: query-tool')
+
+
+def test_help_exits_cleanly(capsys):
+    with pytest.raises(SystemExit) as exit_info:
+        query_tool.main(['run-scheduler', '--help'])
+    assert exit_info.value.code == 0
+    assert '--once' in capsys.readouterr().out
+
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_runs_as_a_script(workdir):
+    write_jobs([])
+    result = subprocess.run([sys.executable, os.path.join(REPO, 'query_tool.py'), 'run-scheduler', '--once',
+                             '--jobs', 'jobs.json', '--db-configs', 'db_configs.json', '--catalog', 'catalog.db',
+                             '--history-db', 'history.db', '--metrics-log', 'metrics.jsonl'],
+                            capture_output=True, text=True)
+    assert result.returncode == 0, result.stderr
+    assert 'Loaded 0 scheduled queries' in result.stderr
+
+
+def test_does_not_import_pyqt():
+    result = subprocess.run([sys.executable, '-c', "import sys, query_tool; sys.exit('PyQt5' in sys.modules)"],
+                            cwd=REPO, capture_output=True, text=True)
+    assert result.returncode == 0, result.stderr
@@ -0,0 +1,58 @@
+import pytest
+
+from query_validation import classify_query, is_read_only_query, strip_comments, tokenize
+
+
+@pytest.mark.parametrize('query', [
+    "SELECT * FROM t",
+    "select 1;",
+    "  -- a comment\nSELECT 1",
+    "SHOW TABLES",
+    "DESC t",
+    "EXPLAIN SELECT * FROM t",
+    "WITH x AS (SELECT 1) SELECT * FROM x",
+    "SELECT 'DROP TABLE t; DELETE FROM t'",
+    "SELECT 1 -- ; DELETE FROM t",
+    "SELECT `update` FROM t",
+])
+def test_read_only_queries_are_allowed(query):
+    assert is_read_only_query(query)
+
+
+@pytest.mark.parametrize('query, reason', [
+    ("DELETE FROM t", "DELETE statements are not allowed"),
+    ("SELECT 1; DROP TABLE t", "DROP statements are not allowed"),
+    ("/*! DELETE FROM t */", "DELETE statements are not allowed"),
+    ("EXPLAIN DELETE FROM t", "EXPLAIN DELETE is not allowed"),
+    ("WITH x AS (SELECT 1) UPDATE t SET a = 1", "UPDATE statements are not allowed"),
+    ("SELECT * FROM t FOR UPDATE", "SELECT ... FOR UPDATE locks rows"),
+    ("SELECT * INTO OUTFILE '/tmp/x' FROM t", "SELECT ... INTO OUTFILE writes to the server"),
+    ("", "The query has no statement"),
+    ("-- only a comment", "The query has no statement"),
+])
+def test_writes_are_rejected(query, reason):
+    info = classify_query(query)
+    assert not info.read_only
+    assert info.reason == reason
+
+
+def test_cacheable_only_for_a_single_select():
+    assert classify_query("SELECT 1").cacheable
+    assert not classify_query("SELECT 1; SELECT 2").cacheable
+    assert not classify_query("SHOW TABLES").cacheable
+
+
+def test_tokenize_drops_comments_and_folds_words():
+    assert tokenize("SELECT a /* x */ FROM `T` -- y") == [
+        ('word', 'select'), ('word', 'a'), ('word', 'from'), ('identifier', '`T`')]
+    assert tokenize("SELECT A", fold_case=False) == [('word', 'SELECT'), ('word', 'A')]
+
+
+def test_tokenize_multiplication_before_comment():
+    assert [text for _, text in tokenize("SELECT 2*/* note */3")] == ['select', '2', '*', '3']
+
+
+def test_strip_comments_keeps_strings_and_executable_comments():
+    assert strip_comments("SELECT '--x', a -- note\nFROM t; ") == "SELECT '--x', a  \nFROM t"
+    assert strip_comments("SELECT /*!40001 SQL_NO_CACHE */ 1;;") == "SELECT /*!40001 SQL_NO_CACHE */ 1"
+    assert strip_comments("SELECT 1; -- done") == "SELECT 1"
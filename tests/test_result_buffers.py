@@ -0,0 +1,86 @@
+import sqlite3
+
+import numpy as np
+import pandas as pd
+from mysql.connector.constants import FieldType, FieldFlag
+
+from result_buffers import ColumnBuffer, ResultAssembler, concat_frames, dtype_for, fetch_dataframe
+
+
+def mysql_column(type_code, flags=0):
+    return ('c', type_code, None, None, None, None, True, flags)
+
+
+def test_integer_dtypes_follow_the_column_type():
+    assert dtype_for(mysql_column(FieldType.TINY)) == np.int8
+    assert dtype_for(mysql_column(FieldType.LONG, FieldFlag.UNSIGNED)) == np.uint32
+    assert dtype_for(mysql_column(FieldType.LONGLONG, FieldFlag.UNSIGNED)) == np.uint64
+    assert dtype_for(mysql_column(FieldType.DOUBLE)) == np.float64
+
+
+def test_integers_without_flags_fit_either_sign():
+    # PyMySQL doesn't report UNSIGNED
+    assert dtype_for(('c', FieldType.SHORT, None, None, None, None, True)) == np.int32
+    assert dtype_for(('c', FieldType.LONGLONG, None, None, None, None, True)) == object
+
+
+def test_duckdb_and_untyped_columns():
+    assert dtype_for(('c', 'UBIGINT')) == np.uint64
+    assert dtype_for(('c', 'VARCHAR')) == object
+    assert dtype_for(('c', None)) == object
+
+
+def test_integer_buffer_keeps_nulls_and_grows():
+    buffer = ColumnBuffer(np.dtype('int16'), 2)
+    buffer.append((1, None, 3))
+    buffer.append((4,))
+    series = buffer.to_series()
+    assert series.dtype == 'Int16'
+    assert series.tolist() == [1, pd.NA, 3, 4]
+
+
+def test_integer_buffer_without_nulls_stays_numpy():
+    buffer = ColumnBuffer(np.dtype('uint8'), 4)
+    buffer.append((1, 255))
+    assert buffer.to_series().dtype == np.uint8
+
+
+def test_object_buffer_keeps_bytes_as_cells():
+    buffer = ColumnBuffer(np.dtype(object), 4)
+    buffer.append((b'ab', None))
+    assert buffer.to_series().tolist() == [b'ab', None]
+
+
+def test_repeated_text_becomes_categorical():
+    buffer = ColumnBuffer(np.dtype(object), 4)
+    buffer.append(tuple('abab' * 10))
+    assert isinstance(buffer.to_series().dtype, pd.CategoricalDtype)
+    buffer = ColumnBuffer(np.dtype(object), 4)
+    buffer.append(tuple(str(i) for i in range(40)))
+    assert isinstance(buffer.to_series().dtype, pd.StringDtype)
+
+
+def test_assembler_keeps_duplicate_column_names():
+    assembler = ResultAssembler([mysql_column(FieldType.LONG), mysql_column(FieldType.LONG)])
+    assembler.add_rows([(1, 2), (3, 4)])
+    df = assembler.to_dataframe()
+    assert df.columns.tolist() == ['c', 'c']
+    assert df.iloc[:, 1].tolist() == [2, 4]
+
+
+def test_concat_frames_keeps_text_compact():
+    first = pd.DataFrame({'s': pd.Categorical(['a', 'a'])})
+    second = pd.DataFrame({'s': pd.Categorical(['b', 'b'])})
+    df = concat_frames([first, second])
+    assert isinstance(df['s'].dtype, pd.CategoricalDtype)
+    assert df['s'].tolist() == ['a', 'a', 'b', 'b']
+
+
+def test_fetch_dataframe_from_sqlite():
+    connection = sqlite3.connect(':memory:')
+    cursor = connection.execute("SELECT 1 AS n, 'x' AS s UNION ALL SELECT 2, NULL")
+    batches = []
+    df = fetch_dataframe(cursor, batch_size=1, on_batch=lambda rows, total: batches.append(total))
+    assert batches == [1, 2]
+    assert df['n'].tolist() == [1, 2]
+    assert df['s'].tolist()[0] == 'x'
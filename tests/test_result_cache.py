@@ -0,0 +1,43 @@
+import pandas as pd
+
+from result_cache import ResultCache, cache_key, frame_size
+
+
+def test_cache_key_ignores_comments_and_whitespace():
+    assert cache_key('db', "SELECT a\n  FROM t -- latest\n;") == cache_key('db', "SELECT a FROM t /* x */")
+
+
+def test_cache_key_keeps_case_strings_and_context():
+    key = cache_key('db', "SELECT a AS Total FROM t WHERE s = 'X'")
+    assert key != cache_key('db', "SELECT a AS total FROM t WHERE s = 'X'")
+    assert key != cache_key('db', "SELECT a AS Total FROM t WHERE s = 'x'")
+    assert key != cache_key('other', "SELECT a AS Total FROM t WHERE s = 'X'")
+    assert cache_key('db', "SELECT ?", (1,)) != cache_key('db', "SELECT ?", (2,))
+
+
+def test_expired_entries_are_not_returned(tmp_path):
+    cache = ResultCache(cache_dir=str(tmp_path))
+    cache.put('k', pd.DataFrame({'a': [1, 2]}))
+    assert cache.get('k', ttl=60)[0]['a'].tolist() == [1, 2]
+    assert cache.get('k', ttl=-1) is None
+    assert cache.memory_used == 0
+
+
+def test_least_recently_used_entry_spills_to_disk(tmp_path):
+    df = pd.DataFrame({'a': range(100)})
+    cache = ResultCache(memory_budget=frame_size(df) * 2, cache_dir=str(tmp_path))
+    cache.put('first', df)
+    cache.put('second', df)
+    cache.get('first', ttl=60)
+    cache.put('third', df)
+    assert list(cache.entries) == ['first', 'third']
+    spilled, _ = cache.get('second', ttl=60)
+    assert spilled['a'].tolist() == list(range(100))
+
+
+def test_invalidate_removes_the_spill_file(tmp_path):
+    cache = ResultCache(memory_budget=0, cache_dir=str(tmp_path))
+    cache.put('k', pd.DataFrame({'a': [1]}))
+    assert cache.get('k', ttl=60) is not None
+    cache.invalidate('k')
+    assert cache.get('k', ttl=60) is None
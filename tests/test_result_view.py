@@ -0,0 +1,97 @@
+from datetime import date
+from decimal import Decimal
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from result_view import ResultView
+
+
+def sample():
+    return pd.DataFrame({
+        'name': ['b', 'a', None, 'c', 'a'],
+        'amount': [3.0, 1.0, 2.0, np.nan, 1.0],
+        'price': [Decimal('1.5'), Decimal('10'), None, Decimal('2'), Decimal('1.5')],
+        'day': [date(2024, 1, 3), date(2024, 1, 1), date(2024, 1, 2), None, date(2024, 1, 1)],
+    })
+
+
+def visible(view, column):
+    return view.frame().iloc[:, column].tolist()
+
+
+def test_filters_combine_and_clear():
+    view = ResultView(sample())
+    view.add_filter(1, '>=', '1')
+    view.add_filter(0, 'contains', 'A')
+    assert visible(view, 0) == ['a', 'a']
+    assert view.describe() == "amount >= 1, name contains A"
+    view.clear_filters()
+    assert view.row_count == 5
+
+
+def test_empty_filters_treat_missing_text_as_empty():
+    df = pd.DataFrame({'s': ['x', '', None]})
+    view = ResultView(df)
+    view.add_filter(0, 'is empty')
+    assert view.rows.tolist() == [1, 2]
+
+
+def test_decimal_and_date_columns_compare_by_value():
+    view = ResultView(sample())
+    view.add_filter(2, '<', '2')
+    assert view.rows.tolist() == [0, 4]
+    view.clear_filters()
+    view.add_filter(3, '>', '2024-01-01')
+    assert view.rows.tolist() == [0, 2]
+
+
+def test_bad_filter_value_raises_value_error():
+    view = ResultView(sample())
+    with pytest.raises(ValueError, match='amount'):
+        view.add_filter(1, '>', 'lots')
+
+
+@pytest.mark.parametrize('column, ascending, expected', [
+    (1, True, [1, 4, 2, 0, 3]),
+    (1, False, [0, 2, 1, 4, 3]),
+    (0, True, [1, 4, 0, 3, 2]),
+    (0, False, [3, 0, 1, 4, 2]),
+])
+def test_sort_is_stable_with_missing_values_last(column, ascending, expected):
+    view = ResultView(sample())
+    view.sort_by(column, ascending)
+    assert view.rows.tolist() == expected
+
+
+def test_sort_matches_pandas_stable_order():
+    values = np.random.default_rng(1).integers(0, 50, 2000).astype(float)
+    values[::7] = np.nan
+    df = pd.DataFrame({'v': values})
+    view = ResultView(df)
+    for ascending in (True, False):
+        view.sort_by(0, ascending)
+        expected = df.sort_values('v', ascending=ascending, kind='stable', na_position='last').index
+        assert view.rows.tolist() == expected.tolist()
+
+
+def test_sort_keeps_filters():
+    view = ResultView(sample())
+    view.add_filter(1, '>', '1')
+    view.sort_by(1, False)
+    assert view.rows.tolist() == [0, 2]
+
+
+def test_group_aggregates_the_filtered_rows():
+    view = ResultView(sample())
+    grouped = view.group(0, 'sum', 1)
+    assert grouped.columns.tolist() == ['name', 'sum(amount)']
+    assert grouped['sum(amount)'].tolist()[:3] == [2.0, 3.0, 0.0]
+    view.add_filter(1, '>', '1')
+    assert view.group(0, 'count')['count'].tolist() == [1, 1]
+
+
+def test_group_refuses_to_sum_text():
+    with pytest.raises(ValueError, match='holds text'):
+        ResultView(sample()).group(1, 'sum', 0)
@@ -0,0 +1,88 @@
+import gzip
+import os
+from datetime import datetime, timedelta
+
+import pytest
+
+from results_catalog import ResultsCatalog
+
+LATER = datetime.now() + timedelta(days=10)
+
+
+@pytest.fixture
+def catalog(tmp_path):
+    catalog = ResultsCatalog(str(tmp_path / 'catalog.db'))
+    yield catalog
+    catalog.close()
+
+
+def export(tmp_path, name, text='a,b\n1,2\n'):
+    path = tmp_path / name
+    path.write_text(text)
+    return str(path)
+
+
+def paths(catalog):
+    return sorted(os.path.basename(row['path']) for row in catalog.search())
+
+
+def test_old_exports_are_deleted(tmp_path, catalog):
+    old = export(tmp_path, 'old.csv')
+    catalog.record(old, rows=1, query="SELECT 1")
+    assert catalog.apply_retention(max_age_days=30, now=LATER) == (0, 0, 0)
+    deleted, compressed, freed = catalog.apply_retention(max_age_days=5, now=LATER)
+    assert (deleted, compressed, freed) == (1, 0, len('a,b\n1,2\n'))
+    assert not os.path.exists(old)
+    assert catalog.count() == 0
+
+
+def test_old_csvs_are_compressed(tmp_path, catalog):
+    path = export(tmp_path, 'result.csv', 'a,b\n' + '1,2\n' * 1000)
+    catalog.record(path, rows=1000, query="SELECT 1")
+    assert catalog.apply_retention(compress_after_days=5, now=LATER)[1] == 1
+    assert paths(catalog) == ['result.csv.gz']
+    with gzip.open(path + '.gz', 'rt') as f:
+        assert f.read().count('\n') == 1001
+    assert not os.path.exists(path)
+
+
+def test_rolling_files_are_not_compressed(tmp_path, catalog):
+    path = export(tmp_path, 'rolling.csv')
+    catalog.record(path, rows=1, append=True)
+    assert catalog.apply_retention(compress_after_days=5, now=LATER)[1] == 0
+    assert os.path.exists(path)
+
+
+def test_existing_gz_is_never_overwritten(tmp_path, catalog):
+    path = export(tmp_path, 'result.csv')
+    export(tmp_path, 'result.csv.gz', 'not ours')
+    catalog.record(path, rows=1)
+    assert catalog.apply_retention(compress_after_days=5, now=LATER)[1] == 0
+    assert (tmp_path / 'result.csv.gz').read_text() == 'not ours'
+    assert paths(catalog) == ['result.csv']
+
+
+def test_rescanned_files_need_opting_in(tmp_path, catalog):
+    found = export(tmp_path, 'found.csv')
+    assert catalog.rescan(str(tmp_path)) == (1, 0)
+    assert catalog.rescanned_due(max_age_days=5, now=LATER) == 1
+    assert catalog.apply_retention(max_age_days=5, now=LATER)[0] == 0
+    assert os.path.exists(found)
+    assert catalog.apply_retention(max_age_days=5, now=LATER, include_rescanned=True)[0] == 1
+    assert not os.path.exists(found)
+
+
+def test_rescan_forgets_missing_files(tmp_path, catalog):
+    path = export(tmp_path, 'gone.csv')
+    catalog.record(path, rows=1)
+    os.remove(path)
+    assert catalog.rescan(str(tmp_path)) == (0, 1)
+    assert catalog.count() == 0
+
+
+def test_appending_adds_rows(tmp_path, catalog):
+    path = export(tmp_path, 'rolling.csv')
+    catalog.record(path, rows=2, append=True, range_start=1, range_end=2)
+    catalog.record(path, rows=3, append=True, range_start=2, range_end=5)
+    row = catalog.search()[0]
+    assert (row['rows'], row['range_start'], row['range_end'], row['rolling']) == (5, '1', '5', 1)
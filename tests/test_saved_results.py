@@ -0,0 +1,109 @@
+import csv
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import saved_results
+from saved_results import OFFSETS_SUFFIX, SCHEMA_SUFFIX, CsvRowSource, load_frame, open_saved_result
+
+ROWS = [(str(i), f"name {i}", 'line one\nline "two"' if i % 7 == 0 else f"{i / 4}") for i in range(200)]
+
+
+def write_csv(path, rows, trailing_newline=True):
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f, lineterminator='\n')
+        writer.writerow(['id', 'name', 'note'])
+        writer.writerows(rows)
+    if not trailing_newline:
+        with open(path, 'rb+') as f:
+            f.truncate(os.path.getsize(path) - 1)
+
+
+def open_indexed(path):
+    source = open_saved_result(path)
+    if source.thread is not None:
+        source.thread.join()
+    return source
+
+
+@pytest.fixture(autouse=True)
+def small_chunks(monkeypatch):
+    # Make the indexer cross many chunk boundaries, including ones inside quoted fields
+    monkeypatch.setattr(saved_results, 'FIRST_INDEX_CHUNK', 256)
+    monkeypatch.setattr(saved_results, 'INDEX_CHUNK', 97)
+
+
+@pytest.mark.parametrize('trailing_newline', [True, False])
+def test_pages_match_the_file(tmp_path, trailing_newline):
+    path = str(tmp_path / 'out.csv')
+    write_csv(path, ROWS, trailing_newline)
+    source = open_indexed(path)
+    assert source.complete and source.error is None
+    assert source.row_count == len(ROWS)
+    assert source.columns == ['id', 'name', 'note']
+    pages = [row for start in range(0, len(ROWS), 30) for row in source.read_rows(start, start + 30)]
+    assert pages == ROWS
+    assert source.read_rows(195, 500) == ROWS[195:]
+    source.close()
+
+
+def test_offsets_are_saved_and_reused(tmp_path, monkeypatch):
+    path = str(tmp_path / 'out.csv')
+    write_csv(path, ROWS)
+    open_indexed(path).close()
+    assert os.path.exists(path + SCHEMA_SUFFIX)
+    assert len(np.load(path + OFFSETS_SUFFIX)) == len(ROWS) + 1
+
+    def no_indexing(self, chunk_size):
+        raise AssertionError("the saved offsets should have been used")
+    monkeypatch.setattr(CsvRowSource, 'index_chunk', no_indexing)
+    source = CsvRowSource(path)
+    assert source.complete
+    assert source.row_count == len(ROWS)
+    assert source.read_rows(140, 142) == ROWS[140:142]
+    source.close()
+
+
+@pytest.mark.parametrize('change', ['append', 'same_size'])
+def test_modified_file_is_indexed_again(tmp_path, change):
+    path = str(tmp_path / 'out.csv')
+    write_csv(path, ROWS)
+    open_indexed(path).close()
+    stat = os.stat(path)
+
+    if change == 'append':
+        rows = ROWS + [('200', 'new', 'row')]
+    else:
+        # Same byte count, different row boundaries
+        rows = ROWS[::-1]
+    write_csv(path, rows)
+    if change == 'same_size':
+        assert os.path.getsize(path) == stat.st_size
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+    source = open_indexed(path)
+    assert source.row_count == len(rows)
+    assert source.read_rows(0, len(rows)) == rows
+    source.close()
+    assert len(np.load(path + OFFSETS_SUFFIX)) == len(rows) + 1
+
+
+def test_empty_file(tmp_path):
+    path = str(tmp_path / 'empty.csv')
+    open(path, 'w').close()
+    source = open_indexed(path)
+    assert source.row_count == 0
+    assert source.read_rows(0, 10) == []
+    source.close()
+
+
+def test_load_frame_keeps_integer_columns_with_late_nulls(tmp_path, monkeypatch):
+    monkeypatch.setattr(saved_results, 'SCHEMA_SAMPLE_ROWS', 10)
+    path = str(tmp_path / 'out.csv')
+    with open(path, 'w') as f:
+        f.write('n,s\n' + '1,a\n' * 20 + ',b\n')
+    assert str(load_frame(path)['n'].dtype) == 'Int64'
+    assert os.path.exists(path + SCHEMA_SUFFIX)
+    assert load_frame(path)['n'].isna().sum() == 1
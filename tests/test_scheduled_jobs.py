@@ -0,0 +1,182 @@
+import sqlite3
+from concurrent.futures import Future
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+import pandas as pd
+import pytest
+
+from connection_pool import ConnectionPools
+from db_backends import BACKENDS
+import scheduled_jobs
+from scheduled_jobs import (JobScheduler, incremental_query, load_jobs, next_run_after, run_job, save_jobs,
+                            watermark_value)
+
+T0 = datetime(2024, 1, 1, 12, 0, 0)
+
+
+def test_incremental_query_wraps_the_job():
+    assert incremental_query("SELECT * FROM t;", 'id') == \
+        "SELECT * FROM (\nSELECT * FROM t\n) AS incremental\nWHERE `id` > %s\nORDER BY `id`"
+
+
+@pytest.mark.parametrize('query', ["SELECT * FROM t; -- nightly", "SELECT * FROM t -- note", "SELECT * FROM t /* x */;"])
+def test_incremental_query_drops_trailing_comments(query):
+    assert incremental_query(query, 'id', BACKENDS['sqlite']) == \
+        'SELECT * FROM (\nSELECT * FROM t\n) AS incremental\nWHERE "id" > ?\nORDER BY "id"'
+
+
+def test_incremental_query_escapes_percent_for_mysql():
+    assert "LIKE 'a%%'" in incremental_query("SELECT * FROM t WHERE s LIKE 'a%'", 'id')
+    assert "LIKE 'a%'" in incremental_query("SELECT * FROM t WHERE s LIKE 'a%'", 'id', BACKENDS['sqlite'])
+
+
+def test_watermark_values_stay_json_friendly():
+    assert watermark_value(Decimal('5')) == '5'
+    assert watermark_value(7) == 7 and watermark_value(2.5) == 2.5
+    assert watermark_value(datetime(2024, 1, 2, 3, 4, 5)) == '2024-01-02 03:04:05'
+
+
+@pytest.fixture
+def events(tmp_path):
+    path = str(tmp_path / 'events.db')
+    connection = sqlite3.connect(path)
+    connection.execute("CREATE TABLE events (id INTEGER PRIMARY KEY, name TEXT)")
+    connection.executemany("INSERT INTO events VALUES (?, ?)", [(i, f"e{i}") for i in range(1, 6)])
+    connection.commit()
+    pools = ConnectionPools()
+    yield connection, pools, {'name': 'events', 'type': 'sqlite', 'database': path}
+    pools.close_all()
+    connection.close()
+
+
+def test_incremental_job_advances_and_persists_its_watermark(tmp_path, events):
+    connection, pools, db_config = events
+    jobs_path = str(tmp_path / 'jobs.json')
+    job = {'id': 'j', 'query': "SELECT id, name FROM events -- nightly", 'interval': 60,
+           'next_run': datetime.now().isoformat(), 'output_file': str(tmp_path / 'events'),
+           'database': 'events', 'watermark_column': 'id'}
+
+    filename, rows = run_job(pools, db_config, job)
+    assert (rows, job['watermark']) == (5, 5)
+    save_jobs([job], jobs_path)
+
+    job = load_jobs(jobs_path)[0]
+    connection.executemany("INSERT INTO events VALUES (?, ?)", [(6, 'e6'), (7, 'e7')])
+    connection.commit()
+    assert run_job(pools, db_config, job) == (filename, 2)
+    assert job['watermark'] == 7
+    assert run_job(pools, db_config, job) == (filename, 0)
+    assert job['watermark'] == 7
+    assert pd.read_csv(filename)['id'].tolist() == list(range(1, 8))
+
+
+def test_jobs_must_be_read_only(events):
+    _, pools, db_config = events
+    with pytest.raises(ValueError, match='read-only'):
+        run_job(pools, db_config, {'query': "DELETE FROM events", 'output_file': 'x'})
+
+
+class ManualExecutor:
+    # Holds submitted runs until the test starts them, so overlap can be set up deterministically
+    def __init__(self):
+        self.pending = []
+
+    def submit(self, fn, *args):
+        future = Future()
+        self.pending.append((fn, args, future))
+        return future
+
+    def run_next(self):
+        fn, args, future = self.pending.pop(0)
+        future.set_result(fn(*args))
+
+    def shutdown(self, wait=True, cancel_futures=False):
+        pass
+
+
+@pytest.fixture
+def scheduler(tmp_path, monkeypatch):
+    runs = []
+
+    def fake_run_job(pools, db_config, job, **kwargs):
+        runs.append(job['id'])
+        return None, 0
+    monkeypatch.setattr(scheduled_jobs, 'run_job', fake_run_job)
+    scheduler = JobScheduler([], [{'name': 'db'}], None, path=str(tmp_path / 'jobs.json'))
+    scheduler.executor.shutdown()
+    scheduler.executor = ManualExecutor()
+    scheduler.runs = runs
+    return scheduler
+
+
+def add_job(scheduler, **settings):
+    job = {'id': 'j', 'query': "SELECT 1", 'interval': 60, 'next_run': T0.isoformat(), 'output_file': 'out',
+           'database': 'db', **settings}
+    scheduler.jobs.append(job)
+    return job
+
+
+def test_job_is_not_run_before_it_is_due(scheduler):
+    add_job(scheduler)
+    scheduler.check_due(T0 - timedelta(seconds=1))
+    assert scheduler.executor.pending == []
+    scheduler.check_due(T0)
+    assert len(scheduler.executor.pending) == 1
+    assert scheduler.jobs[0]['next_run'] == (T0 + timedelta(seconds=60)).isoformat()
+
+
+def test_overlapping_run_is_skipped(scheduler):
+    job = add_job(scheduler, overlap='skip')
+    scheduler.check_due(T0)
+    scheduler.check_due(T0 + timedelta(seconds=60))
+    assert job['last_status'] == 'skipped (previous run still going)'
+    assert len(scheduler.executor.pending) == 1
+
+    scheduler.executor.run_next()
+    assert scheduler.runs == ['j']
+    assert scheduler.running == set()
+    assert scheduler.executor.pending == []
+
+
+def test_overlapping_run_is_queued(scheduler):
+    add_job(scheduler, overlap='queue')
+    scheduler.check_due(T0)
+    scheduler.check_due(T0 + timedelta(seconds=60))
+    assert scheduler.queued_runs['j'] == 1
+
+    scheduler.executor.run_next()
+    assert scheduler.running == {'j'}
+    scheduler.executor.run_next()
+    assert scheduler.runs == ['j', 'j']
+    assert scheduler.running == set()
+
+
+@pytest.mark.parametrize('policy, runs', [('run_once', 1), ('run_all', 5), ('skip', 0)])
+def test_catch_up_after_downtime(scheduler, policy, runs):
+    job = add_job(scheduler, catch_up=policy)
+    now = T0 + timedelta(seconds=250)  # the runs at T0, +60, +120, +180 and +240 were missed
+    scheduler.check_due(now)
+    while scheduler.executor.pending:
+        scheduler.executor.run_next()
+    assert len(scheduler.runs) == runs
+    assert job['next_run'] == (now + timedelta(seconds=60)).isoformat()
+    if runs == 0:
+        assert job['last_status'] == 'skipped (missed run)'
+    assert load_jobs(scheduler.path)[0]['next_run'] == job['next_run']
+
+
+def test_jitter_delays_the_next_run_within_its_range():
+    job = {'interval': 60, 'jitter': 10}
+    delays = [(datetime.fromisoformat(next_run_after(job, T0)) - T0).total_seconds() for _ in range(200)]
+    assert all(60 <= delay <= 70 for delay in delays)
+    assert len(set(delays)) > 1
+    assert next_run_after({'interval': 60}, T0) == (T0 + timedelta(seconds=60)).isoformat()
+
+
+def test_stop_clears_runs_that_never_started(scheduler):
+    add_job(scheduler)
+    scheduler.check_due(T0)
+    scheduler.futures['j'].cancel()
+    scheduler.stop()
+    assert scheduler.running == set()
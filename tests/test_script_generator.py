@@ -0,0 +1,150 @@
+import sqlite3
+
+import mysql.connector
+import pandas as pd
+import pytest
+
+from script_generator import build_script, detect_primary_key, keyset_queries, query_table, selects_column
+
+ROWS = [(i * 7 % 20 + 1, f"n{i % 4}%", i % 3) for i in range(20)]
+
+
+class SqliteCursor:
+    # Runs the generated script's mysql-connector calls on SQLite
+    def __init__(self, connection):
+        self.cursor = connection.cursor()
+
+    def execute(self, sql, params=()):
+        self.cursor.execute(sql.replace('%s', '?').replace('%%', '%'), params)
+
+    @property
+    def description(self):
+        return self.cursor.description
+
+    def fetchall(self):
+        return self.cursor.fetchall()
+
+    def fetchmany(self, size):
+        return self.cursor.fetchmany(size)
+
+    def close(self):
+        self.cursor.close()
+
+
+class SqliteConnection:
+    def __init__(self, connection):
+        self.connection = connection
+        self.executed = []
+
+    def cursor(self, buffered=True):
+        return SqliteCursor(self.connection)
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def connection():
+    connection = sqlite3.connect(':memory:')
+    connection.execute("CREATE TABLE items (id INTEGER PRIMARY KEY, name TEXT, grp INTEGER)")
+    connection.executemany("INSERT INTO items VALUES (?, ?, ?)", ROWS)
+    yield connection
+    connection.close()
+
+
+def run_script(monkeypatch, tmp_path, connection, query, key_column, chunk_size=3):
+    output = str(tmp_path / 'out.csv')
+    monkeypatch.setattr(mysql.connector, 'connect', lambda **config: SqliteConnection(connection))
+    script = build_script({'name': 'db', 'host': 'localhost'}, query, key_column, 'csv', output, chunk_size)
+    exec(compile(script, 'generated.py', 'exec'), {'__name__': 'generated'})
+    return script, pd.read_csv(output, keep_default_na=False)
+
+
+@pytest.mark.parametrize('query', [
+    "SELECT * FROM items",
+    "SELECT id, name FROM `items` WHERE grp = 1 OR name LIKE 'n2%'; -- nightly",
+    "select i.id, i.name from items i where i.grp <> 0",
+    "SELECT id, 'where' AS w FROM items AS i WHERE name <> 'a''b'",
+])
+def test_keyset_pages_return_the_full_result(monkeypatch, tmp_path, connection, query):
+    script, df = run_script(monkeypatch, tmp_path, connection, query, 'id')
+    assert 'next_page_sql' in script
+    expected = pd.read_sql_query(query.split(';')[0], connection).sort_values('id').reset_index(drop=True)
+    expected['id'] = expected['id'].astype(df['id'].dtype)
+    pd.testing.assert_frame_equal(df, expected.astype({column: df[column].dtype for column in df.columns}))
+
+
+@pytest.mark.parametrize('query', [
+    "SELECT * FROM items ORDER BY name",
+    "SELECT grp, COUNT(*) AS n FROM items GROUP BY grp",
+    "SELECT * FROM items LIMIT 5",
+    "SELECT DISTINCT name FROM items",
+    "SELECT * FROM items a JOIN items b ON a.id = b.id",
+    "SELECT * FROM items WHERE id IN (SELECT id FROM items)",
+    "SELECT * FROM items UNION ALL SELECT * FROM items",
+])
+def test_queries_that_cannot_be_paged_stream_instead(monkeypatch, tmp_path, connection, query):
+    assert keyset_queries(query, 'id') is None
+    script, df = run_script(monkeypatch, tmp_path, connection, query, 'id')
+    assert "can't be paged by key" in script
+    assert len(df) == len(pd.read_sql_query(query, connection))
+
+
+def test_pages_escape_percent_and_keep_the_condition_together():
+    first, following = keyset_queries("SELECT * FROM t WHERE a = 1 OR b LIKE 'x%'", 'id')
+    assert first == "SELECT * FROM t\nWHERE (a = 1 OR b LIKE 'x%%')\nORDER BY `id` LIMIT %s"
+    assert following == "SELECT * FROM t\nWHERE (a = 1 OR b LIKE 'x%%') AND `id` > %s\nORDER BY `id` LIMIT %s"
+
+
+def test_query_table():
+    assert query_table("SELECT * FROM `items` WHERE id > 1") == 'items'
+    assert query_table("SELECT * FROM items i") == 'items'
+    assert query_table("SELECT * FROM items JOIN other USING (id)") is None
+
+
+def test_selects_column():
+    assert selects_column("SELECT * FROM t", 'id')
+    assert selects_column("SELECT t.ID, name FROM t", 'id')
+    assert selects_column("SELECT i.* FROM t i", 'id')
+    assert not selects_column("SELECT name FROM t", 'id')
+    assert not selects_column("SELECT id + 1 FROM t", 'id')
+    assert not selects_column("SELECT COUNT(id) FROM t", 'id')
+
+
+class KeysCursor:
+    description = [('Table',), ('Non_unique',), ('Key_name',), ('Seq_in_index',), ('Column_name',)]
+
+    def __init__(self, keys):
+        self.keys = keys
+
+    def execute(self, sql):
+        self.sql = sql
+
+    def fetchall(self):
+        return [('items', 0, 'PRIMARY', i + 1, key) for i, key in enumerate(self.keys)]
+
+    def close(self):
+        pass
+
+
+class KeysConnection:
+    def __init__(self, *keys):
+        self.keys = keys
+
+    def cursor(self):
+        return KeysCursor(self.keys)
+
+
+def test_detect_primary_key():
+    assert detect_primary_key(KeysConnection('id'), "SELECT * FROM items") == 'id'
+    assert detect_primary_key(KeysConnection('a', 'b'), "SELECT * FROM items") is None
+    assert detect_primary_key(KeysConnection(), "SELECT * FROM items") is None
+    assert detect_primary_key(KeysConnection('id'), "SELECT * FROM items GROUP BY grp") is None
+
+
+def test_generated_script_embeds_the_sql_verbatim():
+    query = "SELECT '\\n''\"{x}' AS s FROM t -- note"
+    script = build_script({'name': 'db', 'host': 'h'}, query)
+    namespace = {}
+    exec(script[script.index('sql = '):script.index('\n', script.index('sql = '))], namespace)
+    assert namespace['sql'] == "SELECT '\\n''\"{x}' AS s FROM t"